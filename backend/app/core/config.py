@@ -8,21 +8,181 @@ class Settings(BaseSettings):
     # Vector DB settings
     VECTOR_DB: Literal["FAISS", "PINECONE"] = "FAISS"
     LOCAL_FAISS_INDEX_PATH: str = "../notebooks/artifacts/faiss_index"
+
+    # FAISS index type built by the ingestion script
+    # "FLAT" is exact; the others trade a little recall for speed and memory.
+    FAISS_INDEX_TYPE: Literal["FLAT", "IVF_FLAT", "IVF_PQ", "HNSW"] = "FLAT"
+    FAISS_IVF_NLIST: int = 4096  # Capped at ingestion for small catalogs
+    FAISS_IVF_NPROBE: int = 16
+    FAISS_PQ_M: int = 48  # Sub-quantizers; must divide the embedding dimension
+    FAISS_PQ_NBITS: int = 8
+    FAISS_HNSW_M: int = 32
+    FAISS_HNSW_EF_CONSTRUCTION: int = 200
+    FAISS_HNSW_EF_SEARCH: int = 64
     
     # Pinecone settings
     PINECONE_API_KEY: str | None = None
     PINECONE_ENVIRONMENT: str | None = None
     PINECONE_INDEX_NAME: str = "furnifindr"
     
+    # Retrieval
+    # "HYBRID" fuses the dense index with the BM25 sparse index built at ingestion.
+    RETRIEVAL_MODE: Literal["DENSE", "HYBRID"] = "HYBRID"
+    HYBRID_CANDIDATES: int = 20
+    RRF_K: int = 60
+    # Filtered searches with at most this many candidates are scored exactly
+    # on the candidates' own vectors instead of through the index.
+    PREFILTER_EXACT_MAX: int = 4096
+    # "More like this": ingestion precomputes each product's nearest
+    # neighbours up to this many (0 disables; lookups then search the index).
+    # The table is rebuilt on every run, for the text and the image index:
+    # one search per product, so on a FLAT index it is an exact all-pairs
+    # scan costing O(N^2 * d). Above SIMILAR_NEIGHBORS_EXACT_MAX products it
+    # is searched through a temporary HNSW index instead (approximate,
+    # O(N log N)); IVF and HNSW indexes are always searched as they are.
+    SIMILAR_NEIGHBORS: int = 20
+    SIMILAR_NEIGHBORS_EXACT_MAX: int = 50000
+    # KMeans clusters of the catalog, built at ingestion (0 skips them).
+    # Routing searches only the CLUSTER_ROUTE_PROBES clusters nearest to the
+    # query. "MMR" / "CLUSTER" diversity re-rank DIVERSITY_CANDIDATES results
+    # so top_k isn't filled with near-duplicates.
+    CLUSTER_COUNT: int = 256
+    CLUSTER_ROUTING: bool = False
+    CLUSTER_ROUTE_PROBES: int = 8
+    RESULT_DIVERSITY: Literal["NONE", "MMR", "CLUSTER"] = "NONE"
+    MMR_LAMBDA: float = 0.7
+    DIVERSITY_CANDIDATES: int = 20
+
+    # Visual similarity
+    # With IMAGE_INDEX_ENABLED, ingestion fetches each product's first image
+    # (IMAGE_FETCH_CONCURRENCY downloads at a time, cached on disk by content
+    # hash), embeds it on the CPU with a small ImageNet-pretrained backbone
+    # and builds a second FAISS index over the image vectors. When
+    # IMAGE_SOURCE_DIR is set, image URLs are read from that directory by
+    # file name instead of the network (offline runs and benchmarks).
+    IMAGE_INDEX_ENABLED: bool = False
+    IMAGE_MODEL_NAME: Literal["MOBILENET_V3_SMALL", "RESNET18"] = "MOBILENET_V3_SMALL"
+    IMAGE_CACHE_PATH: str = "../notebooks/artifacts/image_cache"
+    IMAGE_SOURCE_DIR: str | None = None
+    IMAGE_FETCH_CONCURRENCY: int = 32
+    IMAGE_FETCH_TIMEOUT_SECONDS: float = 10.0
+    IMAGE_MAX_BYTES: int = 10 * 1024 * 1024
+    IMAGE_INGEST_BATCH: int = 1024  # Products fetched while the previous batch is embedded
+    IMAGE_EMBED_BATCH_SIZE: int = 64
+    IMAGE_DECODE_WORKERS: int = 4
+    IMAGE_EMBED_THREADS: int = 0  # 0 leaves torch's default
+
     # Embedding model
     EMBEDDING_MODEL_NAME: str = "all-MiniLM-L6-v2"
-    
+    # "TORCH" runs sentence-transformers; "ONNX" / "ONNX_INT8" run the model
+    # exported by app/data_ingestion/export_onnx.py through onnxruntime.
+    # 0 threads leaves the runtime's default.
+    EMBEDDING_BACKEND: Literal["TORCH", "ONNX", "ONNX_INT8"] = "TORCH"
+    EMBEDDING_ONNX_PATH: str = "../notebooks/artifacts/onnx_embedding"
+    EMBEDDING_NUM_THREADS: int = 0
+    # Persistent embedding cache shared by ingestion and the API, keyed by
+    # text hash; the most recent query embeddings are also kept in memory.
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_PATH: str = "../notebooks/artifacts/embedding_cache"
+    EMBEDDING_CACHE_LRU_SIZE: int = 10000
+
     # Generative AI model
     OPENAI_API_KEY: str | None = None
-    
+    LLM_MODEL_NAME: str = "gpt-3.5-turbo"
+
+    # Persistent store of generated product descriptions
+    # "LIVE" calls the LLM for products missing from the store,
+    # "STORED_ONLY" never calls the LLM on the request path.
+    DESCRIPTION_STORE_PATH: str = "../notebooks/artifacts/descriptions.sqlite"
+    DESCRIPTION_MODE: Literal["LIVE", "STORED_ONLY"] = "LIVE"
+    PREGENERATE_CONCURRENCY: int = 8
+
+    # "PER_PRODUCT" makes one LLM call per recommended product,
+    # "BATCHED" describes all of a request's products in a single call.
+    GENERATION_MODE: Literal["PER_PRODUCT", "BATCHED"] = "PER_PRODUCT"
+
+    # /recommend/batch accepts at most this many requests per call.
+    RECOMMEND_BATCH_MAX_SIZE: int = 64
+
+    # Request scheduling
+    # Query embeddings arriving within the window are computed in one batch.
+    EMBED_BATCH_WINDOW_MS: float = 5.0
+    EMBED_BATCH_MAX_SIZE: int = 32
+    # LLM admission control; a rate of 0 disables the token bucket.
+    LLM_MAX_CONCURRENCY: int = 8
+    LLM_RATE_PER_SECOND: float = 0.0
+    LLM_RATE_BURST: int = 8
+
+    # Resilience of the generative step
+    # /recommend waits at most GENERATION_BUDGET_MS for descriptions (0 waits
+    # for all of them); the rest are filled from the template and finish in
+    # the background for later requests. A call still running after the
+    # LLM_HEDGE_QUANTILE latency of recent calls (at least
+    # LLM_HEDGE_MIN_DELAY_MS) is duplicated, up to LLM_MAX_ATTEMPTS attempts
+    # (1 disables hedging and retries). The circuit breaker skips the LLM for
+    # LLM_BREAKER_COOLDOWN_SECONDS once LLM_BREAKER_ERROR_RATE of the last
+    # LLM_BREAKER_WINDOW calls failed, then lets probe calls through.
+    GENERATION_BUDGET_MS: float = 3000.0
+    LLM_CALL_TIMEOUT_SECONDS: float = 30.0
+    LLM_MAX_ATTEMPTS: int = 2
+    LLM_HEDGE_QUANTILE: float = 0.95
+    LLM_HEDGE_MIN_DELAY_MS: float = 1000.0
+    LLM_BREAKER_WINDOW: int = 20
+    LLM_BREAKER_MIN_CALLS: int = 10
+    LLM_BREAKER_ERROR_RATE: float = 0.5
+    LLM_BREAKER_COOLDOWN_SECONDS: float = 30.0
+    LLM_BREAKER_HALF_OPEN_PROBES: int = 1
+
+    # Startup warm-up
+    # Loads the model, index and chains in the background and runs one query
+    # through them; /ready reports 503 until it has finished. A failed phase
+    # is retried after WARMUP_RETRY_BASE_SECONDS, doubling up to the max.
+    WARMUP_ON_STARTUP: bool = True
+    WARMUP_QUERY: str = "a comfortable modern sofa for a small living room"
+    WARMUP_RETRY_BASE_SECONDS: float = 1.0
+    WARMUP_RETRY_MAX_SECONDS: float = 60.0
+
+    # Instrumentation
+    # Stage timings feed /metrics and the Server-Timing header. With
+    # PROFILING_ENABLED, a request sent with "X-Profile: 1" and a matching
+    # X-Admin-Token (ADMIN_TOKEN must be set) runs under a sampling profiler
+    # and its collapsed stacks are written to PROFILE_DIR.
+    SERVER_TIMING_HEADER: bool = True
+    PROFILING_ENABLED: bool = False
+    PROFILE_INTERVAL_MS: float = 5.0
+    PROFILE_DIR: str = "../notebooks/artifacts/profiles"
+
+    # Index hot reload
+    # Ingestion publishes versions under LOCAL_FAISS_INDEX_PATH/versions; API
+    # workers poll for a new one (0 disables polling; /admin/reload-index
+    # still works). The admin endpoints and profiling require ADMIN_TOKEN in
+    # X-Admin-Token; without a configured token they are disabled (404).
+    INDEX_RELOAD_POLL_SECONDS: float = 10.0
+    INDEX_KEEP_VERSIONS: int = 3
+    ADMIN_TOKEN: str | None = None
+
     # Data file path
     DATA_FILE_PATH: str = "app/data_ingestion/sample_data.csv"
 
+    # Ingestion pipeline
+    # The catalog is read INGEST_CHUNK_SIZE rows at a time; only new or changed
+    # products are embedded. 0 embedding workers embeds in-process.
+    INGEST_CHUNK_SIZE: int = 20000
+    INGEST_EMBED_BATCH_SIZE: int = 256
+    INGEST_EMBED_WORKERS: int = 2
+    INGEST_CHECKPOINT_EVERY: int = 5
+    INGEST_STATE_PATH: str = "../notebooks/artifacts/ingest_state.sqlite"
+    PINECONE_UPSERT_BATCH: int = 100
+
+    # Semantic response cache for /recommend
+    # A cached response is reused when a new prompt's embedding is within
+    # RESPONSE_CACHE_MAX_DISTANCE (cosine distance) of a cached prompt.
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_MAX_DISTANCE: float = 0.05
+    RESPONSE_CACHE_TTL_SECONDS: int = 3600
+    RESPONSE_CACHE_MAX_ENTRIES: int = 2048
+    RESPONSE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+
     class Config:
         env_file = ".env"
         env_file_encoding = 'utf-8'
@@ -0,0 +1,116 @@
+"""
+Exports EMBEDDING_MODEL_NAME to ONNX (fp32 and dynamically quantized int8)
+for the "ONNX" / "ONNX_INT8" embedding backends.
+
+Run from the `backend` directory:
+    python -m app.data_ingestion.export_onnx [--output DIR] [--opset 14] [--sample 500]
+
+After exporting, both models are checked against the PyTorch vectors of
+catalog texts; the cosine agreement is printed and saved with the export.
+"""
+import argparse
+import json
+import os
+import sys
+import pandas as pd
+
+# Add the project root to the path to allow imports from app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.core.config import settings
+from app.services.embedding_backends import (
+    ONNX_CONFIG_FILE,
+    ONNX_INT8_MODEL_FILE,
+    ONNX_MODEL_FILE,
+    OnnxEmbeddings,
+    cosine_parity,
+)
+from app.data_ingestion.pipeline import clean_chunk, document_texts
+
+
+def export(output_dir: str, opset: int) -> dict:
+    """Writes the transformer graph, its int8 copy, the tokenizer and the pooling config."""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    os.makedirs(output_dir, exist_ok=True)
+    model = SentenceTransformer(settings.EMBEDDING_MODEL_NAME, device="cpu")
+    pooling = next(module for module in model if isinstance(module, Pooling))
+    if not pooling.pooling_mode_mean_tokens:
+        raise ValueError("Only mean-pooling sentence-transformers can be exported")
+
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+    sample = tokenizer(["a mid-century walnut coffee table"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    model_path = os.path.join(output_dir, ONNX_MODEL_FILE)
+    print(f"Exporting {settings.EMBEDDING_MODEL_NAME} to {model_path}...")
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(sample[name] for name in input_names),
+            model_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+
+    int8_path = os.path.join(output_dir, ONNX_INT8_MODEL_FILE)
+    print(f"Quantizing weights to int8: {int8_path}...")
+    quantize_dynamic(model_path, int8_path, weight_type=QuantType.QInt8)
+
+    tokenizer.save_pretrained(output_dir)
+    config = {
+        "model_name": settings.EMBEDDING_MODEL_NAME,
+        "max_seq_length": model.max_seq_length,
+        "normalize": any(isinstance(module, Normalize) for module in model),
+    }
+    with open(os.path.join(output_dir, ONNX_CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    return config
+
+
+def sample_texts(data_file_path: str, count: int) -> list[str]:
+    """The texts ingestion would embed for the first `count` catalog rows."""
+    df = clean_chunk(pd.read_csv(data_file_path, nrows=count, dtype=str, keep_default_na=False))
+    return document_texts(df).tolist()
+
+
+def check_parity(output_dir: str, texts: list[str]) -> dict:
+    """Cosine agreement of both exported models with the PyTorch vectors."""
+    from sentence_transformers import SentenceTransformer
+
+    reference = SentenceTransformer(settings.EMBEDDING_MODEL_NAME, device="cpu").encode(texts)
+    report = {}
+    for backend, quantized in (("ONNX", False), ("ONNX_INT8", True)):
+        candidate = OnnxEmbeddings(output_dir, quantized=quantized).embed_documents(texts)
+        report[backend] = cosine_parity(reference, candidate)
+        print(f"  {backend}: {report[backend]}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the embedding model to ONNX.")
+    parser.add_argument("--output", default=settings.EMBEDDING_ONNX_PATH)
+    parser.add_argument("--opset", type=int, default=14)
+    parser.add_argument("--data-file", default=settings.DATA_FILE_PATH)
+    parser.add_argument("--sample", type=int, default=500, help="Catalog rows used for the parity check.")
+    args = parser.parse_args()
+
+    export(args.output, args.opset)
+
+    print(f"Checking parity with PyTorch on {args.sample} catalog texts...")
+    report = check_parity(args.output, sample_texts(args.data_file, args.sample))
+    with open(os.path.join(args.output, "parity.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print("Export complete. Set EMBEDDING_BACKEND=ONNX or ONNX_INT8 to use it.")
+
+
+if __name__ == "__main__":
+    main()
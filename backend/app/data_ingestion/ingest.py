@@ -1,10 +1,11 @@
 import pandas as pd
-import ast
-import re
+import argparse
+import asyncio
+import shutil
 import sys
 import os
+import time
 from dotenv import load_dotenv
-from typing import List, Dict, Any
 
 # --- START: Environment Variable Fix ---
 # We will manually find and load the .env file from the 'backend' directory
@@ -16,151 +17,289 @@ if os.path.exists(dotenv_path):
     print(f"Found .env file. Loading environment variables from: {dotenv_path}")
     load_dotenv(dotenv_path=dotenv_path)
 else:
-    print(f"CRITICAL: .env file not found at {dotenv_path}. The script will fail.")
-    sys.exit(1)
-
-# Now, check that the keys were loaded correctly into the environment
-if "PINECONE_API_KEY" not in os.environ:
-    print("CRITICAL: PINECONE_API_KEY not found in environment. Check your .env file.")
-    sys.exit(1)
-if "PINECONE_ENVIRONMENT" not in os.environ:
-    print("CRITICAL: PINECONE_ENVIRONMENT not found in environment. Check your .env file.")
-    sys.exit(1)
-if "OPENAI_API_KEY" not in os.environ:
-    print("CRITICAL: OPENAI_API_KEY not found in environment. Check your .env file.")
-    sys.exit(1)
-    
-print("All API keys loaded successfully.")
+    print(f"Warning: .env file not found at {dotenv_path}. Using defaults and the process environment.")
 # --- END: Environment Variable Fix ---
 
 
 # Add the project root to the path to allow imports from app
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from langchain_community.docstore.document import Document
-from langchain_community.vectorstores import FAISS
-from langchain_pinecone import Pinecone
-from pinecone import Pinecone as PineconeClient, ServerlessSpec, PodSpec
 from app.core.config import settings
+from app.services.sparse_index import SparseIndex
+from app.services.product_index import ProductIndex
+from app.services.analytics import AnalyticsEngine
+from app.services.clusters import ClusterIndex
+from app.services.image_index import ImageIndex
+from app.services.image_fetcher import ImageFetcher, ImageStore
+from app.services.image_embeddings import create_image_embedder, get_image_vector_cache
+from app.services.ann_index import FAISS_INDEX_FILE, build_neighbor_table, save_neighbor_table
+from app.services.index_registry import current_version, prune_versions, publish_version, version_path
+from app.services.vector_store import get_embedding_model
+from app.services.embedding_cache import get_embedding_cache
+from app.data_ingestion.pipeline import (
+    DOCUMENTS_DIR,
+    DocumentLog,
+    EmbeddingPool,
+    FaissSink,
+    IngestState,
+    PineconeSink,
+    clean_chunk,
+    content_hashes,
+    create_documents,
+    document_texts,
+    embed_product_images,
+    primary_image_urls,
+    read_chunks,
+    source_signature
+)
 
-# This is the new, correct import to fix the warning
-from langchain_huggingface import HuggingFaceEmbeddings
-def clean_price(price_str: str) -> float:
-    """Removes '$' and ',' from price string and converts to float."""
-    if not isinstance(price_str, str):
-        return 0.0
-    try:
-        return float(re.sub(r"[$,]", "", price_str))
-    except (ValueError, TypeError):
-        return 0.0
-
-def safe_literal_eval(val: str) -> List[str]:
-    """Safely evaluates a string representation of a list."""
-    if not isinstance(val, str):
-        return []
-    try:
-        return ast.literal_eval(val)
-    except (ValueError, SyntaxError):
-        return [val]  # Return as list with the original string if eval fails
-
-def create_documents(df: pd.DataFrame) -> List[Document]:
-    """Converts DataFrame rows into LangChain Document objects."""
-    documents = []
-    for _, row in df.iterrows():
-        # Create a combined text for embedding
-        text_to_embed = f"Title: {row['title']}\n"
-        text_to_embed += f"Brand: {row['brand']}\n"
-        text_to_embed += f"Description: {row['description']}\n"
-        text_to_embed += f"Categories: {', '.join(row['categories_clean'])}\n"
-        text_to_embed += f"Material: {row['material']}\n"
-        text_to_embed += f"Color: {row['color']}"
-        
-        # Store all other data as metadata
-        metadata = row.to_dict()
-        # Convert lists to strings for FAISS/metadata compatibility if needed
-        metadata['categories'] = str(metadata['categories_clean'])
-        metadata['images'] = str(metadata['images_clean'])
-        
-        documents.append(
-            Document(page_content=text_to_embed, metadata=metadata)
+
+def check_environment():
+    """Pinecone credentials are only needed when ingesting into Pinecone."""
+    if settings.VECTOR_DB == "PINECONE":
+        for key in ("PINECONE_API_KEY", "PINECONE_ENVIRONMENT"):
+            if not os.environ.get(key) and not getattr(settings, key):
+                print(f"CRITICAL: {key} not found in environment. Check your .env file.")
+                sys.exit(1)
+
+def get_pinecone_sink(embeddings) -> PineconeSink:
+    """Connects to (creating if needed) the Pinecone index."""
+    from pinecone import Pinecone as PineconeClient, ServerlessSpec
+
+    print("Initializing Pinecone client...")
+    pc = PineconeClient(api_key=settings.PINECONE_API_KEY)
+
+    # Create index if it doesn't exist
+    if settings.PINECONE_INDEX_NAME not in pc.list_indexes().names():
+        print(f"Creating Pinecone index: {settings.PINECONE_INDEX_NAME}...")
+        # Get embedding dimension
+        sample_embedding = embeddings.embed_query("sample text")
+        dimension = len(sample_embedding)
+
+        pc.create_index(
+            name=settings.PINECONE_INDEX_NAME,
+            dimension=dimension,
+            metric="cosine",
+            spec=ServerlessSpec(
+                cloud="aws",
+                region=settings.PINECONE_ENVIRONMENT
+            )
         )
-    return documents
+        print("Index created.")
+    return PineconeSink(pc.Index(settings.PINECONE_INDEX_NAME))
+
+def build_sidecars(documents: DocumentLog, metadata: pd.DataFrame, path: str, analytics=None):
+    """
+    Rebuilds the sparse (BM25) and product filter indexes from the final
+    documents. For FAISS they are in FAISS id order, so the indexes share
+    row ids. The analytics engine, when given, already has this run's
+    changes applied; otherwise it is built from the documents. Its
+    snapshot and columns are saved with the version.
+    """
+    print("Building sparse (BM25) index...")
+    sparse_index = SparseIndex.build(documents.column("text"), documents.column("uniq_id"))
+    sparse_index.save(path)
+    print(f"Sparse index with {len(sparse_index.terms)} terms saved to {path}")
+
+    print("Building product filter index and analytics snapshot...")
+    ProductIndex.from_dataframe(metadata).save(path)
+    if analytics is None:
+        analytics = AnalyticsEngine.from_dataframe(metadata)
+    analytics.save_snapshot(path)
+    analytics.save(path)
+    print(f"Product filter index and analytics saved to {path}")
+
+def build_image_index(metadata: pd.DataFrame, path: str):
+    """
+    Fetches, embeds and indexes each product's first image. Downloads and
+    image vectors are cached, so a re-run only fetches and embeds new
+    images. Image rows map to the rows of the product index built from
+    the same documents.
+    """
+    print(f"Fetching and embedding product images ({settings.IMAGE_MODEL_NAME})...")
+    store = ImageStore(settings.IMAGE_CACHE_PATH)
+    fetcher = ImageFetcher(
+        store,
+        concurrency=settings.IMAGE_FETCH_CONCURRENCY,
+        timeout_seconds=settings.IMAGE_FETCH_TIMEOUT_SECONDS,
+        max_bytes=settings.IMAGE_MAX_BYTES,
+        source_dir=settings.IMAGE_SOURCE_DIR,
+    )
+    embedder = create_image_embedder()
+    started = time.perf_counter()
+    try:
+        rows, vectors = asyncio.run(embed_product_images(
+            primary_image_urls(metadata["images"]), fetcher, embedder, get_image_vector_cache(), settings.IMAGE_INGEST_BATCH
+        ))
+    finally:
+        embedder.close()
+        store.close()
+    print(f"{len(rows)} of {len(metadata)} products have an image vector "
+          f"({time.perf_counter() - started:.1f}s). Fetcher: {fetcher.stats()}")
+    if not len(rows):
+        print("No product image could be embedded; skipping the image index.")
+        return
+    image_index = ImageIndex.build(vectors, rows, len(metadata), settings.FAISS_INDEX_TYPE, settings.SIMILAR_NEIGHBORS)
+    image_index.save(path)
+    print(f"Image index with {len(image_index)} vectors saved to {path}")
+
+def run_version(run_id: int) -> str:
+    return f"run-{run_id:06d}"
+
+def open_faiss_sink(root: str, version: str, chunks_done: int) -> FaissSink:
+    """Resumes the version being built, or starts it from the version currently served."""
+    target = version_path(root, version)
+    if os.path.exists(os.path.join(target, FAISS_INDEX_FILE)):
+        return FaissSink(target, chunks_done=chunks_done)
+    return FaissSink(current_version(root)[1], save_path=target)
 
 def main():
-    """Main ingestion function."""
-    print(f"Loading data from {settings.DATA_FILE_PATH}...")
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    data_file_path = os.path.join(script_dir, "sample_data.csv")
+    """
+    Main ingestion function. Streams the catalog in chunks and only embeds
+    products that are new or changed since the last run; products that
+    disappeared from the catalog are deleted. Progress is checkpointed
+    every INGEST_CHECKPOINT_EVERY chunks, and an interrupted run over the
+    same file resumes from its last checkpoint.
+    Each run writes a new version under LOCAL_FAISS_INDEX_PATH/versions and
+    publishes it once complete; running API workers hot-swap to it.
+    """
+    parser = argparse.ArgumentParser(description="Ingest the product catalog into the vector store.")
+    parser.add_argument("--data-file", default=settings.DATA_FILE_PATH)
+    parser.add_argument("--full", action="store_true", help="Ignore previous runs and re-embed everything.")
+    args = parser.parse_args()
+
+    check_environment()
+    data_file_path = args.data_file
+    print(f"Loading data from {data_file_path}...")
 
     if not os.path.exists(data_file_path):
         print(f"Error: Data file not found at {data_file_path}")
         return
 
-    df = pd.read_csv(data_file_path)
-    
-    # --- Data Cleaning ---
-    df = df.fillna("")
-    df['price_clean'] = df['price'].apply(clean_price)
-    df['categories_clean'] = df['categories'].apply(safe_literal_eval)
-    df['images_clean'] = df['images'].apply(safe_literal_eval)
-    
-    # Keep original string versions for metadata
-    df['price'] = df['price'].astype(str)
-    
-    # Convert all other columns to string to ensure compatibility
-    for col in df.columns:
-        if col not in ['price_clean', 'categories_clean', 'images_clean']:
-            df[col] = df[col].astype(str)
-
-    print(f"Creating {len(df)} documents...")
-    documents = create_documents(df)
-    
-    print("Generating embeddings... This may take a moment.")
-    embeddings = HuggingFaceEmbeddings(
-        model_name=settings.EMBEDDING_MODEL_NAME,
-        model_kwargs={'device': 'cpu'} # Use CPU for local demo
-    )
-    
+    root = settings.LOCAL_FAISS_INDEX_PATH
+    signature = source_signature(data_file_path)
+    state = IngestState(settings.INGEST_STATE_PATH)
+    run_id, chunks_done = state.start_run(signature)
+
     if settings.VECTOR_DB == "FAISS":
-        print("Initializing FAISS index...")
-        db = FAISS.from_documents(documents, embeddings)
-        db.save_local(settings.LOCAL_FAISS_INDEX_PATH)
-        print(f"FAISS index created and saved to {settings.LOCAL_FAISS_INDEX_PATH}")
-        
+        sink = open_faiss_sink(root, run_version(run_id), chunks_done)
     elif settings.VECTOR_DB == "PINECONE":
-        if not settings.PINECONE_API_KEY or not settings.PINECONE_ENVIRONMENT:
-            raise ValueError("PINECONE_API_KEY and PINECONE_ENVIRONMENT must be set in .env")
-        
-        print("Initializing Pinecone client...")
-        pc = PineconeClient(api_key=os.environ["PINECONE_API_KEY"])
-        
-        # Create index if it doesn't exist
-        if settings.PINECONE_INDEX_NAME not in pc.list_indexes().names():
-            print(f"Creating Pinecone index: {settings.PINECONE_INDEX_NAME}...")
-            # Get embedding dimension
-            sample_embedding = embeddings.embed_query("sample text")
-            dimension = len(sample_embedding)
-            
-            pc.create_index(
-                name=settings.PINECONE_INDEX_NAME,
-                dimension=dimension,
-                metric="cosine",
-                spec=ServerlessSpec(
-                    cloud="aws",
-                    region=settings.PINECONE_ENVIRONMENT
-                )
-            )
-            print("Index created.")
-        
-        print("Uploading documents to Pinecone...")
-        Pinecone.from_documents(
-            documents,
-            embeddings,
-            index_name=settings.PINECONE_INDEX_NAME
-        )
-        print("Documents uploaded to Pinecone.")
+        sink = get_pinecone_sink(get_embedding_model())
+    else:
+        raise ValueError(f"Unknown VECTOR_DB type: {settings.VECTOR_DB}")
+
+    if args.full or (settings.VECTOR_DB == "FAISS" and len(sink) != state.product_count()):
+        # The state must describe exactly what the saved index holds (an index
+        # from an older ingestion, or a deleted state file, forces a rebuild)
+        print("Starting a full ingestion (state reset).")
+        state.reset()
+        run_id, chunks_done = state.start_run(signature)
+        if settings.VECTOR_DB == "FAISS":
+            sink = FaissSink(version_path(root, run_version(run_id)))
+            sink.reset()
+
+    if chunks_done:
+        print(f"Resuming run {run_id} after {chunks_done} checkpointed chunks.")
+
+    # The previous version's analytics columns get this run's changes applied,
+    # unless they can't match the state (a resumed or full run, or an older
+    # version without them)
+    analytics = None
+    if not chunks_done:
+        analytics = AnalyticsEngine.load(current_version(root)[1])
+        if analytics is not None and len(analytics) != state.product_count():
+            analytics = None
+    print("Analytics: " + ("updating the previous version's." if analytics is not None else "rebuilding at the end."))
+
+    # Pinecone keeps no copy of the catalog, so the sidecars are built from
+    # this run's own log of it, checkpointed along with the run
+    catalog_path = os.path.join(version_path(root, run_version(run_id)), DOCUMENTS_DIR)
+    catalog = DocumentLog.open(catalog_path, chunks_done) if settings.VECTOR_DB == "PINECONE" else None
+
+    pool = EmbeddingPool(settings.INGEST_EMBED_WORKERS, settings.INGEST_EMBED_BATCH_SIZE)
+    started = time.perf_counter()
+    rows_seen = rows_embedded = 0
+    try:
+        for chunk_number, chunk in read_chunks(data_file_path, settings.INGEST_CHUNK_SIZE, skip_chunks=chunks_done):
+            # --- Data Cleaning ---
+            chunk = clean_chunk(chunk)
+            hashes = content_hashes(chunk)
+            uniq_ids = chunk["uniq_id"].tolist()
+
+            # Only new or changed products are embedded
+            changed, existing_ids = state.changed(uniq_ids, hashes)
+            if changed.any():
+                pending = chunk[changed].reset_index(drop=True)
+                texts = document_texts(pending).tolist()
+                vectors = pool.embed(texts)
+                documents = create_documents(pending, texts)
+                sink.upsert(documents, vectors, existing_ids)
+                if analytics is not None:
+                    analytics.upsert_products(doc.metadata for doc in documents)
+            state.mark_seen(run_id, uniq_ids, hashes)
+            if catalog is not None:
+                catalog.append(create_documents(chunk, document_texts(chunk).tolist()))
+
+            rows_seen += len(chunk)
+            rows_embedded += int(changed.sum())
+            elapsed = time.perf_counter() - started
+            print(f"Chunk {chunk_number}: {rows_seen} rows read, {rows_embedded} embedded "
+                  f"({rows_seen / elapsed:.0f} rows/s).")
+
+            if (chunk_number + 1) % settings.INGEST_CHECKPOINT_EVERY == 0:
+                sink.checkpoint(chunk_number + 1)
+                if catalog is not None:
+                    catalog.flush(catalog_path, chunk_number + 1)
+                state.checkpoint(run_id, chunk_number + 1)
+                print(f"Checkpoint saved after chunk {chunk_number}.")
+
+        # Products that weren't in this run's catalog have been removed
+        removed = state.unseen(run_id)
+        if removed:
+            print(f"Deleting {len(removed)} products no longer in the catalog...")
+            sink.delete(removed)
+            if analytics is not None:
+                analytics.remove_products(removed)
+            state.forget(removed)
+
+        # IVF / HNSW indexes drop this run's replaced and deleted rows in one rebuild
+        sink.compact(pool.embed)
+    finally:
+        pool.close()
+
+    sink.save()
+    state.finish(run_id)
+    print(f"Vector store updated in {time.perf_counter() - started:.1f}s "
+          f"({rows_embedded} embedded, {len(removed)} deleted).")
+    embedding_cache = get_embedding_cache()
+    if embedding_cache is not None:
+        print(f"Embedding cache: {embedding_cache.stats()}")
+
+    version = run_version(run_id)
+    documents = sink.documents if settings.VECTOR_DB == "FAISS" else catalog
+    metadata = documents.metadata_frame()
+    build_sidecars(documents, metadata, version_path(root, version), analytics)
+    if settings.VECTOR_DB == "FAISS" and settings.SIMILAR_NEIGHBORS > 0 and sink.index is not None:
+        print(f"Precomputing the top {settings.SIMILAR_NEIGHBORS} similar products of each product...")
+        save_neighbor_table(version_path(root, version), build_neighbor_table(sink.index, settings.SIMILAR_NEIGHBORS))
+    if settings.VECTOR_DB == "FAISS" and settings.CLUSTER_COUNT > 0 and sink.index is not None and len(sink):
+        print("Clustering the catalog embeddings (KMeans)...")
+        clusters = ClusterIndex.build(sink.index, settings.CLUSTER_COUNT)
+        clusters.save(version_path(root, version))
+        print(f"{len(clusters)} clusters saved.")
+    if settings.IMAGE_INDEX_ENABLED and len(documents):
+        build_image_index(metadata, version_path(root, version))
+    if catalog is not None:
+        # Only needed to resume this run
+        shutil.rmtree(catalog_path, ignore_errors=True)
+
+    # Only a complete version is published
+    publish_version(root, version)
+    removed_versions = prune_versions(root, settings.INDEX_KEEP_VERSIONS)
+    print(f"Published index version {version}"
+          + (f" (pruned {', '.join(removed_versions)})." if removed_versions else "."))
 
     print("Data ingestion complete.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,620 @@
+from langchain_community.docstore.document import Document
+from langchain_community.vectorstores.faiss import dependable_faiss_import
+from concurrent.futures import ProcessPoolExecutor
+from app.core.config import settings
+from app.services.analytics import clean_price_column
+from app.services.ann_index import (
+    FAISS_INDEX_FILE,
+    build_empty_index,
+    build_index,
+    configure_search,
+    index_type_name,
+    supports_removal
+)
+from app.services.embedding_cache import get_embedding_cache
+from app.services.product_index import pinecone_filter_metadata
+from app.services.columnar import StringColumn, columns_exist, concat_columns, read_columns, take_rows, write_columns
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import pandas as pd
+import numpy as np
+import asyncio
+import sqlite3
+import shutil
+import json
+import time
+import os
+
+# Columns that feed the embedded text or the stored metadata; a change in
+# any of them re-embeds the product
+HASHED_COLUMNS = [
+    "title", "brand", "description", "price", "categories", "images", "manufacturer",
+    "package_dimensions", "country_of_origin", "material", "color",
+]
+
+# Ingestion's own copy of the documents, next to the FAISS index
+DOCUMENTS_DIR = "documents"
+DOCUMENT_COLUMNS = ("uniq_id", "text", "metadata")
+# Rows checkpointed since the documents were last written in full, one
+# directory per checkpoint, with the vectors a resumed run re-adds
+SEGMENTS_DIR = "segments"
+SEGMENT_VECTORS_FILE = "vectors.npy"
+# Rows of a checkpointed index that are deleted but not yet compacted
+DELETED_ROWS_FILE = "deleted_rows.npy"
+
+# Matches the items of a stringified Python list of strings: 'a' or "b"
+_LIST_ITEM_PATTERN = r"'((?:[^'\\]|\\.)*)'|\"((?:[^\"\\]|\\.)*)\""
+
+
+# --- Stage 1: chunked reads ---
+
+def read_chunks(path: str, chunk_size: int, skip_chunks: int = 0) -> Iterator[Tuple[int, pd.DataFrame]]:
+    """Streams the catalog CSV as (chunk number, DataFrame) with every column read as text."""
+    reader = pd.read_csv(path, chunksize=chunk_size, dtype=str, keep_default_na=False)
+    for chunk_number, chunk in enumerate(reader):
+        if chunk_number < skip_chunks:
+            continue
+        yield chunk_number, chunk
+
+
+def source_signature(path: str) -> str:
+    """Identifies one version of the input file, so a resumed run knows it's reading the same data."""
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_size}:{int(stat.st_mtime)}"
+
+
+# --- Stage 2: vectorised cleaning ---
+
+def parse_list_column(values: pd.Series) -> pd.Series:
+    """
+    Parses a column of stringified lists ("['a', 'b']") without a per-row
+    literal_eval. Values that aren't lists become a one-item list, blanks an empty one.
+    """
+    values = values.astype(str)
+    is_list = values.str.startswith("[")
+    items = values.where(is_list, "").str.findall(_LIST_ITEM_PATTERN)
+    parsed = items.map(lambda matches: [single or double for single, double in matches])
+    scalar = values.map(lambda value: [value] if value else [])
+    return parsed.where(is_list, scalar)
+
+
+def clean_chunk(df: pd.DataFrame) -> pd.DataFrame:
+    """Adds the typed columns used by the documents and the indexes."""
+    df = df.drop_duplicates(subset="uniq_id", keep="last").reset_index(drop=True)
+    df["price_clean"] = clean_price_column(df["price"])
+    df["categories_clean"] = parse_list_column(df["categories"])
+    df["images_clean"] = parse_list_column(df["images"])
+    return df
+
+
+def document_texts(df: pd.DataFrame) -> pd.Series:
+    """Builds the text to embed for every row with vectorised string operations."""
+    return (
+        "Title: " + df["title"]
+        + "\nBrand: " + df["brand"]
+        + "\nDescription: " + df["description"]
+        + "\nCategories: " + df["categories_clean"].str.join(", ")
+        + "\nMaterial: " + df["material"]
+        + "\nColor: " + df["color"]
+    )
+
+
+def content_hashes(df: pd.DataFrame) -> np.ndarray:
+    """A 64-bit hash per row over every hashed column, as hex strings."""
+    columns = [column for column in HASHED_COLUMNS if column in df.columns]
+    hashes = pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+    return np.char.mod("%016x", hashes)
+
+
+def create_documents(df: pd.DataFrame, texts: Sequence[str]) -> List[Document]:
+    """
+    Converts cleaned rows into LangChain Document objects.
+    Metadata is stored in native types: categories and images as lists of
+    strings and price_clean as a float, so nothing is re-parsed downstream.
+    """
+    df = df.drop(columns=["categories", "images"]).rename(
+        columns={"categories_clean": "categories", "images_clean": "images"}
+    )
+    records = df.to_dict(orient="records")
+    return [Document(page_content=text, metadata=metadata) for metadata, text in zip(records, texts)]
+
+
+def native_metadata(metadata: dict) -> dict:
+    """Upgrades document metadata saved with stringified lists by older ingestions."""
+    for field in ("categories", "images"):
+        parsed = metadata.pop(f"{field}_clean", None)
+        if isinstance(metadata.get(field), str):
+            metadata[field] = parsed if isinstance(parsed, list) else parse_list_column(pd.Series([metadata[field]]))[0]
+    return metadata
+
+
+# --- Stage 3: change tracking, checkpoints ---
+
+class IngestState:
+    """
+    Content hashes of every ingested product plus run checkpoints, in SQLite.
+    Product rows are only committed together with a sink checkpoint, so the
+    state never claims more than the saved index contains.
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS products (
+                uniq_id TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                run_id INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS products_run ON products (run_id);
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                source TEXT NOT NULL,
+                chunks_done INTEGER NOT NULL DEFAULT 0,
+                finished INTEGER NOT NULL DEFAULT 0,
+                started_at REAL NOT NULL
+            );
+            """
+        )
+        self.conn.commit()
+
+    def product_count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    def reset(self):
+        self.conn.execute("DELETE FROM products")
+        self.conn.execute("DELETE FROM runs")
+        self.conn.commit()
+
+    def start_run(self, source: str) -> Tuple[int, int]:
+        """Returns (run id, chunks already done), resuming an unfinished run over the same source."""
+        row = self.conn.execute(
+            "SELECT run_id, chunks_done FROM runs WHERE finished = 0 AND source = ? "
+            "ORDER BY run_id DESC LIMIT 1",
+            (source,),
+        ).fetchone()
+        if row is not None:
+            return row[0], row[1]
+        cursor = self.conn.execute(
+            "INSERT INTO runs (source, started_at) VALUES (?, ?)", (source, time.time())
+        )
+        self.conn.commit()
+        return cursor.lastrowid, 0
+
+    def changed(self, uniq_ids: Sequence[str], hashes: Sequence[str]) -> Tuple[np.ndarray, set]:
+        """Returns (mask of new or changed rows, ids that already exist in the index)."""
+        known = {}
+        for start in range(0, len(uniq_ids), 500):
+            chunk = list(uniq_ids[start:start + 500])
+            placeholders = ",".join("?" * len(chunk))
+            known.update(self.conn.execute(
+                f"SELECT uniq_id, content_hash FROM products WHERE uniq_id IN ({placeholders})", chunk
+            ).fetchall())
+        mask = np.array([known.get(u) != h for u, h in zip(uniq_ids, hashes)], dtype=bool)
+        return mask, set(known)
+
+    def mark_seen(self, run_id: int, uniq_ids: Sequence[str], hashes: Sequence[str]):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO products (uniq_id, content_hash, run_id) VALUES (?, ?, ?)",
+            [(u, h, run_id) for u, h in zip(uniq_ids, hashes)],
+        )
+
+    def unseen(self, run_id: int) -> List[str]:
+        """Products from earlier runs that this run didn't see, i.e. removed from the catalog."""
+        return [row[0] for row in self.conn.execute(
+            "SELECT uniq_id FROM products WHERE run_id != ?", (run_id,)
+        )]
+
+    def forget(self, uniq_ids: Sequence[str]):
+        self.conn.executemany("DELETE FROM products WHERE uniq_id = ?", [(u,) for u in uniq_ids])
+
+    def checkpoint(self, run_id: int, chunks_done: int):
+        self.conn.execute("UPDATE runs SET chunks_done = ? WHERE run_id = ?", (chunks_done, run_id))
+        self.conn.commit()
+
+    def finish(self, run_id: int):
+        self.conn.execute("UPDATE runs SET finished = 1 WHERE run_id = ?", (run_id,))
+        self.conn.commit()
+
+
+# --- Stage 4: batched embedding on a process pool ---
+
+_worker_embeddings = None
+
+
+def _init_embedding_worker(backend: str, num_threads: int):
+    global _worker_embeddings
+    from app.services.embedding_backends import create_embedding_model
+    _worker_embeddings = create_embedding_model(backend, num_threads)
+
+
+def _embed_in_worker(texts: List[str]) -> np.ndarray:
+    return np.asarray(_worker_embeddings.embed_documents(texts), dtype=np.float32)
+
+
+class EmbeddingPool:
+    """
+    Embeds texts in fixed-size batches. With workers > 0 the batches run on a
+    process pool (one model per process); with 0 they run in this process
+    through `vector_store.get_embedding_model()`. Either way, texts already in
+    the persistent embedding cache are never sent to a model.
+    """
+
+    def __init__(self, workers: int, batch_size: int):
+        self.workers = workers
+        self.batch_size = batch_size
+        self._pool = None
+        if workers > 0:
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            self._pool = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_embedding_worker,
+                initargs=(settings.EMBEDDING_BACKEND, threads),
+            )
+
+    def _batches(self, texts: Sequence[str]) -> List[List[str]]:
+        return [list(texts[i:i + self.batch_size]) for i in range(0, len(texts), self.batch_size)]
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        if not len(texts):
+            return np.zeros((0, 0), dtype=np.float32)
+        if self._pool is None:
+            # The in-process model is already wrapped in the embedding cache
+            from app.services.vector_store import get_embedding_model
+            model = get_embedding_model()
+            return np.vstack([np.asarray(model.embed_documents(batch), dtype=np.float32)
+                              for batch in self._batches(texts)])
+
+        cache = get_embedding_cache()
+        cached = cache.get_many(texts) if cache is not None else [None] * len(texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, cached) if vector is None))
+        by_text = {}
+        if missing:
+            computed = np.vstack(list(self._pool.map(_embed_in_worker, self._batches(missing))))
+            if cache is not None:
+                cache.put_many(missing, computed)
+            by_text = dict(zip(missing, computed))
+        return np.vstack([by_text[text] if vector is None else vector for text, vector in zip(texts, cached)])
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+
+
+# --- Stage 5: sinks ---
+
+class DocumentLog:
+    """
+    Documents in row order, stored as columns: a part written in full,
+    then one segment per checkpoint since (`flush()`), then the rows added
+    since the last checkpoint, buffered with their vectors. Everything but
+    the buffer is memory-mapped, and rows are only read back in bulk, as
+    whole columns.
+    A segment is named after the chunks done when it was written; opening
+    with `chunks_done` drops segments a crash left ahead of the ingest
+    state, whose rows the resumed run reads again.
+    """
+
+    def __init__(self):
+        self.parts: List[Dict[str, StringColumn]] = []
+        self._rows = 0
+        self._segments: List[Tuple[int, str]] = []  # (first row, vectors file)
+        self._buffer: Dict[str, List[str]] = {name: [] for name in DOCUMENT_COLUMNS}
+        self._buffer_vectors: List[np.ndarray] = []
+
+    @classmethod
+    def open(cls, directory: str, chunks_done: Optional[int] = None) -> "DocumentLog":
+        log = cls()
+        if columns_exist(directory):
+            log._map(read_columns(directory))
+        segments = os.path.join(directory, SEGMENTS_DIR)
+        for name in sorted(os.listdir(segments)) if os.path.isdir(segments) else []:
+            path = os.path.join(segments, name)
+            if not columns_exist(path) or (chunks_done is not None and int(name) > chunks_done):
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            vectors_path = os.path.join(path, SEGMENT_VECTORS_FILE)
+            log._segments.append((log._rows, vectors_path if os.path.exists(vectors_path) else None))
+            log._map(read_columns(path))
+        return log
+
+    def _map(self, columns: Dict[str, StringColumn]):
+        self.parts.append(columns)
+        self._rows += len(columns["uniq_id"])
+
+    def __len__(self) -> int:
+        return self._rows + len(self._buffer["uniq_id"])
+
+    def append(self, documents: List[Document], vectors: Optional[np.ndarray] = None):
+        for doc in documents:
+            self._buffer["uniq_id"].append(doc.metadata["uniq_id"])
+            self._buffer["text"].append(doc.page_content)
+            self._buffer["metadata"].append(json.dumps(doc.metadata))
+        if vectors is not None:
+            self._buffer_vectors.append(np.ascontiguousarray(vectors, dtype=np.float32))
+
+    def flush(self, directory: str, chunks_done: int):
+        """Writes the buffered rows (and their vectors) as a new segment."""
+        if not self._buffer["uniq_id"]:
+            return
+        path = os.path.join(directory, SEGMENTS_DIR, f"{chunks_done:06d}")
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        vectors_path = None
+        if self._buffer_vectors:
+            vectors_path = os.path.join(path, SEGMENT_VECTORS_FILE)
+            np.save(vectors_path, np.vstack(self._buffer_vectors))
+        # The columns file is written last, so a segment without one is incomplete
+        write_columns(path, self._buffer)
+        self._segments.append((self._rows, vectors_path))
+        self._map(read_columns(path))
+        self._buffer = {name: [] for name in DOCUMENT_COLUMNS}
+        self._buffer_vectors = []
+
+    def column(self, name: str) -> StringColumn:
+        """A whole column, copied into memory."""
+        return concat_columns([part[name] for part in self.parts] + [StringColumn.from_values(self._buffer[name])])
+
+    def segment_vectors(self, start: int) -> Iterator[np.ndarray]:
+        """
+        The saved vectors of rows `start` onwards, in row order. Raises
+        ValueError if any of those rows has none (it's in the part written
+        in full, whose vectors only the index holds).
+        """
+        bounds = [first for first, _ in self._segments[1:]] + [self._rows]
+        covered = self._segments[0][0] if self._segments else self._rows
+        if start < covered:
+            raise ValueError(f"Rows from {start} have no saved vectors")
+        for (first, path), end in zip(self._segments, bounds):
+            if end <= start:
+                continue
+            if path is None:
+                raise ValueError(f"Segment at row {first} has no saved vectors")
+            yield np.load(path)[max(0, start - first):]
+
+    def without(self, rows: set) -> "DocumentLog":
+        """An in-memory log of every row except `rows`."""
+        keep = np.setdiff1d(np.arange(len(self), dtype=np.int64), np.fromiter(rows, dtype=np.int64, count=len(rows)))
+        log = DocumentLog()
+        log._map({name: take_rows(self.column(name), keep) for name in DOCUMENT_COLUMNS})
+        return log
+
+    def write(self, directory: str) -> "DocumentLog":
+        """
+        Writes every row as one part, replacing the directory (and its
+        segments) in one rename, and maps the result.
+        """
+        staging, previous = f"{directory}.tmp", f"{directory}.old"
+        for path in (staging, previous):
+            shutil.rmtree(path, ignore_errors=True)
+        write_columns(staging, {name: self.column(name) for name in DOCUMENT_COLUMNS})
+        if os.path.exists(directory):
+            os.rename(directory, previous)
+        os.rename(staging, directory)
+        shutil.rmtree(previous, ignore_errors=True)
+        return DocumentLog.open(directory)
+
+    def metadata_frame(self) -> pd.DataFrame:
+        """Every row's metadata as a DataFrame, in row order."""
+        return pd.DataFrame.from_records(
+            [native_metadata(json.loads(metadata)) for metadata in self.column("metadata")]
+        )
+
+
+class FaissSink:
+    """
+    Incrementally maintained FAISS index plus the documents of its rows.
+    FAISS ids are row numbers, and a uniq_id -> row dict finds a product's
+    row. Replaced and removed products are only marked deleted, and
+    `compact()` drops them once at the end of the run: flat indexes in
+    place, IVF / HNSW by one rebuild. A checkpoint only appends the rows
+    added since the previous one, with their vectors, as a document
+    segment; `save()` writes the index and the documents in full. The
+    documents are saved as columns next to the index (no pickle), and the
+    API never reads them; it maps the product index built from them.
+    The index is loaded from `path` and saved to `save_path` (default: the
+    same directory), so a new version can be built from the served one.
+    """
+
+    def __init__(self, path: str, save_path: Optional[str] = None, chunks_done: Optional[int] = None):
+        self.path = save_path or path
+        self.reset()
+        index_path = os.path.join(path, FAISS_INDEX_FILE)
+        documents_path = os.path.join(path, DOCUMENTS_DIR)
+        if not (os.path.exists(index_path) and columns_exist(documents_path)):
+            return
+        faiss = dependable_faiss_import()
+        index = faiss.read_index(index_path)
+        documents = DocumentLog.open(documents_path, chunks_done)
+        try:
+            # Rows checkpointed after the index was last written are re-added from their segments
+            for vectors in documents.segment_vectors(index.ntotal):
+                index.add(vectors)
+        except ValueError as e:
+            print(f"Warning: {e}; starting over.")
+            return
+        if index.ntotal != len(documents):
+            print(f"Warning: documents in {documents_path} don't match the FAISS index; starting over.")
+            return
+
+        self.index = index
+        configure_search(self.index)
+        self.documents = documents
+        deleted_path = os.path.join(documents_path, DELETED_ROWS_FILE)
+        if os.path.exists(deleted_path):
+            self.deleted_rows = set(int(row) for row in np.load(deleted_path) if row < index.ntotal)
+        # A product's latest row is its live one
+        uniq_ids = documents.column("uniq_id")
+        self.rows = {uniq_id: row for row, uniq_id in enumerate(uniq_ids) if row not in self.deleted_rows}
+        # The saved index is the target's own only when it was loaded from there
+        self._written = path == self.path
+
+    def reset(self):
+        self.index = None
+        self.documents = DocumentLog()
+        self.rows: Dict[str, int] = {}
+        self.deleted_rows: set = set()
+        self._written = False
+
+    def __len__(self) -> int:
+        """Live products (rows marked deleted don't count)."""
+        return len(self.rows)
+
+    def upsert(self, documents: List[Document], vectors: np.ndarray, existing_ids: set):
+        # Looked up in the sink itself, which may hold rows a crash kept out of the ingest state
+        self.delete([doc.metadata["uniq_id"] for doc in documents])
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.index is None:
+            self.index = build_empty_index(vectors, settings.FAISS_INDEX_TYPE)
+        first = self.index.ntotal
+        self.index.add(vectors)
+        self.documents.append(documents, vectors)
+        for row, doc in enumerate(documents, start=first):
+            self.rows[doc.metadata["uniq_id"]] = row
+
+    def delete(self, uniq_ids: Sequence[str]):
+        """Marks the products' rows deleted; `compact()` drops them."""
+        for uniq_id in uniq_ids:
+            row = self.rows.pop(uniq_id, None)
+            if row is not None:
+                self.deleted_rows.add(row)
+
+    def compact(self, embed: Callable[[Sequence[str]], np.ndarray]):
+        """
+        Drops the rows marked deleted. A flat index removes them in place;
+        an IVF / HNSW index is rebuilt, retrained on the remaining vectors.
+        Those come from `embed` (the embedding cache, or the model for texts
+        no longer in it), never from the index itself, whose IVF_PQ codes
+        are lossy.
+        """
+        if self.index is None or not self.deleted_rows:
+            return
+        index_type = index_type_name(self.index)
+        documents = self.documents.without(self.deleted_rows)
+        if supports_removal(self.index):
+            self.index.remove_ids(np.array(sorted(self.deleted_rows), dtype=np.int64))
+        elif not len(documents):
+            faiss = dependable_faiss_import()
+            self.index = faiss.clone_index(self.index)
+            self.index.reset()
+        else:
+            self.index = build_index(embed(list(documents.column("text"))), index_type)
+        self.documents = documents
+        self.rows = {uniq_id: row for row, uniq_id in enumerate(documents.column("uniq_id"))}
+        self.deleted_rows = set()
+        self._written = False
+
+    def _save_deleted_rows(self):
+        np.save(os.path.join(self.path, DOCUMENTS_DIR, DELETED_ROWS_FILE),
+                np.array(sorted(self.deleted_rows), dtype=np.int64))
+
+    def checkpoint(self, chunks_done: int):
+        """
+        Persists the rows added since the last checkpoint as a document
+        segment with their vectors, plus the deleted-row marks. The index
+        itself is only written the first time (a new version doesn't have
+        one yet) and by `save()`.
+        """
+        if self.index is None:
+            return
+        if not self._written:
+            self.save()
+            return
+        self.documents.flush(os.path.join(self.path, DOCUMENTS_DIR), chunks_done)
+        self._save_deleted_rows()
+
+    def save(self):
+        if self.index is None:
+            return
+        faiss = dependable_faiss_import()
+        os.makedirs(self.path, exist_ok=True)
+        # The index goes first: documents with more rows than it are
+        # completed from their segments on load, fewer can't be
+        faiss.write_index(self.index, os.path.join(self.path, FAISS_INDEX_FILE))
+        self.documents = self.documents.write(os.path.join(self.path, DOCUMENTS_DIR))
+        self._save_deleted_rows()
+        self._written = True
+        # The pickled docstore of older ingestions is no longer read
+        legacy_docstore = os.path.join(self.path, "index.pkl")
+        if os.path.exists(legacy_docstore):
+            os.remove(legacy_docstore)
+
+class PineconeSink:
+    """Batched upserts and deletes against an existing Pinecone index."""
+
+    def __init__(self, index):
+        self.index = index
+
+    def upsert(self, documents: List[Document], vectors: np.ndarray, existing_ids: set):
+        batch_size = settings.PINECONE_UPSERT_BATCH
+        for start in range(0, len(documents), batch_size):
+            self.index.upsert(vectors=[
+                # LangChain's Pinecone store reads the page content from the "text" key
+                (doc.metadata["uniq_id"], vector.tolist(),
+                 {**doc.metadata, **pinecone_filter_metadata(doc.metadata), "text": doc.page_content})
+                for doc, vector in zip(documents[start:start + batch_size], vectors[start:start + batch_size])
+            ])
+
+    def delete(self, uniq_ids: Sequence[str]):
+        for start in range(0, len(uniq_ids), 1000):
+            self.index.delete(ids=list(uniq_ids[start:start + 1000]))
+
+    def compact(self, embed: Callable[[Sequence[str]], np.ndarray]):
+        pass  # Pinecone deletes in place
+
+    def checkpoint(self, chunks_done: int):
+        pass  # Pinecone persists every upsert
+
+    def save(self):
+        pass  # Pinecone persists every upsert
+
+
+# --- Stage 6: product images ---
+
+def primary_image_urls(images: Sequence[Optional[list]]) -> List[Optional[str]]:
+    """Each product's first image URL (None without one), in row order."""
+    return [next(iter(urls or []), None) if isinstance(urls, list) else None for urls in images]
+
+
+def _embed_digests(digests: Sequence[Optional[str]], store, embedder, cache) -> Tuple[List[int], np.ndarray]:
+    """Vectors for one batch of image digests; returns (positions with a vector, vectors)."""
+    unique = list(dict.fromkeys(digest for digest in digests if digest is not None))
+    cached = cache.get_many(unique) if cache is not None else [None] * len(unique)
+    by_digest = {digest: vector for digest, vector in zip(unique, cached) if vector is not None}
+    missing = [digest for digest in unique if digest not in by_digest]
+    if missing:
+        vectors, kept = embedder.embed([store.read(digest) for digest in missing])
+        embedded = [missing[position] for position in kept]
+        if cache is not None and embedded:
+            cache.put_many(embedded, vectors)
+        by_digest.update(zip(embedded, vectors))
+    positions = [i for i, digest in enumerate(digests) if digest in by_digest]
+    if not positions:
+        return [], np.zeros((0, embedder.dim), dtype=np.float32)
+    return positions, np.stack([by_digest[digests[i]] for i in positions])
+
+
+async def embed_product_images(urls: Sequence[Optional[str]], fetcher, embedder, cache,
+                               batch_size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fetches and embeds one image per product, `batch_size` products at a
+    time. The next batch downloads while the current one is embedded on a
+    worker thread, so the network and the CPU are busy at the same time.
+    Vectors are cached by image digest. Returns (positions in `urls` that
+    got a vector, their vectors).
+    """
+    starts = list(range(0, len(urls), batch_size))
+    rows: List[int] = []
+    vectors = [np.zeros((0, embedder.dim), dtype=np.float32)]
+    fetching = asyncio.ensure_future(fetcher.fetch_many(urls[:batch_size])) if starts else None
+    for i, start in enumerate(starts):
+        digests = await fetching
+        if i + 1 < len(starts):
+            following = starts[i + 1]
+            fetching = asyncio.ensure_future(fetcher.fetch_many(urls[following:following + batch_size]))
+        positions, batch_vectors = await asyncio.to_thread(_embed_digests, digests, fetcher.store, embedder, cache)
+        rows.extend(start + position for position in positions)
+        vectors.append(batch_vectors)
+    return np.asarray(rows, dtype=np.int64), np.vstack(vectors)
@@ -0,0 +1,93 @@
+"""
+Pre-generates creative descriptions for the whole catalog.
+
+Run from the `backend` directory:
+    python -m app.data_ingestion.pregenerate_descriptions [--concurrency 8] [--limit N]
+
+Products whose description is already in the store (same fields, template
+and model) are skipped, so the job can be re-run after every ingestion.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import pandas as pd
+
+# Add the project root to the path to allow imports from app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.core.config import settings
+from app.models.schemas import Product
+from app.services.description_store import description_store
+from app.services import generative
+
+
+def load_products(data_file_path: str) -> list[Product]:
+    """Reads the catalog CSV and returns the fields the prompt depends on."""
+    df = pd.read_csv(data_file_path).fillna("").astype(str)
+    return [
+        Product(
+            uniq_id=row["uniq_id"],
+            title=row["title"],
+            brand=row["brand"],
+            description=row["description"],
+            material=row["material"],
+            color=row["color"],
+        )
+        for row in df.to_dict(orient="records")
+    ]
+
+
+async def pregenerate(products: list[Product], concurrency: int) -> int:
+    """Generates descriptions for `products` with at most `concurrency` LLM calls in flight."""
+    semaphore = asyncio.Semaphore(concurrency)
+    done = 0
+    failed = 0
+    started = time.perf_counter()
+
+    async def worker(product: Product):
+        nonlocal done, failed
+        async with semaphore:
+            description = await generative.generate_creative_description(product)
+        if description == generative.FALLBACK_DESCRIPTION:
+            failed += 1
+        done += 1
+        if done % 50 == 0 or done == len(products):
+            rate = done / (time.perf_counter() - started)
+            print(f"  {done}/{len(products)} descriptions ({rate:.1f}/s, {failed} failed)")
+
+    await asyncio.gather(*(worker(product) for product in products))
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate product descriptions.")
+    parser.add_argument("--concurrency", type=int, default=settings.PREGENERATE_CONCURRENCY)
+    parser.add_argument("--limit", type=int, default=None, help="Only process the first N products.")
+    parser.add_argument("--data-file", default=settings.DATA_FILE_PATH)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.data_file):
+        print(f"Error: Data file not found at {args.data_file}")
+        return
+
+    products = load_products(args.data_file)
+    if args.limit is not None:
+        products = products[:args.limit]
+
+    stored = description_store.get_many(generative.description_key(p) for p in products)
+    pending = [p for p in products if generative.description_key(p) not in stored]
+    print(f"{len(products)} products, {len(products) - len(pending)} already stored, "
+          f"{len(pending)} to generate (concurrency={args.concurrency}).")
+
+    if pending:
+        failed = asyncio.run(pregenerate(pending, args.concurrency))
+        if failed:
+            print(f"Warning: {failed} descriptions failed and were not stored. Re-run to retry.")
+
+    print(f"Description store now holds {description_store.count()} entries.")
+
+
+if __name__ == "__main__":
+    main()
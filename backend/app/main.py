@@ -1,17 +1,29 @@
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse, StreamingResponse
 from contextlib import asynccontextmanager
-import pandas as pd
+from typing import List, Optional
 import warnings
-import re
+import asyncio
+import hmac
+import orjson
+import time
 
 from app.models.schemas import (
     RecommendationRequest, 
     RecommendationResponse,
+    BatchRecommendationRequest,
+    BatchRecommendationResponse,
     AnalyticsData,
-    Product
+    ProductPage,
+    SimilarProductsResponse
 )
-from app.services import recommendations, vector_store
+from app.services import recommendations, vector_store, scheduler, product_index, similar, instrumentation, resilience
+from app.services import serialization
+from app.services.response_cache import response_cache
+from app.services.embedding_cache import get_embedding_cache
+from app.services.warmup import warmup_state
+from app.services.index_registry import index_registry
 from app.core.config import settings
 
 # --- Application Lifespan (Startup/Shutdown) ---
@@ -24,27 +36,36 @@ async def lifespan(app: FastAPI):
     print("Application startup...")
     # Suppress a specific pandas warning
     warnings.simplefilter(action='ignore', category=UserWarning)
+
+    # Map the published index version (catalog, sparse index, analytics
+    # snapshot) once, not per request
+    index_registry.current()
+
+    # Swap in new versions published by the ingestion script without a restart
+    watcher = None
+    if settings.INDEX_RELOAD_POLL_SECONDS > 0:
+        watcher = asyncio.create_task(index_registry.watch(settings.INDEX_RELOAD_POLL_SECONDS))
     
-    # Load the vector store into memory
-    #try:
-        #vector_store.get_vector_store()
-        #print("Vector store initialized.")
-    #except Exception as e:
-        #print(f"CRITICAL: Failed to initialize vector store: {e}")
-        # In a real app, you might want to prevent startup
+    # Load the embedding model, vector store and LLM chains in the background;
+    # /ready turns 200 once they're loaded and a warm-up query has run
+    if settings.WARMUP_ON_STARTUP:
+        warmup_state.start()
     
     yield
     
     # Shutdown:
     print("Application shutdown...")
-    # Any cleanup code would go here
+    if watcher is not None:
+        watcher.cancel()
 
 # --- FastAPI App Initialization ---
 app = FastAPI(
     title="FurniFindr API",
     description="API for furniture recommendations and analytics.",
     version="0.1.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    # Endpoints returning plain dicts are encoded with orjson
+    default_response_class=ORJSONResponse
 )
 
 # --- CORS Middleware ---
@@ -57,19 +78,42 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# --- Cached Data for Analytics ---
-# For a simple demo, we load the CSV into pandas once for analytics.
-# In a real app, this would come from a proper database.
-try:
-    analytics_df = pd.read_csv(settings.DATA_FILE_PATH)
-    analytics_df = analytics_df.fillna("")
-    analytics_df['price_clean'] = analytics_df['price'].apply(
-        lambda x: float(re.sub(r"[$,]", "", str(x))) if isinstance(x, str) and re.sub(r"[$,]", "", str(x)) else 0.0
-    )
-    analytics_df['has_image'] = analytics_df['images'].apply(lambda x: isinstance(x, str) and len(x) > 5)
-except FileNotFoundError:
-    print(f"Warning: Analytics data file not found at {settings.DATA_FILE_PATH}")
-    analytics_df = pd.DataFrame() # Empty dataframe
+# --- Instrumentation Middleware ---
+def _admin_allowed(token: Optional[str]) -> bool:
+    """
+    True only when ADMIN_TOKEN is set and the request carries it; admin
+    features are off without a configured token. Compared in constant time.
+    """
+    if not settings.ADMIN_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode("utf-8"), settings.ADMIN_TOKEN.encode("utf-8"))
+
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    """
+    Times every request per route, reports its pipeline stages in a
+    Server-Timing header and, when PROFILING_ENABLED, profiles requests
+    sent with "X-Profile: 1". Streaming responses are timed up to their
+    first byte.
+    """
+    timings = instrumentation.start_request()
+    profiler = None
+    if (settings.PROFILING_ENABLED and request.headers.get("x-profile") == "1"
+            and _admin_allowed(request.headers.get("x-admin-token"))):
+        profiler = instrumentation.SamplingProfiler(settings.PROFILE_INTERVAL_MS)
+        profiler.start()
+    try:
+        response = await call_next(request)
+    finally:
+        profile_path = profiler.save(request.url.path) if profiler is not None else None
+
+    route = request.scope.get("route")
+    instrumentation.request_seconds.observe(getattr(route, "path", "unmatched"), time.perf_counter() - timings.started)
+    if settings.SERVER_TIMING_HEADER:
+        response.headers["Server-Timing"] = timings.server_timing()
+    if profile_path:
+        response.headers["X-Profile-File"] = profile_path
+    return response
 
 # --- API Endpoints ---
 
@@ -78,6 +122,65 @@ async def health_check():
     """Simple health check endpoint."""
     return {"status": "ok", "vector_db": settings.VECTOR_DB}
 
+@app.get("/ready", tags=["General"])
+async def readiness_check():
+    """
+    Readiness probe: 503 until the startup warm-up has loaded the model,
+    the vector store and the LLM chains, so traffic only reaches warm workers.
+    """
+    report = warmup_state.report()
+    if not settings.WARMUP_ON_STARTUP:
+        # Nothing is preloaded; components load on first use
+        return {**report, "status": "ready"}
+    return JSONResponse(content=report, status_code=200 if warmup_state.ready else 503)
+
+@app.get("/stats", tags=["General"])
+async def get_stats():
+    """Runtime counters for the in-process caches, schedulers and circuit breakers."""
+    embedding_cache = get_embedding_cache()
+    return {
+        "response_cache": response_cache.stats(),
+        "embedding_cache": embedding_cache.stats() if embedding_cache is not None else None,
+        "scheduler": scheduler.stats(),
+        "resilience": resilience.stats(),
+        "index": index_registry.stats(),
+        "stages": instrumentation.stage_seconds.summary()
+    }
+
+@app.get("/metrics", tags=["General"], response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus text exposition: stage and route latency histograms plus cache, queue and index stats."""
+    embedding_cache = get_embedding_cache()
+    body = instrumentation.exposition(
+        {
+            "response_cache": response_cache.stats(),
+            "embedding_cache": embedding_cache.stats() if embedding_cache is not None else None,
+            "scheduler": scheduler.stats(),
+            "resilience": resilience.stats(),
+            "index": index_registry.stats(),
+        },
+        {
+            "index_version": str(index_registry.stats()["version"]),
+            "vector_db": settings.VECTOR_DB,
+            "embedding_backend": settings.EMBEDDING_BACKEND,
+        },
+    )
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+@app.post("/admin/reload-index", tags=["Admin"])
+async def reload_index(force: bool = False, x_admin_token: Optional[str] = Header(None)):
+    """
+    Swaps in the index version most recently published by the ingestion
+    script (or reloads the current one with force=true). In-flight requests
+    finish on the version they started with.
+    """
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not _admin_allowed(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    swapped = await asyncio.to_thread(index_registry.reload, force)
+    return {"swapped": swapped, **index_registry.stats()}
+
 @app.post("/recommend", 
           response_model=RecommendationResponse, 
           tags=["Recommendations"])
@@ -87,66 +190,129 @@ async def recommend_products(request: RecommendationRequest):
     Receives a user prompt and returns ranked recommendations
     with generated descriptions.
     """
-    return await recommendations.get_recommendations(request)
+    response = await recommendations.get_recommendations(request)
+    with instrumentation.span("serialize"):
+        body = serialization.recommendations_json(response)
+    return Response(content=body, media_type="application/json")
+
+@app.post("/recommend/batch",
+          response_model=BatchRecommendationResponse,
+          tags=["Recommendations"])
+async def recommend_products_batch(batch: BatchRecommendationRequest):
+    """
+    Recommendations for several prompts in one call, returned in request order.
+    Prompts are embedded together and searched with one multi-query index
+    search; a product recommended for several prompts is described once.
+    """
+    if len(batch.requests) > settings.RECOMMEND_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.RECOMMEND_BATCH_MAX_SIZE} requests per batch."
+        )
+    results = await recommendations.get_batch_recommendations(batch.requests)
+    with instrumentation.span("serialize"):
+        body = serialization.batch_recommendations_json(results)
+    return Response(content=body, media_type="application/json")
+
+@app.post("/recommend/stream", tags=["Recommendations"])
+async def recommend_products_stream(request: RecommendationRequest):
+    """
+    Streaming version of /recommend using Server-Sent Events.
+    The retrieved products are sent as soon as retrieval completes,
+    followed by each generated description as its LLM call streams in.
+    """
+    async def event_stream():
+        async for event, data in recommendations.stream_recommendations(request):
+            yield b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.get("/analytics-data", 
          response_model=AnalyticsData, 
          tags=["Analytics"])
-async def get_analytics_data():
+async def get_analytics_data(request: Request):
     """
     Endpoint to feed the analytics dashboard.
-    Computes stats from the loaded CSV.
+    Serves the snapshot saved with the current index version;
+    clients sending a matching If-None-Match get a 304.
     """
-    if analytics_df.empty:
-        return {"total_products": 0, "price_distribution": {}, "category_counts": {}, "brand_counts": {}, "image_coverage_percent": 0}
+    with index_registry.acquire() as bundle:
+        etag, body = bundle.analytics_snapshot()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
-    # 1. Price Distribution (Histogram)
-    price_hist = pd.cut(analytics_df['price_clean'], bins=[0, 50, 100, 200, 500, 10000]).value_counts().sort_index()
-    price_dist_data = [{"name": str(k), "count": int(v)} for k, v in price_hist.to_dict().items()]
+@app.get("/products", 
+         response_model=ProductPage, 
+         tags=["Products"])
+async def get_all_products(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    brand: Optional[List[str]] = Query(None),
+    category: Optional[List[str]] = Query(None),
+    material: Optional[List[str]] = Query(None),
+    color: Optional[List[str]] = Query(None),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0)
+):
+    """
+    Get product metadata, one page at a time. Used by analytics page for filtering.
+    Repeat a filter parameter to match any of several values (e.g. ?brand=A&brand=B).
+    """
+    with index_registry.acquire() as bundle:
+        index = bundle.product_index
+        rows = index.filter_rows(
+            brands=brand,
+            categories=category,
+            materials=material,
+            colors=color,
+            min_price=min_price,
+            max_price=max_price
+        )
+        try:
+            body = index.page_json(rows, cursor, limit)
+        except product_index.InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return Response(content=body, media_type="application/json")
 
-    # 2. Category Counts (Top 5)
-    # Needs exploding the list
+@app.get("/products/{uniq_id}/similar",
+         response_model=SimilarProductsResponse,
+         tags=["Products"])
+async def get_similar_products(uniq_id: str, top_k: int = Query(10, ge=1, le=100)):
+    """
+    "More like this" for a product page. Uses the product's stored vector
+    (or its precomputed neighbours), so no embedding is computed.
+    """
     try:
-        categories_s = analytics_df['categories'].apply(lambda x: ast.literal_eval(x) if isinstance(x, str) and x.startswith('[') else ['Other'])
-        all_categories = categories_s.explode().str.strip()
-        cat_counts = all_categories.value_counts().head(10).to_dict()
-    except:
-        cat_counts = {"Error": "Could not parse categories"}
-
-    # 3. Brand Counts (Top 10)
-    brand_counts = analytics_df['brand'].value_counts().head(10).to_dict()
-
-    # 4. Image Coverage
-    image_coverage = (analytics_df['has_image'].sum() / len(analytics_df)) * 100
-
-    return AnalyticsData(
-        total_products=int(len(analytics_df)),
-        price_distribution=price_dist_data,
-        category_counts=cat_counts,
-        brand_counts=brand_counts,
-        image_coverage_percent=round(image_coverage, 2)
-    )
+        products = await asyncio.to_thread(similar.similar_products, uniq_id, top_k)
+    except similar.ProductNotFound:
+        raise HTTPException(status_code=404, detail=f"Product {uniq_id} not found")
+    with instrumentation.span("serialize"):
+        body = serialization.similar_products_json(uniq_id, products)
+    return Response(content=body, media_type="application/json")
 
-@app.get("/products", 
-         response_model=list[Product], 
+@app.get("/products/{uniq_id}/visually-similar",
+         response_model=SimilarProductsResponse,
          tags=["Products"])
-async def get_all_products():
+async def get_visually_similar_products(uniq_id: str, top_k: int = Query(10, ge=1, le=100)):
     """
-    Get all product metadata. Used by analytics page for filtering.
-    (Note: In a real app, this should be paginated)
+    Products that look like this one: nearest neighbours of its image in
+    the image index built at ingestion (IMAGE_INDEX_ENABLED). 404 for
+    products without an indexed image, 503 when the served index has none.
     """
-    if analytics_df.empty:
-        return []
-    
-    products = [
-        Product(
-            uniq_id=row.get("uniq_id"),
-            title=row.get("title"),
-            brand=row.get("brand"),
-            price=row.get("price"),
-            images=ast.literal_eval(row.get("images", "[]")) if isinstance(row.get("images"), str) and row.get("images").startswith('[') else [],
-            categories=ast.literal_eval(row.get("categories", "[]")) if isinstance(row.get("categories"), str) and row.get("categories").startswith('[') else [],
-            # Add other fields as needed
-        ) for _, row in analytics_df.head(50).iterrows() # Limit to 50 for demo
-    ]
-    return products
\ No newline at end of file
+    try:
+        products = await asyncio.to_thread(similar.visually_similar_products, uniq_id, top_k)
+    except similar.ImageNotIndexed:
+        raise HTTPException(status_code=404, detail=f"Product {uniq_id} has no indexed image")
+    except similar.ProductNotFound:
+        raise HTTPException(status_code=404, detail=f"Product {uniq_id} not found")
+    except similar.ImageIndexUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    with instrumentation.span("serialize"):
+        body = serialization.similar_products_json(uniq_id, products)
+    return Response(content=body, media_type="application/json")
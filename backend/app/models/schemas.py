@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 from typing import List, Optional, Any
 
 class Product(BaseModel):
@@ -22,12 +22,30 @@ class Product(BaseModel):
     # This field will be added by our GenAI service
     generated_description: Optional[str] = None
 
+    # The product's JSON as stored in the product index (with a null
+    # generated_description), set for catalog reads; the catalog fields
+    # must not change after it is set
+    _record: Optional[bytes] = PrivateAttr(default=None)
+
+class ProductFilters(BaseModel):
+    """
+    Structured filters applied before the vector search.
+    Several values for one field match any of them; fields are combined with AND.
+    """
+    min_price: Optional[float] = Field(default=None, ge=0)
+    max_price: Optional[float] = Field(default=None, ge=0)
+    brands: List[str] = Field(default_factory=list)
+    categories: List[str] = Field(default_factory=list)
+    materials: List[str] = Field(default_factory=list)
+    colors: List[str] = Field(default_factory=list)
+
 class RecommendationRequest(BaseModel):
     """
     The shape of the request body for the /recommend endpoint.
     """
     prompt: str
     top_k: int = 3
+    filters: Optional[ProductFilters] = None
 
 class RecommendationResponse(BaseModel):
     """
@@ -35,12 +53,41 @@ class RecommendationResponse(BaseModel):
     """
     recommendations: List[Product]
 
+class BatchRecommendationRequest(BaseModel):
+    """
+    The shape of the request body for the /recommend/batch endpoint.
+    """
+    requests: List[RecommendationRequest] = Field(min_length=1)
+
+class BatchRecommendationResponse(BaseModel):
+    """
+    The shape of the response from the /recommend/batch endpoint:
+    one result per request, in request order.
+    """
+    results: List[RecommendationResponse]
+
+class SimilarProductsResponse(BaseModel):
+    """
+    The shape of the response from the /products/{uniq_id}/similar endpoint.
+    """
+    uniq_id: str
+    similar: List[Product]
+
+class ProductPage(BaseModel):
+    """
+    The shape of the response from the /products endpoint.
+    Pass `next_cursor` back as `cursor` to fetch the following page.
+    """
+    items: List[Product]
+    next_cursor: Optional[str] = None
+    total: int
+
 class AnalyticsData(BaseModel):
     """
     The shape of the response from the /analytics-data endpoint.
     """
     total_products: int
-    price_distribution: dict
+    price_distribution: List[dict]
     category_counts: dict
     brand_counts: dict
     image_coverage_percent: float
\ No newline at end of file
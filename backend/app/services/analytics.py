@@ -0,0 +1,373 @@
+from app.core.config import settings
+from app.services.columnar import columns_exist, read_arrays, read_columns, write_arrays, write_columns
+from typing import Dict, Iterable, List, Optional, Tuple
+import pandas as pd
+import numpy as np
+import threading
+import hashlib
+import json
+import ast
+import os
+
+# Histogram edges for the price distribution; bins are right-closed like pd.cut
+PRICE_BINS = np.array([0, 50, 100, 200, 500, 10000], dtype=np.float64)
+PRICE_BIN_LABELS = [f"({lo}, {hi}]" for lo, hi in zip(PRICE_BINS[:-1].astype(int), PRICE_BINS[1:].astype(int))]
+
+TOP_CATEGORIES = 10
+TOP_BRANDS = 10
+
+# Snapshot written into each index version at ingestion
+ANALYTICS_FILE = "analytics.json"
+# The engine's columns, saved next to the snapshot so the next ingestion
+# can apply its changes to them instead of recounting the catalog
+ANALYTICS_STATE_DIR = "analytics"
+_STATE_ARRAYS = ("alive", "price_bins", "brand_codes", "has_image", "category_indptr", "category_indices")
+
+
+def snapshot_etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+def load_snapshot(directory: str) -> Optional[Tuple[str, bytes]]:
+    """Reads a snapshot saved by `AnalyticsEngine.save_snapshot`, or None if there isn't one."""
+    path = os.path.join(directory, ANALYTICS_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        body = f.read()
+    return snapshot_etag(body), body
+
+
+def clean_price_column(prices: pd.Series) -> np.ndarray:
+    """Vectorised '$1,299.00' -> 1299.0; unparseable values become 0.0."""
+    stripped = prices.astype(str).str.replace(r"[$,]", "", regex=True)
+    return pd.to_numeric(stripped, errors="coerce").fillna(0.0).to_numpy(dtype=np.float64)
+
+
+def price_bin_codes(prices: np.ndarray) -> np.ndarray:
+    """Maps prices to their PRICE_BINS bucket, or -1 when outside every bucket."""
+    codes = np.searchsorted(PRICE_BINS, prices, side="left") - 1
+    codes[(prices <= PRICE_BINS[0]) | (prices > PRICE_BINS[-1])] = -1
+    return codes
+
+
+def _parse_categories(value) -> List[str]:
+    if isinstance(value, (list, tuple)):
+        return [str(item).strip() for item in value]
+    if isinstance(value, str) and value.startswith("["):
+        try:
+            parsed = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return ["Other"]
+        return [str(item).strip() for item in parsed]
+    return ["Other"]
+
+
+def _has_images(value) -> bool:
+    """Native image lists (ingested metadata) or stringified ones (the raw CSV)."""
+    if isinstance(value, (list, tuple)):
+        return len(value) > 0
+    return isinstance(value, str) and len(value) > 5
+
+
+def parse_category_column(categories: pd.Series) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """
+    Parses a column of category lists (native or stringified) into a
+    CSR-style index: row i's category codes are indices[indptr[i]:indptr[i + 1]].
+    Each distinct value is only parsed once.
+    """
+    # Lists aren't hashable; tuples factorize the same way
+    categories = categories.map(lambda value: tuple(value) if isinstance(value, list) else value)
+    row_codes, uniques = pd.factorize(categories, use_na_sentinel=False)
+    parsed_uniques = [_parse_categories(value) for value in uniques]
+
+    vocabulary: Dict[str, int] = {}
+    unique_codes = [
+        np.array([vocabulary.setdefault(name, len(vocabulary)) for name in names], dtype=np.int32)
+        for names in parsed_uniques
+    ]
+    lengths = np.array([len(codes) for codes in unique_codes], dtype=np.int64)[row_codes]
+    indptr = np.zeros(len(row_codes) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    indices = (
+        np.concatenate([unique_codes[code] for code in row_codes])
+        if len(row_codes) else np.array([], dtype=np.int32)
+    )
+    return indptr, indices.astype(np.int32), list(vocabulary)
+
+
+class AnalyticsEngine:
+    """
+    Precomputed dashboard aggregates over the product catalog.
+
+    The catalog is parsed once into typed columns (float prices, categorical
+    brand codes, a CSR category index) and the aggregates are kept as count
+    arrays. Product upserts and removals adjust the counts incrementally and
+    bump the version; the serialised dashboard payload and its ETag are
+    rebuilt at most once per version.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = 0
+
+        # Typed columns, one row per product
+        self._row_by_id: Dict[str, int] = {}
+        self._alive = np.zeros(0, dtype=bool)
+        self._price_bins = np.zeros(0, dtype=np.int64)
+        self._brand_codes = np.zeros(0, dtype=np.int64)
+        self._has_image = np.zeros(0, dtype=bool)
+        self._category_indptr = np.zeros(1, dtype=np.int64)
+        self._category_indices = np.zeros(0, dtype=np.int32)
+        # Rows changed after the bulk load keep their category codes here
+        self._category_overrides: Dict[int, np.ndarray] = {}
+
+        self._brands: List[str] = []
+        self._brand_lookup: Dict[str, int] = {}
+        self._categories: List[str] = []
+        self._category_lookup: Dict[str, int] = {}
+
+        # Aggregates
+        self._price_counts = np.zeros(len(PRICE_BIN_LABELS), dtype=np.int64)
+        self._brand_counts = np.zeros(0, dtype=np.int64)
+        self._category_counts = np.zeros(0, dtype=np.int64)
+        self._image_count = 0
+        self._total = 0
+
+        self._snapshot: Optional[Tuple[int, str, bytes]] = None
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> "AnalyticsEngine":
+        """Builds the columns and aggregates from a raw catalog DataFrame in one vectorised pass."""
+        engine = cls()
+        if df.empty:
+            return engine
+        df = df.fillna("")
+
+        engine._price_bins = price_bin_codes(clean_price_column(df["price"]))
+        brand_codes, brands = pd.factorize(df["brand"].astype(str), use_na_sentinel=False)
+        engine._brand_codes = brand_codes.astype(np.int64)
+        engine._brands = list(brands)
+        engine._brand_lookup = {name: code for code, name in enumerate(engine._brands)}
+        engine._has_image = df["images"].map(_has_images).to_numpy(dtype=bool)
+
+        indptr, indices, categories = parse_category_column(df["categories"])
+        engine._category_indptr, engine._category_indices = indptr, indices
+        engine._categories = categories
+        engine._category_lookup = {name: code for code, name in enumerate(categories)}
+
+        engine._row_by_id = {uniq_id: row for row, uniq_id in enumerate(df["uniq_id"].astype(str))}
+        engine._alive = np.ones(len(df), dtype=bool)
+        engine._recount()
+        return engine
+
+    def _recount(self):
+        """Recomputes the aggregates from the columns of the live rows."""
+        alive = self._alive
+        bins = self._price_bins[alive]
+        self._price_counts = np.bincount(bins[bins >= 0], minlength=len(PRICE_BIN_LABELS)).astype(np.int64)
+        self._brand_counts = np.bincount(self._brand_codes[alive], minlength=len(self._brands)).astype(np.int64)
+        lengths = np.diff(self._category_indptr)
+        live_categories = self._category_indices[np.repeat(alive, lengths)]
+        self._category_counts = np.bincount(live_categories, minlength=len(self._categories)).astype(np.int64)
+        self._image_count = int(self._has_image[alive].sum())
+        self._total = int(alive.sum())
+        self.version += 1
+
+    def __len__(self) -> int:
+        """Live products."""
+        return self._total
+
+    # --- Incremental updates ---
+
+    def _code(self, name: str, names: List[str], lookup: Dict[str, int], counts_attr: str) -> int:
+        code = lookup.get(name)
+        if code is None:
+            code = len(names)
+            names.append(name)
+            lookup[name] = code
+            setattr(self, counts_attr, np.append(getattr(self, counts_attr), 0))
+        return code
+
+    def _row_categories(self, row: int) -> np.ndarray:
+        if row in self._category_overrides:
+            return self._category_overrides[row]
+        return self._category_indices[self._category_indptr[row]:self._category_indptr[row + 1]]
+
+    def _apply(self, row: int, sign: int):
+        """Adds (sign=1) or subtracts (sign=-1) a row's contribution to the aggregates."""
+        if self._price_bins[row] >= 0:
+            self._price_counts[self._price_bins[row]] += sign
+        self._brand_counts[self._brand_codes[row]] += sign
+        np.add.at(self._category_counts, self._row_categories(row), sign)
+        self._image_count += sign * int(self._has_image[row])
+        self._total += sign
+
+    def upsert_products(self, records: Iterable[dict]):
+        """Adds new products or replaces existing ones (matched on uniq_id)."""
+        records = list(records)
+        if not records:
+            return
+        price_bins = price_bin_codes(clean_price_column(pd.Series([record.get("price", "") for record in records])))
+        with self._lock:
+            # New rows are appended in one go rather than one array copy each
+            new_ids = [uniq_id for uniq_id in dict.fromkeys(str(record.get("uniq_id", "")) for record in records)
+                       if uniq_id not in self._row_by_id]
+            if new_ids:
+                first = len(self._alive)
+                self._row_by_id.update((uniq_id, row) for row, uniq_id in enumerate(new_ids, start=first))
+                grow = len(new_ids)
+                self._alive = np.concatenate([self._alive, np.zeros(grow, dtype=bool)])
+                self._price_bins = np.concatenate([self._price_bins, np.full(grow, -1, dtype=np.int64)])
+                self._brand_codes = np.concatenate([self._brand_codes, np.zeros(grow, dtype=np.int64)])
+                self._has_image = np.concatenate([self._has_image, np.zeros(grow, dtype=bool)])
+                self._category_indptr = np.concatenate([
+                    self._category_indptr, np.full(grow, self._category_indptr[-1], dtype=np.int64)
+                ])
+
+            for record, price_bin in zip(records, price_bins):
+                row = self._row_by_id[str(record.get("uniq_id", ""))]
+                if self._alive[row]:
+                    self._apply(row, -1)
+                self._price_bins[row] = price_bin
+                self._brand_codes[row] = self._code(
+                    str(record.get("brand", "")), self._brands, self._brand_lookup, "_brand_counts"
+                )
+                self._has_image[row] = _has_images(record.get("images"))
+                self._category_overrides[row] = np.array([
+                    self._code(name, self._categories, self._category_lookup, "_category_counts")
+                    for name in _parse_categories(record.get("categories"))
+                ], dtype=np.int32)
+                self._alive[row] = True
+                self._apply(row, 1)
+            self.version += 1
+
+    def remove_products(self, uniq_ids: Iterable[str]):
+        """Removes products from the aggregates."""
+        with self._lock:
+            for uniq_id in uniq_ids:
+                row = self._row_by_id.get(uniq_id)
+                if row is not None and self._alive[row]:
+                    self._apply(row, -1)
+                    self._alive[row] = False
+            self.version += 1
+
+    # --- Persistence ---
+
+    def _category_csr(self) -> Tuple[np.ndarray, np.ndarray]:
+        """The category index with the per-row overrides folded back in."""
+        if not self._category_overrides:
+            return self._category_indptr, self._category_indices
+        lengths = np.diff(self._category_indptr)
+        for row, codes in self._category_overrides.items():
+            lengths[row] = len(codes)
+        indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        indices = np.concatenate([self._row_categories(row) for row in range(len(lengths))] + [
+            np.zeros(0, dtype=np.int32)
+        ]).astype(np.int32)
+        return indptr, indices
+
+    def save(self, directory: str):
+        """Writes the engine's columns, so `load` can resume incremental updates from them."""
+        path = os.path.join(directory, ANALYTICS_STATE_DIR)
+        with self._lock:
+            indptr, indices = self._category_csr()
+            uniq_ids = [""] * len(self._alive)
+            for uniq_id, row in self._row_by_id.items():
+                uniq_ids[row] = uniq_id
+            write_arrays(path, {
+                "alive": self._alive, "price_bins": self._price_bins, "brand_codes": self._brand_codes,
+                "has_image": self._has_image, "category_indptr": indptr, "category_indices": indices,
+            })
+            with open(os.path.join(path, "names.json"), "w", encoding="utf-8") as f:
+                json.dump({"brands": self._brands, "categories": self._categories}, f)
+            # Written last: the state only counts as saved once it exists
+            write_columns(path, {"uniq_id": uniq_ids})
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["AnalyticsEngine"]:
+        """Reads the columns saved by `save`, or None if this version has none."""
+        path = os.path.join(directory, ANALYTICS_STATE_DIR)
+        if not columns_exist(path):
+            return None
+        engine = cls()
+        arrays = read_arrays(path, _STATE_ARRAYS)
+        # Copied out of the mapped files, since upserts modify them
+        engine._alive = np.array(arrays["alive"])
+        engine._price_bins = np.array(arrays["price_bins"])
+        engine._brand_codes = np.array(arrays["brand_codes"])
+        engine._has_image = np.array(arrays["has_image"])
+        engine._category_indptr = np.array(arrays["category_indptr"])
+        engine._category_indices = np.array(arrays["category_indices"])
+        with open(os.path.join(path, "names.json"), encoding="utf-8") as f:
+            names = json.load(f)
+        engine._brands, engine._categories = names["brands"], names["categories"]
+        engine._brand_lookup = {name: code for code, name in enumerate(engine._brands)}
+        engine._category_lookup = {name: code for code, name in enumerate(engine._categories)}
+        engine._row_by_id = {uniq_id: row for row, uniq_id in enumerate(read_columns(path)["uniq_id"]) if uniq_id}
+        engine._recount()
+        return engine
+
+    # --- Snapshots ---
+
+    @staticmethod
+    def _top(names: List[str], counts: np.ndarray, n: int) -> Dict[str, int]:
+        order = np.argsort(-counts, kind="stable")[:n]
+        return {names[i]: int(counts[i]) for i in order if counts[i] > 0}
+
+    def _build_payload(self) -> dict:
+        if self._total == 0:
+            return {
+                "total_products": 0, "price_distribution": [], "category_counts": {},
+                "brand_counts": {}, "image_coverage_percent": 0
+            }
+        return {
+            "total_products": int(self._total),
+            "price_distribution": [
+                {"name": label, "count": int(count)}
+                for label, count in zip(PRICE_BIN_LABELS, self._price_counts)
+            ],
+            "category_counts": self._top(self._categories, self._category_counts, TOP_CATEGORIES),
+            "brand_counts": self._top(self._brands, self._brand_counts, TOP_BRANDS),
+            "image_coverage_percent": round(self._image_count / self._total * 100, 2),
+        }
+
+    def snapshot(self) -> Tuple[str, bytes]:
+        """
+        Returns (etag, JSON body) for the current version of the aggregates.
+        The body is serialised once per version, so repeat calls are O(1).
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot[0] == self.version:
+            return snapshot[1], snapshot[2]
+        with self._lock:
+            body = json.dumps(self._build_payload()).encode("utf-8")
+            etag = snapshot_etag(body)
+            self._snapshot = (self.version, etag, body)
+            return etag, body
+
+    def save_snapshot(self, directory: str):
+        """Writes the current snapshot body so an index version can serve it without the catalog."""
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, ANALYTICS_FILE), "wb") as f:
+            f.write(self.snapshot()[1])
+
+
+# --- Global Cache ---
+_analytics_engine = None
+# --------------------
+
+def get_analytics_engine() -> AnalyticsEngine:
+    """
+    Loads and caches the analytics engine for the configured catalog.
+    """
+    global _analytics_engine
+    if _analytics_engine is None:
+        if os.path.exists(settings.DATA_FILE_PATH):
+            print(f"Building analytics columns from {settings.DATA_FILE_PATH}...")
+            _analytics_engine = AnalyticsEngine.from_dataframe(pd.read_csv(settings.DATA_FILE_PATH))
+        else:
+            print(f"Warning: Analytics data file not found at {settings.DATA_FILE_PATH}")
+            _analytics_engine = AnalyticsEngine()
+    return _analytics_engine
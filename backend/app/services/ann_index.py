@@ -0,0 +1,200 @@
+from langchain_community.vectorstores.faiss import dependable_faiss_import
+from app.core.config import settings
+from typing import Any, Optional
+import numpy as np
+import math
+import os
+
+INDEX_TYPES = ("FLAT", "IVF_FLAT", "IVF_PQ", "HNSW")
+
+FAISS_INDEX_FILE = "index.faiss"
+# Precomputed top-N neighbours of every row, written into each index version
+NEIGHBORS_FILE = "neighbors.npy"
+
+
+def _ivf_nlist(n_vectors: int) -> int:
+    """Number of IVF cells: the configured value, capped so every cell gets enough training points."""
+    return max(1, min(settings.FAISS_IVF_NLIST, n_vectors // 39, int(4 * math.sqrt(n_vectors))))
+
+
+def _pq_params(dim: int, n_vectors: int):
+    """PQ sub-quantizers must divide the dimension, and training needs 2^nbits points per sub-space."""
+    m = settings.FAISS_PQ_M
+    while dim % m:
+        m -= 1
+    nbits = min(settings.FAISS_PQ_NBITS, max(1, int(math.log2(max(n_vectors, 2)))))
+    return m, nbits
+
+
+def build_empty_index(training_vectors: np.ndarray, index_type: Optional[str] = None) -> Any:
+    """
+    Creates an empty FAISS index of the given type, trained on `training_vectors`
+    where the type needs training. Vectors are added separately.
+    All types use L2 distance, matching LangChain's default FAISS store.
+    """
+    faiss = dependable_faiss_import()
+    index_type = index_type or settings.FAISS_INDEX_TYPE
+    training_vectors = np.ascontiguousarray(training_vectors, dtype=np.float32)
+    n_vectors, dim = training_vectors.shape
+
+    if index_type == "FLAT":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == "IVF_FLAT":
+        index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, _ivf_nlist(n_vectors))
+    elif index_type == "IVF_PQ":
+        m, nbits = _pq_params(dim, n_vectors)
+        index = faiss.IndexIVFPQ(faiss.IndexFlatL2(dim), dim, _ivf_nlist(n_vectors), m, nbits)
+    elif index_type == "HNSW":
+        index = faiss.IndexHNSWFlat(dim, settings.FAISS_HNSW_M)
+        index.hnsw.efConstruction = settings.FAISS_HNSW_EF_CONSTRUCTION
+    else:
+        raise ValueError(f"Unknown FAISS_INDEX_TYPE: {index_type}")
+
+    if not index.is_trained:
+        index.train(training_vectors)
+    configure_search(index)
+    return index
+
+
+def build_index(vectors: np.ndarray, index_type: Optional[str] = None) -> Any:
+    """Builds (and trains, where needed) a FAISS index of the given type over `vectors`."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    index = build_empty_index(vectors, index_type)
+    index.add(vectors)
+    return index
+
+
+def supports_removal(index) -> bool:
+    """
+    Whether remove_ids keeps the remaining ids contiguous and in order.
+    Only flat indexes compact in place; IVF keeps the old ids and HNSW
+    can't remove at all.
+    """
+    return index_type_name(index) == "FLAT"
+
+
+def enable_reconstruction(index):
+    """
+    IVF indexes need a direct id -> list map before stored vectors can be
+    read back. Building it isn't thread-safe, so loaders call this once.
+    """
+    ivf = _ivf(index)
+    if ivf is not None and ivf.direct_map.no():
+        ivf.make_direct_map()
+
+
+def stored_vectors(index, rows: np.ndarray) -> np.ndarray:
+    """Reads vectors back out of an index (approximate for IVF_PQ)."""
+    enable_reconstruction(index)
+    return index.reconstruct_batch(np.asarray(rows, dtype=np.int64))
+
+
+def _ivf(index) -> Any:
+    faiss = dependable_faiss_import()
+    try:
+        return faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return None
+
+
+def configure_search(index):
+    """Applies the configured query-time parameters (nprobe / efSearch) to a loaded index."""
+    faiss = dependable_faiss_import()
+    ivf = _ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(settings.FAISS_IVF_NPROBE, ivf.nlist)
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = settings.FAISS_HNSW_EF_SEARCH
+
+
+def search_parameters(index, selector=None) -> Any:
+    """
+    SearchParameters for a filtered search. Per-query parameters replace the
+    index's own settings, so the IVF / HNSW variants must carry them too.
+    """
+    faiss = dependable_faiss_import()
+    ivf = _ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def index_type_name(index) -> str:
+    """Reports which of INDEX_TYPES a loaded index is."""
+    faiss = dependable_faiss_import()
+    if isinstance(index, faiss.IndexHNSW):
+        return "HNSW"
+    ivf = _ivf(index)
+    if ivf is not None:
+        return "IVF_PQ" if isinstance(ivf, faiss.IndexIVFPQ) else "IVF_FLAT"
+    return "FLAT"
+
+
+def index_memory_bytes(index) -> int:
+    """Serialized size of the index, a close proxy for its resident memory."""
+    faiss = dependable_faiss_import()
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def load_mapped_index(path: str) -> Any:
+    """
+    Memory-maps a FAISS index written at ingestion. The vectors stay in
+    the OS page cache, shared by every worker, instead of being copied
+    into each process.
+    """
+    faiss = dependable_faiss_import()
+    # IO_FLAG_MMAP maps IVF inverted lists; IO_FLAG_MMAP_IFC (newer faiss)
+    # also maps flat code arrays (FLAT, and HNSW's flat storage)
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+    return faiss.read_index(os.path.join(path, FAISS_INDEX_FILE), flags)
+
+
+def _neighbor_search_index(index: Any, top_n: int, batch_size: int) -> Any:
+    """
+    The index the neighbour table is searched on. Searching a FLAT index with
+    every row is an exact all-pairs scan, O(N^2 * d), so above
+    SIMILAR_NEIGHBORS_EXACT_MAX rows the rows are copied into a throwaway
+    HNSW index (O(N log N) to build and search) and the table is approximate.
+    Row ids stay the same since vectors are added in row order.
+    """
+    if index_type_name(index) != "FLAT" or index.ntotal <= settings.SIMILAR_NEIGHBORS_EXACT_MAX:
+        return index
+    print(f"{index.ntotal} rows is above SIMILAR_NEIGHBORS_EXACT_MAX; finding neighbours through HNSW.")
+    helper = build_empty_index(np.zeros((0, index.d), dtype=np.float32), "HNSW")
+    for start in range(0, index.ntotal, batch_size):
+        helper.add(stored_vectors(index, np.arange(start, min(index.ntotal, start + batch_size))))
+    helper.hnsw.efSearch = max(settings.FAISS_HNSW_EF_SEARCH, 2 * (top_n + 1))
+    return helper
+
+
+def build_neighbor_table(index: Any, top_n: int, batch_size: int = 1024) -> np.ndarray:
+    """
+    For every row, its top_n nearest other rows (padded with -1), found by
+    searching the index with each row's own stored vector (through an HNSW
+    copy for large FLAT indexes, see _neighbor_search_index).
+    """
+    n_rows = index.ntotal
+    table = np.full((n_rows, top_n), -1, dtype=np.int32)
+    search_index = _neighbor_search_index(index, top_n, batch_size)
+    for start in range(0, n_rows, batch_size):
+        rows = np.arange(start, min(n_rows, start + batch_size), dtype=np.int64)
+        _, ids = search_index.search(stored_vectors(index, rows), top_n + 1)
+        for row, hits in zip(rows, ids):
+            others = hits[(hits >= 0) & (hits != row)][:top_n]
+            table[row, :len(others)] = others
+    return table
+
+
+def save_neighbor_table(directory: str, table: np.ndarray):
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, NEIGHBORS_FILE), table)
+
+
+def load_neighbor_table(directory: str) -> Optional[np.ndarray]:
+    """Maps the neighbour table read-only, or None if this version has none."""
+    path = os.path.join(directory, NEIGHBORS_FILE)
+    if not os.path.exists(path):
+        return None
+    return np.load(path, mmap_mode="r")
@@ -0,0 +1,127 @@
+from langchain_community.vectorstores.faiss import dependable_faiss_import
+from app.services.ann_index import stored_vectors
+from app.services.columnar import read_arrays, write_arrays
+from typing import Any, List
+import numpy as np
+import os
+
+# Sidecar directory written next to the FAISS index at ingestion
+CLUSTERS_DIR = "clusters"
+
+
+class ClusterIndex:
+    """
+    KMeans clusters of the catalog embeddings: the centroids, each row's
+    cluster, and the rows of every cluster stored CSR-style (cluster ->
+    slice of row ids). Queries can be routed to the rows of their nearest
+    clusters, and results spread across clusters. Row ids are FAISS ids.
+    """
+
+    def __init__(self, centroids: np.ndarray, assignments: np.ndarray, indptr: np.ndarray, rows: np.ndarray):
+        self.centroids = centroids
+        self.assignments = assignments
+        self.indptr = indptr
+        self.rows = rows
+
+    def __len__(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, index: Any, n_clusters: int, seed: int = 42, batch_size: int = 65536) -> "ClusterIndex":
+        """
+        Clusters the vectors stored in a FAISS index. KMeans trains on at
+        most 256 points per centroid; every row is then assigned in batches.
+        """
+        faiss = dependable_faiss_import()
+        n_rows = index.ntotal
+        # Same cap as the IVF cells: enough training points per centroid
+        n_clusters = max(1, min(n_clusters, n_rows // 39))
+        rng = np.random.default_rng(seed)
+        sample_size = min(n_rows, n_clusters * 256)
+        sample = np.sort(rng.choice(n_rows, sample_size, replace=False))
+
+        kmeans = faiss.Kmeans(index.d, n_clusters, niter=20, seed=seed, max_points_per_centroid=256)
+        kmeans.train(np.ascontiguousarray(stored_vectors(index, sample), dtype=np.float32))
+
+        assignments = np.empty(n_rows, dtype=np.int32)
+        for start in range(0, n_rows, batch_size):
+            rows = np.arange(start, min(n_rows, start + batch_size), dtype=np.int64)
+            _, nearest = kmeans.index.search(stored_vectors(index, rows), 1)
+            assignments[start:start + len(rows)] = nearest[:, 0]
+
+        order = np.argsort(assignments, kind="stable")
+        indptr = np.zeros(n_clusters + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=n_clusters), out=indptr[1:])
+        return cls(kmeans.centroids.astype(np.float32), assignments, indptr, order.astype(np.int64))
+
+    def save(self, directory: str):
+        write_arrays(os.path.join(directory, CLUSTERS_DIR), {
+            "centroids": self.centroids,
+            "assignments": self.assignments,
+            "indptr": self.indptr,
+            "rows": self.rows,
+        })
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, CLUSTERS_DIR, "centroids.npy"))
+
+    @classmethod
+    def load(cls, directory: str) -> "ClusterIndex":
+        arrays = read_arrays(os.path.join(directory, CLUSTERS_DIR), ("centroids", "assignments", "indptr", "rows"))
+        # Centroids are tiny and read on every routed query; keep them in memory
+        return cls(np.array(arrays["centroids"]), arrays["assignments"], arrays["indptr"], arrays["rows"])
+
+    def nearest_clusters(self, embedding: List[float], probes: int) -> np.ndarray:
+        query = np.asarray(embedding, dtype=np.float32)
+        distances = ((self.centroids - query) ** 2).sum(axis=1)
+        probes = min(probes, len(self.centroids))
+        return np.argpartition(distances, probes - 1)[:probes]
+
+    def route(self, embedding: List[float], probes: int) -> np.ndarray:
+        """Sorted row ids of the `probes` clusters nearest to the query."""
+        clusters = self.nearest_clusters(embedding, probes)
+        return np.sort(np.concatenate([self.rows[self.indptr[c]:self.indptr[c + 1]] for c in clusters]))
+
+
+def mmr(query: List[float], vectors: np.ndarray, top_k: int, lambda_: float) -> List[int]:
+    """
+    Maximal marginal relevance: greedily picks the candidate that best trades
+    similarity to the query (weight `lambda_`) against similarity to the
+    candidates already picked. Returns positions into `vectors`, in pick order.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query, dtype=np.float32)
+    relevance = vectors @ (query / max(float(np.linalg.norm(query)), 1e-12))
+
+    picked: List[int] = []
+    # Highest similarity of each candidate to anything picked so far
+    redundancy = np.full(len(vectors), -np.inf, dtype=np.float32)
+    available = np.ones(len(vectors), dtype=bool)
+    for _ in range(min(top_k, len(vectors))):
+        scores = lambda_ * relevance - (1 - lambda_) * (redundancy if picked else 0.0)
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        picked.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, vectors @ vectors[best])
+    return picked
+
+
+def cluster_diverse(clusters: np.ndarray, top_k: int) -> List[int]:
+    """
+    Spreads a ranked candidate list across clusters: the best candidate of
+    each cluster first, then the remaining ones, all in their original rank
+    order. Returns positions into the candidate list.
+    """
+    picked, seen = [], set()
+    for position, cluster in enumerate(clusters):
+        if cluster not in seen:
+            picked.append(position)
+            seen.add(cluster)
+            if len(picked) == top_k:
+                return picked
+    chosen = set(picked)
+    rest = [position for position in range(len(clusters)) if position not in chosen]
+    return sorted(picked + rest[:top_k - len(picked)])
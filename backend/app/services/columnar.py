@@ -0,0 +1,136 @@
+from typing import Dict, Iterable, Iterator, Sequence, Union
+import numpy as np
+import json
+import os
+
+COLUMNS_FILE = "columns.json"
+
+
+class StringColumn:
+    """
+    A read-only column of strings backed by two memory-mapped files: the
+    concatenated UTF-8 values and an int64 offsets array. Pages are shared
+    through the OS page cache by every process that maps the same files,
+    and nothing is deserialised until a row is read.
+    """
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray):
+        self.offsets = offsets
+        self.data = data
+
+    @classmethod
+    def from_values(cls, values: Sequence[Union[str, bytes]]) -> "StringColumn":
+        """An in-memory column with the same layout, for indexes built at runtime."""
+        encoded = [value if isinstance(value, bytes) else value.encode("utf-8") for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return cls(offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def raw(self, row: int) -> bytes:
+        return self.data[self.offsets[row]:self.offsets[row + 1]].tobytes()
+
+    def __getitem__(self, row: int) -> str:
+        return self.raw(row).decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        return (self[row] for row in range(len(self)))
+
+
+def write_columns(directory: str, columns: Dict[str, Sequence[Union[str, bytes]]]):
+    """Writes equal-length string columns as `<name>.bin` + `<name>.offsets.npy`."""
+    os.makedirs(directory, exist_ok=True)
+    lengths = {len(values) for values in columns.values()}
+    if len(lengths) > 1:
+        raise ValueError(f"Columns have different lengths: {sorted(lengths)}")
+
+    for name, values in columns.items():
+        column = values if isinstance(values, StringColumn) else StringColumn.from_values(values)
+        with open(os.path.join(directory, f"{name}.bin"), "wb") as f:
+            f.write(column.data.tobytes())
+        np.save(os.path.join(directory, f"{name}.offsets.npy"), np.asarray(column.offsets))
+
+    with open(os.path.join(directory, COLUMNS_FILE), "w", encoding="utf-8") as f:
+        json.dump({"rows": lengths.pop() if lengths else 0, "columns": list(columns)}, f)
+
+
+def read_columns(directory: str) -> Dict[str, StringColumn]:
+    """Maps every column written by `write_columns` read-only."""
+    with open(os.path.join(directory, COLUMNS_FILE), encoding="utf-8") as f:
+        names = json.load(f)["columns"]
+    columns = {}
+    for name in names:
+        offsets = np.load(os.path.join(directory, f"{name}.offsets.npy"), mmap_mode="r")
+        data_path = os.path.join(directory, f"{name}.bin")
+        # An empty file can't be mapped
+        data = np.memmap(data_path, dtype=np.uint8, mode="r") if os.path.getsize(data_path) else np.zeros(0, dtype=np.uint8)
+        columns[name] = StringColumn(offsets, data)
+    return columns
+
+
+def columns_exist(directory: str) -> bool:
+    return os.path.exists(os.path.join(directory, COLUMNS_FILE))
+
+
+def write_arrays(directory: str, arrays: Dict[str, np.ndarray]):
+    """Writes each array as its own `.npy` file, so it can be mapped on its own."""
+    os.makedirs(directory, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(array))
+
+
+def read_arrays(directory: str, names: Iterable[str]) -> Dict[str, np.ndarray]:
+    """Maps arrays written by `write_arrays` read-only."""
+    return {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in names}
+
+
+def sorted_lookup(column: StringColumn, order: np.ndarray, value: str) -> int:
+    """
+    Binary search for `value` in `column`, given the row order that sorts it.
+    Returns the row, or -1. Avoids building a per-process dict of every key.
+    """
+    target = value.encode("utf-8")
+    lo, hi = 0, len(order)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if column.raw(order[mid]) < target:
+            lo = mid + 1
+        else:
+            hi = mid
+    if lo < len(order) and column.raw(order[lo]) == target:
+        return int(order[lo])
+    return -1
+
+
+def sort_order(column: StringColumn) -> np.ndarray:
+    """The row order that sorts a column by its UTF-8 bytes (matching `sorted_lookup`)."""
+    return np.array(sorted(range(len(column)), key=column.raw), dtype=np.int64)
+
+
+def concat_columns(columns: Sequence[StringColumn]) -> StringColumn:
+    """One in-memory column holding the rows of `columns` in order."""
+    columns = [column for column in columns if len(column)]
+    if not columns:
+        return StringColumn(np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.uint8))
+    offsets = [np.zeros(1, dtype=np.int64)]
+    base = 0
+    for column in columns:
+        start = int(column.offsets[0])
+        offsets.append(np.asarray(column.offsets[1:], dtype=np.int64) - start + base)
+        base += int(column.offsets[-1]) - start
+    data = np.concatenate([column.data[column.offsets[0]:column.offsets[-1]] for column in columns])
+    return StringColumn(np.concatenate(offsets), data)
+
+
+def take_rows(column: StringColumn, rows: np.ndarray) -> StringColumn:
+    """An in-memory column of the given rows, in the given order."""
+    rows = np.asarray(rows, dtype=np.int64)
+    starts = np.asarray(column.offsets, dtype=np.int64)[rows]
+    lengths = np.asarray(column.offsets, dtype=np.int64)[rows + 1] - starts
+    offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    # Byte i of the result comes from byte i - offsets[row] + starts[row] of the column
+    positions = np.arange(offsets[-1], dtype=np.int64) + np.repeat(starts - offsets[:-1], lengths)
+    return StringColumn(offsets, np.asarray(column.data)[positions])
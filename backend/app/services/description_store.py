@@ -0,0 +1,92 @@
+from app.core.config import settings
+from typing import Dict, Iterable, List, Tuple
+import sqlite3
+import threading
+import time
+import os
+
+
+class DescriptionStore:
+    """
+    A persistent, content-addressed store of generated product descriptions.
+
+    Keys are produced by `generative.description_key`, which hashes the
+    product's prompt fields together with the prompt template and model name,
+    so a description is automatically invalidated when any of them change.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS descriptions (
+                    key TEXT PRIMARY KEY,
+                    uniq_id TEXT NOT NULL,
+                    description TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        """Returns the stored descriptions for the given keys (missing keys are omitted)."""
+        keys = list(keys)
+        if not keys:
+            return {}
+        found = {}
+        with self._lock:
+            conn = self._connect()
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT key, description FROM descriptions WHERE key IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+                found.update(rows)
+        return found
+
+    def put_many(self, items: List[Tuple[str, str, str]]):
+        """Stores (key, uniq_id, description) tuples, replacing existing keys."""
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO descriptions (key, uniq_id, description, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                [(key, uniq_id, description, now) for key, uniq_id, description in items],
+            )
+            conn.commit()
+
+    def count(self) -> int:
+        """Returns the number of stored descriptions."""
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM descriptions").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# --- Global Cache ---
+description_store = DescriptionStore(settings.DESCRIPTION_STORE_PATH)
+# --------------------
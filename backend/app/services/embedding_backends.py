@@ -0,0 +1,104 @@
+from langchain_core.embeddings import Embeddings
+from app.core.config import settings
+from typing import List, Optional, Sequence
+import numpy as np
+import json
+import os
+
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_INT8_MODEL_FILE = "model.int8.onnx"
+ONNX_CONFIG_FILE = "embedding_config.json"
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Runs a sentence-transformer exported by `export_onnx.py` through
+    onnxruntime: the transformer graph, then the same mean pooling and
+    L2 normalisation as the sentence-transformers pipeline, in numpy.
+    No PyTorch is imported, which keeps a worker process much smaller.
+    """
+
+    def __init__(self, model_dir: str, quantized: bool = False, num_threads: int = 0, batch_size: int = 32):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_path = os.path.join(model_dir, ONNX_INT8_MODEL_FILE if quantized else ONNX_MODEL_FILE)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"ONNX embedding model not found at {model_path}. "
+                "Did you run the export script? (backend/app/data_ingestion/export_onnx.py)"
+            )
+        with open(os.path.join(model_dir, ONNX_CONFIG_FILE), encoding="utf-8") as f:
+            config = json.load(f)
+        if config["model_name"] != settings.EMBEDDING_MODEL_NAME:
+            raise ValueError(
+                f"ONNX model at {model_dir} was exported from {config['model_name']}, "
+                f"not EMBEDDING_MODEL_NAME={settings.EMBEDDING_MODEL_NAME}"
+            )
+        self.max_length = config["max_seq_length"]
+        self.normalize = config["normalize"]
+        self.batch_size = batch_size
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [node.name for node in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np"
+        )
+        hidden = self.session.run(None, {name: encoded[name].astype(np.int64) for name in self.input_names})[0]
+        mask = encoded["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        return np.vstack([self._embed_batch(batch) for batch in batches]).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0].tolist()
+
+
+def create_embedding_model(backend: Optional[str] = None, num_threads: Optional[int] = None) -> Embeddings:
+    """Builds the uncached embedding model for EMBEDDING_BACKEND."""
+    backend = backend or settings.EMBEDDING_BACKEND
+    num_threads = settings.EMBEDDING_NUM_THREADS if num_threads is None else num_threads
+
+    if backend == "TORCH":
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        if num_threads > 0:
+            import torch
+            torch.set_num_threads(num_threads)
+        return HuggingFaceEmbeddings(
+            model_name=settings.EMBEDDING_MODEL_NAME,
+            model_kwargs={'device': 'cpu'} # Use CPU for local demo
+        )
+    if backend in ("ONNX", "ONNX_INT8"):
+        return OnnxEmbeddings(
+            settings.EMBEDDING_ONNX_PATH, quantized=backend == "ONNX_INT8", num_threads=num_threads
+        )
+    raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}")
+
+
+def cosine_parity(reference: Sequence[Sequence[float]], candidate: Sequence[Sequence[float]]) -> dict:
+    """Row-wise cosine similarity between two embeddings of the same texts."""
+    reference = np.asarray(reference, dtype=np.float32)
+    candidate = np.asarray(candidate, dtype=np.float32)
+    cosine = (reference * candidate).sum(axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    )
+    return {
+        "mean_cosine": round(float(cosine.mean()), 6),
+        "min_cosine": round(float(cosine.min()), 6),
+        "p01_cosine": round(float(np.percentile(cosine, 1)), 6),
+    }
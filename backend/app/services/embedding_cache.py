@@ -0,0 +1,248 @@
+from langchain_core.embeddings import Embeddings
+from app.core.config import settings
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+import numpy as np
+import threading
+import hashlib
+import sqlite3
+import re
+import os
+
+VECTORS_FILE = "vectors.f32"
+KEYS_FILE = "keys.sqlite"
+
+_MIN_CAPACITY = 1024
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    A persistent embedding cache: a memory-mapped float32 matrix of vectors
+    plus a SQLite index from text hash to matrix row, with an in-memory LRU
+    tier in front for hot query strings.
+
+    One cache directory belongs to one embedding model and backend, so a key
+    only needs to hash the text. Rows are append-only; a writer reserves rows
+    inside a SQLite write transaction and writes the vectors before committing
+    their keys, so other processes (ingestion and the API) never see a key
+    whose vector isn't on disk yet.
+    """
+
+    def __init__(self, directory: str, lru_size: int = 0):
+        self.directory = directory
+        self.lru_size = lru_size
+        self._lru: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._vectors: Optional[np.memmap] = None
+        self.dim: Optional[int] = None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(self.directory, exist_ok=True)
+            # Autocommit: write transactions are opened explicitly with BEGIN IMMEDIATE
+            conn = sqlite3.connect(
+                os.path.join(self.directory, KEYS_FILE), check_same_thread=False, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            row = conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+            self.dim = row[0] if row else None
+            self._conn = conn
+        return self._conn
+
+    def _map(self, min_rows: int = 0) -> Optional[np.memmap]:
+        """The vector matrix, remapped if another writer has grown the file past our mapping."""
+        if self.dim is None:
+            return None
+        if self._vectors is None or len(self._vectors) < min_rows:
+            path = os.path.join(self.directory, VECTORS_FILE)
+            rows = os.path.getsize(path) // (self.dim * 4) if os.path.exists(path) else 0
+            self._vectors = np.memmap(path, dtype=np.float32, mode="r+", shape=(rows, self.dim)) if rows else None
+        return self._vectors
+
+    def _grow(self, needed_rows: int):
+        path = os.path.join(self.directory, VECTORS_FILE)
+        current = os.path.getsize(path) // (self.dim * 4) if os.path.exists(path) else 0
+        if current >= needed_rows:
+            return
+        capacity = max(needed_rows, 2 * current, _MIN_CAPACITY)
+        with open(path, "ab") as f:
+            f.truncate(capacity * self.dim * 4)
+        self._vectors = None
+
+    def _remember(self, key: str, vector: np.ndarray):
+        if self.lru_size <= 0:
+            return
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get_memory(self, text: str) -> Optional[np.ndarray]:
+        """In-memory tier only; cheap enough to call on the event loop."""
+        key = text_key(text)
+        with self._lock:
+            vector = self._lru.get(key)
+            if vector is not None:
+                self._lru.move_to_end(key)
+                self.memory_hits += 1
+            return vector
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Cached vectors for `texts`, None where a text hasn't been embedded yet."""
+        keys = [text_key(text) for text in texts]
+        found = [None] * len(keys)
+        with self._lock:
+            missing = {}
+            for i, key in enumerate(keys):
+                vector = self._lru.get(key)
+                if vector is not None:
+                    self._lru.move_to_end(key)
+                    self.memory_hits += 1
+                    found[i] = vector
+                else:
+                    missing.setdefault(key, []).append(i)
+
+            conn = self._connect()
+            rows = {}
+            unique = list(missing)
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows.update(conn.execute(
+                    f"SELECT key, row FROM entries WHERE key IN ({placeholders})", chunk
+                ).fetchall())
+
+            if rows:
+                if self.dim is None:
+                    # Another process wrote the first entries after we connected
+                    self.dim = conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()[0]
+                matrix = self._map(max(rows.values()) + 1)
+                for key, row in rows.items():
+                    vector = np.array(matrix[row])
+                    self._remember(key, vector)
+                    for i in missing[key]:
+                        found[i] = vector
+                self.disk_hits += sum(len(missing[key]) for key in rows)
+            self.misses += sum(len(positions) for key, positions in missing.items() if key not in rows)
+        return found
+
+    def put_many(self, texts: Sequence[str], vectors: np.ndarray):
+        """Appends vectors for texts that aren't cached yet."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(texts):
+            return
+        keys = list(dict.fromkeys(text_key(text) for text in texts))
+        by_key = {text_key(text): vector for text, vector in zip(texts, vectors)}
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self.dim is None:
+                    row = conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+                    self.dim = row[0] if row else vectors.shape[1]
+                    conn.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('dim', ?)", (self.dim,))
+
+                present = set()
+                for start in range(0, len(keys), 500):
+                    chunk = keys[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    present.update(key for (key,) in conn.execute(
+                        f"SELECT key FROM entries WHERE key IN ({placeholders})", chunk
+                    ))
+                new_keys = [key for key in keys if key not in present]
+                if new_keys:
+                    first_row = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+                    self._grow(first_row + len(new_keys))
+                    matrix = self._map(first_row + len(new_keys))
+                    matrix[first_row:first_row + len(new_keys)] = np.stack([by_key[key] for key in new_keys])
+                    matrix.flush()
+                    conn.executemany(
+                        "INSERT INTO entries (key, row) VALUES (?, ?)",
+                        [(key, first_row + i) for i, key in enumerate(new_keys)],
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            for key in keys:
+                self._remember(key, by_key[key])
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "entries": self.count(),
+            "memory_entries": len(self._lru),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._vectors = None
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model so texts already in the EmbeddingCache are never
+    re-embedded; only the misses reach the underlying model.
+    """
+
+    def __init__(self, underlying: Embeddings, cache: EmbeddingCache):
+        self.underlying = underlying
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.cache.get_many(texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            computed = np.asarray(self.underlying.embed_documents(missing), dtype=np.float32)
+            self.cache.put_many(missing, computed)
+            by_text = dict(zip(missing, computed))
+            vectors = [by_text[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+        return [vector.tolist() for vector in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def _model_directory(model_name: str, backend: str) -> str:
+    # Quantized / exported backends produce slightly different vectors
+    name = model_name if backend == "TORCH" else f"{model_name}-{backend}"
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name)
+
+
+# --- Global Cache ---
+_embedding_cache = None
+# --------------------
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """The process-wide embedding cache for the configured model, or None if disabled."""
+    global _embedding_cache
+    if _embedding_cache is None and settings.EMBEDDING_CACHE_ENABLED:
+        directory = _model_directory(settings.EMBEDDING_MODEL_NAME, settings.EMBEDDING_BACKEND)
+        _embedding_cache = EmbeddingCache(
+            os.path.join(settings.EMBEDDING_CACHE_PATH, directory),
+            lru_size=settings.EMBEDDING_CACHE_LRU_SIZE,
+        )
+    return _embedding_cache
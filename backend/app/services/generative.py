@@ -1,36 +1,34 @@
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnableSequence
-from langchain_core.output_parsers import StrOutputParser
+from langchain_core.output_parsers import StrOutputParser, JsonOutputParser
+from langchain_core.language_models import BaseChatModel
 from app.core.config import settings
 from app.models.schemas import Product
+from app.services.description_store import description_store
+from app.services.scheduler import llm_limiter, llm_singleflight
+from app.services.instrumentation import observe, span
+from app.services.resilience import CircuitOpenError, Deadline, gather_within, llm_breaker, llm_hedger
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import time
 import os
 
 # Set OpenAI API key
-os.environ["OPENAI_API_KEY"] = settings.OPENAI_API_KEY
+if settings.OPENAI_API_KEY:
+    os.environ["OPENAI_API_KEY"] = settings.OPENAI_API_KEY
 
-def get_generative_chain() -> RunnableSequence:
-    """
-    Initializes and returns a LangChain sequence for generating 
-    creative product descriptions.
-    """
-    
-    # 1. Define the LLM (Generative Model)
-    # We use a simple, fast OpenAI model.
-    # We set temperature to 0.7 for a bit of creativity.
-    try:
-        llm = ChatOpenAI(
-            model="gpt-3.5-turbo",
-            temperature=0.7,
-            openai_api_key=settings.OPENAI_API_KEY
-        )
-    except Exception as e:
-        print(f"Error initializing OpenAI: {e}")
-        # Fallback or error handling
-        raise ConnectionError("Could not initialize Generative AI model. Check API key.")
+FALLBACK_DESCRIPTION = "A fantastic product you're sure to love!"
 
-    # 2. Define the Prompt Template
-    template = """
+
+class DescriptionStreamError(RuntimeError):
+    """Raised when a description stream fails after some of it was already yielded."""
+
+# The prompt template is part of every stored description's key,
+# so editing it invalidates previously generated descriptions.
+PROMPT_TEMPLATE = """
     You are a witty and creative marketing assistant for a furniture store.
     Your job is to write a short, compelling, and slightly playful product description (2-3 sentences)
     for a customer based on its technical data.
@@ -46,7 +44,50 @@ def get_generative_chain() -> RunnableSequence:
 
     Your Creative Description:
     """
-    prompt = ChatPromptTemplate.from_template(template)
+
+# Used in BATCHED generation mode: one call describes every product.
+BATCH_PROMPT_TEMPLATE = """
+    You are a witty and creative marketing assistant for a furniture store.
+    For EACH product below, write a short, compelling, and slightly playful product description (2-3 sentences)
+    for a customer based on its technical data.
+    
+    DO NOT just repeat the title or description. Be creative.
+    
+    Products (JSON):
+    {products}
+
+    Respond with ONLY a JSON object mapping each product's "uniq_id" to its creative description,
+    for example {{"<uniq_id>": "<description>"}}.
+    """
+
+def create_llm() -> BaseChatModel:
+    """
+    Initializes the chat model used by the generative chains.
+    """
+    # We use a simple, fast OpenAI model.
+    # We set temperature to 0.7 for a bit of creativity.
+    try:
+        return ChatOpenAI(
+            model=settings.LLM_MODEL_NAME,
+            temperature=0.7,
+            openai_api_key=settings.OPENAI_API_KEY
+        )
+    except Exception as e:
+        print(f"Error initializing OpenAI: {e}")
+        # Fallback or error handling
+        raise ConnectionError("Could not initialize Generative AI model. Check API key.")
+
+def get_generative_chain(llm: Optional[BaseChatModel] = None) -> RunnableSequence:
+    """
+    Initializes and returns a LangChain sequence for generating 
+    creative product descriptions.
+    """
+    
+    # 1. Define the LLM (Generative Model)
+    llm = llm or create_llm()
+
+    # 2. Define the Prompt Template
+    prompt = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
     
     # 3. Define the Output Parser
     output_parser = StrOutputParser()
@@ -61,23 +102,263 @@ def get_generative_chain() -> RunnableSequence:
     
     return chain
 
-# Initialize the chain once to be reused
-llm_chain = get_generative_chain()
+def get_batch_generative_chain(llm: Optional[BaseChatModel] = None) -> RunnableSequence:
+    """
+    Initializes and returns a LangChain sequence that describes several
+    products in a single call and parses the reply as a JSON object
+    of uniq_id -> description.
+    """
+    llm = llm or create_llm()
+    prompt = ChatPromptTemplate.from_template(BATCH_PROMPT_TEMPLATE)
+    return prompt | llm | JsonOutputParser()
+
+# --- Global Cache ---
+# The chains are built on first use (or by the startup warm-up),
+# not at import time, and then reused.
+_llm_chain = None
+_batch_llm_chain = None
+# --------------------
+
+def use_llm(llm: Optional[BaseChatModel] = None):
+    """Builds both chains around one chat model (a fresh ChatOpenAI by default)."""
+    global _llm_chain, _batch_llm_chain
+    llm = llm or create_llm()
+    _llm_chain = get_generative_chain(llm)
+    _batch_llm_chain = get_batch_generative_chain(llm)
+
+def get_llm_chain() -> RunnableSequence:
+    if _llm_chain is None:
+        use_llm()
+    return _llm_chain
+
+def get_batch_llm_chain() -> RunnableSequence:
+    if _batch_llm_chain is None:
+        use_llm()
+    return _batch_llm_chain
+
+def _prompt_inputs(product: Product) -> dict:
+    """The product fields that the prompt (and therefore the output) depends on."""
+    return {
+        "title": product.title,
+        "brand": product.brand,
+        "description": product.description,
+        "material": product.material,
+        "color": product.color
+    }
+
+def description_key(product: Product) -> str:
+    """
+    Content-addressed key for a product's generated description.
+    Changes whenever the product's prompt fields, the template or the model change.
+    """
+    payload = json.dumps(
+        [product.uniq_id, _prompt_inputs(product), PROMPT_TEMPLATE, settings.LLM_MODEL_NAME],
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def template_description(product: Product) -> str:
+    """
+    A deterministic description built from the product's own fields.
+    Used when no generated description is available and the LLM must not be called.
+    """
+    details = [value for value in (product.color, product.material) if value]
+    if not product.title:
+        return FALLBACK_DESCRIPTION
+    description = product.title
+    if product.brand:
+        description += f" by {product.brand}"
+    if details:
+        description += f", in {' '.join(details).lower()}"
+    return description + ". " + FALLBACK_DESCRIPTION
+
+async def _invoke_llm(chain: RunnableSequence, inputs: dict, stage: str) -> Any:
+    """
+    One logical LLM call: rejected while the circuit breaker is open,
+    otherwise hedged and retried, each attempt holding a limiter slot.
+    """
+    async def attempt():
+        async with llm_limiter.slot():
+            with span(stage):
+                return await chain.ainvoke(inputs)
+
+    async with llm_breaker.guard():
+        return await llm_hedger.call(attempt, can_hedge=llm_limiter.has_capacity)
 
 async def generate_creative_description(product: Product) -> str:
     """
     Generates a creative description for a single product.
+    Concurrent requests for the same product share one LLM call.
+    Returns FALLBACK_DESCRIPTION if generation failed or was skipped.
     """
+    return await llm_singleflight.do(
+        description_key(product), lambda: _generate_and_store(product)
+    )
+
+async def _generate_and_store(product: Product) -> str:
+    """Calls the LLM and writes successful generations to the description store."""
     try:
         # Use .ainvoke() for an asynchronous call
-        description = await llm_chain.ainvoke({
-            "title": product.title,
-            "brand": product.brand,
-            "description": product.description,
-            "material": product.material,
-            "color": product.color
-        })
-        return description.strip()
+        description = await _invoke_llm(get_llm_chain(), _prompt_inputs(product), "llm_call")
+        description = description.strip()
+    except CircuitOpenError:
+        return FALLBACK_DESCRIPTION
     except Exception as e:
         print(f"Error generating description: {e}")
-        return "A fantastic product you're sure to love!" # Fallback
\ No newline at end of file
+        return FALLBACK_DESCRIPTION # Fallback
+
+    await asyncio.to_thread(
+        description_store.put_many,
+        [(description_key(product), product.uniq_id, description)]
+    )
+    return description
+
+async def stream_creative_description(product: Product) -> AsyncIterator[str]:
+    """
+    Streams a creative description for a single product chunk by chunk.
+    The complete description is written to the description store once finished.
+    A failure before the first chunk yields FALLBACK_DESCRIPTION; a failure
+    after it raises DescriptionStreamError, so a truncated description is
+    never mistaken for a finished one. Like a non-streamed call, the whole
+    stream is bounded by LLM_CALL_TIMEOUT_SECONDS: a stalled upstream
+    counts as a failure instead of holding the limiter slot indefinitely.
+    """
+    chunks = []
+    try:
+        async with llm_breaker.guard(), llm_limiter.slot():
+            # Timed by hand: a span would also count the time the consumer
+            # spends between chunks
+            started = time.perf_counter()
+            deadline = Deadline(settings.LLM_CALL_TIMEOUT_SECONDS)
+            stream = get_llm_chain().astream(_prompt_inputs(product))
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(stream.__anext__(), deadline.remaining())
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        raise TimeoutError(
+                            f"No chunk within LLM_CALL_TIMEOUT_SECONDS ({settings.LLM_CALL_TIMEOUT_SECONDS:g}s)"
+                        ) from None
+                    # Leading whitespace is stripped, matching generate_creative_description
+                    if not chunks:
+                        chunk = chunk.lstrip()
+                        if not chunk:
+                            continue
+                        observe("llm_first_chunk", time.perf_counter() - started)
+                    chunks.append(chunk)
+                    yield chunk
+            finally:
+                # Releases the upstream connection when the stream stops early
+                await stream.aclose()
+            observe("llm_stream", time.perf_counter() - started)
+    except CircuitOpenError:
+        if not chunks:
+            yield FALLBACK_DESCRIPTION
+        return
+    except Exception as e:
+        print(f"Error streaming description: {e}")
+        if chunks:
+            raise DescriptionStreamError(f"Stream for {product.uniq_id} failed after {len(chunks)} chunks") from e
+        yield FALLBACK_DESCRIPTION
+        return
+
+    description = "".join(chunks).strip()
+    if description:
+        await asyncio.to_thread(
+            description_store.put_many,
+            [(description_key(product), product.uniq_id, description)]
+        )
+
+async def generate_batch_descriptions(products: List[Product]) -> Dict[str, str]:
+    """
+    Generates descriptions for several products with a single LLM call.
+    Returns uniq_id -> description for every product the model answered for;
+    an unparseable reply returns an empty dict so callers can fall back.
+    """
+    payload = [{"uniq_id": product.uniq_id, **_prompt_inputs(product)} for product in products]
+    try:
+        reply = await _invoke_llm(
+            get_batch_llm_chain(), {"products": json.dumps(payload, indent=1)}, "llm_batch_call"
+        )
+    except CircuitOpenError:
+        return {}
+    except Exception as e:
+        print(f"Error generating batched descriptions: {e}")
+        return {}
+    if not isinstance(reply, dict):
+        print("Batched description reply was not a JSON object; falling back.")
+        return {}
+
+    descriptions = {}
+    for product in products:
+        description = reply.get(product.uniq_id)
+        if isinstance(description, str) and description.strip():
+            descriptions[product.uniq_id] = description.strip()
+
+    # Stored under the per-product key so both modes share one store
+    await asyncio.to_thread(
+        description_store.put_many,
+        [
+            (description_key(product), product.uniq_id, descriptions[product.uniq_id])
+            for product in products if product.uniq_id in descriptions
+        ]
+    )
+    return descriptions
+
+def lookup_descriptions(products: List[Product]) -> List[Optional[str]]:
+    """
+    Returns the stored description for each product, or None when it must be generated.
+    In STORED_ONLY mode missing descriptions are filled from the template instead.
+    """
+    keys = [description_key(product) for product in products]
+    with span("description_lookup"):
+        stored = description_store.get_many(keys)
+    descriptions = [stored.get(key) for key in keys]
+
+    if settings.DESCRIPTION_MODE == "STORED_ONLY":
+        descriptions = [
+            description if description is not None else template_description(product)
+            for product, description in zip(products, descriptions)
+        ]
+    return descriptions
+
+async def describe_products(products: List[Product],
+                            budget_seconds: Optional[float] = None) -> Tuple[List[str], bool]:
+    """
+    Returns a description for each product, in order, and whether all of them are final.
+    Stored descriptions are served directly; the rest are generated
+    (one batched call in BATCHED mode, otherwise one call per product
+    in parallel), or filled from the template in STORED_ONLY mode.
+    Descriptions that fail or aren't generated within `budget_seconds` are
+    filled from the template and aren't final; generations cut off by the
+    budget keep running and are stored for later requests.
+    """
+    deadline = Deadline(budget_seconds)
+    descriptions = lookup_descriptions(products)
+    missing = [i for i, description in enumerate(descriptions) if description is None]
+    if not missing:
+        return descriptions, True
+
+    if settings.GENERATION_MODE == "BATCHED" and len(missing) > 1:
+        # Shielded so a call cut off by the deadline still stores its descriptions
+        batch_call = asyncio.shield(generate_batch_descriptions([products[i] for i in missing]))
+        batched = (await gather_within(deadline, [batch_call]))[0] or {}
+        for i in missing:
+            descriptions[i] = batched.get(products[i].uniq_id)
+        # Anything the batched reply didn't cover falls back to per-product calls
+        missing = [i for i in missing if descriptions[i] is None]
+
+    generated = [None] * len(missing)
+    if missing and not deadline.expired:
+        generated = await gather_within(
+            deadline, (generate_creative_description(products[i]) for i in missing)
+        )
+    complete = True
+    for i, description in zip(missing, generated):
+        if description is None or description == FALLBACK_DESCRIPTION:
+            description = template_description(products[i])
+            complete = False
+        descriptions[i] = description
+    return descriptions, complete
@@ -0,0 +1,125 @@
+from app.core.config import settings
+from app.services.embedding_cache import EmbeddingCache
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+import os
+import io
+
+# ImageNet preprocessing, as in notebooks/3_CV_Category_Classification.ipynb:
+# Resize(256), CenterCrop(224), Normalize
+_RESIZE = 256
+_CROP = 224
+_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+
+class ImageEmbedder:
+    """
+    Embeds product images on the CPU with an ImageNet-pretrained torchvision
+    backbone whose classifier head is dropped: an image's vector is the
+    backbone's pooled features, L2-normalised. Images are decoded and
+    resized on a thread pool (Pillow releases the GIL), one batch ahead of
+    the model, which runs whole batches under inference mode.
+    """
+
+    def __init__(self, model_name: str, num_threads: int = 0, batch_size: int = 64, decode_workers: int = 4):
+        import torch
+        from torchvision import models
+
+        if num_threads > 0:
+            torch.set_num_threads(num_threads)
+        if model_name == "MOBILENET_V3_SMALL":
+            model = models.mobilenet_v3_small(weights=models.MobileNet_V3_Small_Weights.DEFAULT)
+            model.classifier = torch.nn.Identity()
+        elif model_name == "RESNET18":
+            model = models.resnet18(weights=models.ResNet18_Weights.DEFAULT)
+            model.fc = torch.nn.Identity()
+        else:
+            raise ValueError(f"Unknown IMAGE_MODEL_NAME: {model_name}")
+
+        self.torch = torch
+        self.model = model.eval()
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._executor = ThreadPoolExecutor(max_workers=max(1, decode_workers), thread_name_prefix="image-decode")
+        with torch.inference_mode():
+            self.dim = int(self.model(torch.zeros(1, 3, _CROP, _CROP)).shape[1])
+
+    @staticmethod
+    def preprocess(content: bytes) -> Optional[np.ndarray]:
+        """Decodes, resizes and crops one image to a normalised CHW array, or None if it can't be decoded."""
+        from PIL import Image
+
+        try:
+            image = Image.open(io.BytesIO(content))
+            # JPEGs are decoded straight at a reduced scale when they're much larger than needed
+            image.draft("RGB", (_RESIZE, _RESIZE))
+            image = image.convert("RGB")
+        except (OSError, ValueError, Image.DecompressionBombError):
+            return None
+        width, height = image.size
+        scale = _RESIZE / min(width, height)
+        image = image.resize((max(_RESIZE, round(width * scale)), max(_RESIZE, round(height * scale))),
+                             Image.BILINEAR)
+        left, top = (image.width - _CROP) // 2, (image.height - _CROP) // 2
+        image = image.crop((left, top, left + _CROP, top + _CROP))
+        pixels = np.asarray(image, dtype=np.float32) / 255.0
+        return ((pixels - _MEAN) / _STD).transpose(2, 0, 1)
+
+    def embed(self, images: Sequence[bytes]) -> Tuple[np.ndarray, List[int]]:
+        """
+        Embeds encoded images in batches. Returns the vectors of the images
+        that could be decoded and their positions in `images`.
+        """
+        starts = list(range(0, len(images), self.batch_size))
+        decoding = None
+        vectors, kept = [], []
+        for i, start in enumerate(starts):
+            if decoding is None:
+                decoding = [self._executor.submit(self.preprocess, image) for image in images[start:start + self.batch_size]]
+            decoded = [future.result() for future in decoding]
+            decoding = None
+            if i + 1 < len(starts):
+                # The next batch decodes while this one runs through the model
+                following = starts[i + 1]
+                decoding = [self._executor.submit(self.preprocess, image)
+                            for image in images[following:following + self.batch_size]]
+
+            positions = [offset for offset, pixels in enumerate(decoded) if pixels is not None]
+            if not positions:
+                continue
+            batch = self.torch.from_numpy(np.stack([decoded[offset] for offset in positions]))
+            with self.torch.inference_mode():
+                vectors.append(self.model(batch).numpy())
+            kept.extend(start + offset for offset in positions)
+
+        if not vectors:
+            return np.zeros((0, self.dim), dtype=np.float32), []
+        vectors = np.vstack(vectors).astype(np.float32)
+        vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors, kept
+
+    def close(self):
+        self._executor.shutdown()
+
+
+def create_image_embedder() -> ImageEmbedder:
+    """Builds the image embedder for IMAGE_MODEL_NAME."""
+    return ImageEmbedder(
+        settings.IMAGE_MODEL_NAME,
+        num_threads=settings.IMAGE_EMBED_THREADS,
+        batch_size=settings.IMAGE_EMBED_BATCH_SIZE,
+        decode_workers=settings.IMAGE_DECODE_WORKERS,
+    )
+
+
+def get_image_vector_cache() -> Optional[EmbeddingCache]:
+    """
+    Image vectors keyed by image digest, one directory per backbone, so an
+    image seen by an earlier ingestion (or behind another URL) is never
+    embedded again. None when EMBEDDING_CACHE_ENABLED is off.
+    """
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return None
+    return EmbeddingCache(os.path.join(settings.IMAGE_CACHE_PATH, "vectors", settings.IMAGE_MODEL_NAME.lower()))
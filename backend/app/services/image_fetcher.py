@@ -0,0 +1,180 @@
+from contextlib import nullcontext
+from typing import Dict, List, Optional, Sequence
+from urllib.parse import urlparse
+import threading
+import asyncio
+import hashlib
+import sqlite3
+import time
+import os
+
+BLOBS_DIR = "blobs"
+URLS_FILE = "urls.sqlite"
+
+
+class ImageStore:
+    """
+    An on-disk, content-addressed cache of downloaded images. Every image
+    is stored once under the SHA-256 of its bytes (blobs/ab/abcd...), so a
+    picture shared by several URLs is kept and embedded once, and a SQLite
+    table maps each fetched URL to its digest. Blobs are written to a
+    temporary file and renamed into place, so a recorded digest always has
+    its complete file.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, BLOBS_DIR), exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(directory, URLS_FILE), check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, digest TEXT NOT NULL, fetched_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.directory, BLOBS_DIR, digest[:2], digest)
+
+    def lookup(self, urls: Sequence[str]) -> Dict[str, str]:
+        """Digests of the URLs fetched before (whose blob is still on disk)."""
+        found = {}
+        with self._lock:
+            for start in range(0, len(urls), 500):
+                chunk = list(urls[start:start + 500])
+                placeholders = ",".join("?" * len(chunk))
+                found.update(self.conn.execute(
+                    f"SELECT url, digest FROM urls WHERE url IN ({placeholders})", chunk
+                ).fetchall())
+        return {url: digest for url, digest in found.items() if os.path.exists(self.blob_path(digest))}
+
+    def write_blob(self, content: bytes) -> str:
+        """Stores image bytes under their digest (once) and returns the digest. Thread-safe."""
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        return digest
+
+    def record(self, digests: Dict[str, str]):
+        """Remembers which digest each URL resolved to."""
+        now = time.time()
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO urls (url, digest, fetched_at) VALUES (?, ?, ?)",
+                [(url, digest, now) for url, digest in digests.items()],
+            )
+            self.conn.commit()
+
+    def read(self, digest: str) -> bytes:
+        with open(self.blob_path(digest), "rb") as f:
+            return f.read()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class ImageFetcher:
+    """
+    Downloads images into an ImageStore with at most `concurrency` requests
+    in flight. URLs already in the store are never fetched again, and a
+    failed download (timeout, HTTP error, empty or oversized body) is
+    counted and skipped rather than failing the run.
+    With `source_dir`, a URL is read from that directory by its file name
+    instead of over the network, which stands in for the CDN offline.
+    """
+
+    def __init__(self, store: ImageStore, concurrency: int, timeout_seconds: float,
+                 max_bytes: int, source_dir: Optional[str] = None):
+        self.store = store
+        self.concurrency = max(1, concurrency)
+        self.timeout_seconds = timeout_seconds
+        self.max_bytes = max_bytes
+        self.source_dir = source_dir
+
+        self.fetched = 0
+        self.cache_hits = 0
+        self.failed = 0
+        self.bytes = 0
+        self.fetch_seconds = 0.0
+
+    def _client(self):
+        if self.source_dir:
+            return nullcontext()
+        import httpx
+        return httpx.AsyncClient(
+            timeout=self.timeout_seconds,
+            limits=httpx.Limits(max_connections=self.concurrency),
+            headers={"User-Agent": "Mozilla/5.0"},
+            follow_redirects=True,
+        )
+
+    async def _download(self, client, url: str) -> bytes:
+        if self.source_dir:
+            path = os.path.join(self.source_dir, os.path.basename(urlparse(url).path))
+            content = await asyncio.to_thread(_read_file, path)
+            if len(content) > self.max_bytes:
+                raise ValueError(f"{url} is larger than {self.max_bytes} bytes")
+            return content
+
+        chunks, size = [], 0
+        async with client.stream("GET", url) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                size += len(chunk)
+                # Stop reading as soon as the body is too large
+                if size > self.max_bytes:
+                    raise ValueError(f"{url} is larger than {self.max_bytes} bytes")
+                chunks.append(chunk)
+        return b"".join(chunks)
+
+    async def _fetch(self, client, semaphore: asyncio.Semaphore, url: str) -> Optional[str]:
+        async with semaphore:
+            try:
+                content = await asyncio.wait_for(self._download(client, url), self.timeout_seconds)
+            except Exception:
+                self.failed += 1
+                return None
+        if not content:
+            self.failed += 1
+            return None
+        # Hashing and writing stay off the event loop
+        digest = await asyncio.to_thread(self.store.write_blob, content)
+        self.fetched += 1
+        self.bytes += len(content)
+        return digest
+
+    async def fetch_many(self, urls: Sequence[Optional[str]]) -> List[Optional[str]]:
+        """Digests of `urls` in order, None where there's no URL or it couldn't be fetched."""
+        unique = list(dict.fromkeys(url for url in urls if url))
+        digests = self.store.lookup(unique)
+        self.cache_hits += len(digests)
+        missing = [url for url in unique if url not in digests]
+        if missing:
+            started = time.perf_counter()
+            semaphore = asyncio.Semaphore(self.concurrency)
+            async with self._client() as client:
+                fetched = await asyncio.gather(*(self._fetch(client, semaphore, url) for url in missing))
+            self.fetch_seconds += time.perf_counter() - started
+            fetched = {url: digest for url, digest in zip(missing, fetched) if digest is not None}
+            self.store.record(fetched)
+            digests.update(fetched)
+        return [digests.get(url) if url else None for url in urls]
+
+    def stats(self) -> dict:
+        return {
+            "fetched": self.fetched,
+            "cache_hits": self.cache_hits,
+            "failed": self.failed,
+            "megabytes": round(self.bytes / 1e6, 2),
+            "images_per_second": round(self.fetched / self.fetch_seconds, 1) if self.fetch_seconds else 0.0,
+        }
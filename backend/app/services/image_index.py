@@ -0,0 +1,94 @@
+from langchain_community.vectorstores.faiss import dependable_faiss_import
+from app.services.ann_index import (
+    FAISS_INDEX_FILE,
+    build_index,
+    build_neighbor_table,
+    configure_search,
+    enable_reconstruction,
+    load_mapped_index,
+    load_neighbor_table,
+    save_neighbor_table,
+    stored_vectors
+)
+from app.services.columnar import read_arrays, write_arrays
+from typing import Any, List, Optional, Sequence
+import numpy as np
+import os
+
+# Sidecar directory written next to the FAISS index at ingestion
+IMAGE_INDEX_DIR = "image_index"
+
+
+class ImageIndex:
+    """
+    A second FAISS index, over product image vectors. Only products whose
+    image could be fetched and decoded have a row, so image rows map to
+    product rows (`product_rows`) and back (`image_rows`, -1 for products
+    without one). Like the text index it carries a neighbour table, so
+    "visually similar" lookups usually don't search at all.
+    """
+
+    def __init__(self, index: Any, product_rows: np.ndarray, image_rows: np.ndarray,
+                 neighbors: Optional[np.ndarray] = None):
+        self.index = index
+        self.product_rows = product_rows
+        self.image_rows = image_rows
+        self.neighbors = neighbors
+
+    def __len__(self) -> int:
+        return self.index.ntotal
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, product_rows: Sequence[int], n_products: int,
+              index_type: str, neighbors_top_n: int) -> "ImageIndex":
+        index = build_index(vectors, index_type)
+        product_rows = np.asarray(product_rows, dtype=np.int64)
+        image_rows = np.full(n_products, -1, dtype=np.int64)
+        image_rows[product_rows] = np.arange(len(product_rows))
+        neighbors = build_neighbor_table(index, neighbors_top_n) if neighbors_top_n > 0 else None
+        return cls(index, product_rows, image_rows, neighbors)
+
+    def save(self, directory: str):
+        faiss = dependable_faiss_import()
+        path = os.path.join(directory, IMAGE_INDEX_DIR)
+        write_arrays(path, {"product_rows": self.product_rows, "image_rows": self.image_rows})
+        if self.neighbors is not None:
+            save_neighbor_table(path, self.neighbors)
+        faiss.write_index(self.index, os.path.join(path, FAISS_INDEX_FILE))
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, IMAGE_INDEX_DIR, FAISS_INDEX_FILE))
+
+    @classmethod
+    def load(cls, directory: str) -> "ImageIndex":
+        """Memory-maps the index, its row maps and its neighbour table."""
+        path = os.path.join(directory, IMAGE_INDEX_DIR)
+        index = load_mapped_index(path)
+        configure_search(index)
+        enable_reconstruction(index)
+        arrays = read_arrays(path, ("product_rows", "image_rows"))
+        neighbors = load_neighbor_table(path)
+        if neighbors is not None and len(neighbors) != index.ntotal:
+            neighbors = None
+        return cls(index, arrays["product_rows"], arrays["image_rows"], neighbors)
+
+    def has_image(self, product_row: int) -> bool:
+        return 0 <= product_row < len(self.image_rows) and self.image_rows[product_row] >= 0
+
+    def similar_rows(self, product_row: int, top_k: int) -> List[int]:
+        """
+        Product rows whose images are nearest to this product's image, from
+        the neighbour table when it's wide enough, otherwise by searching
+        with the product's stored image vector. Empty if it has no image.
+        """
+        if not self.has_image(product_row):
+            return []
+        image_row = int(self.image_rows[product_row])
+        if self.neighbors is not None and top_k <= self.neighbors.shape[1]:
+            hits = [int(other) for other in self.neighbors[image_row, :top_k] if other >= 0]
+        else:
+            vector = stored_vectors(self.index, np.array([image_row]))
+            _, ids = self.index.search(vector, top_k + 1)
+            hits = [int(other) for other in ids[0] if other >= 0 and other != image_row][:top_k]
+        return [int(self.product_rows[other]) for other in hits]
@@ -0,0 +1,264 @@
+from app.core.config import settings
+from app.services.ann_index import (
+    FAISS_INDEX_FILE,
+    configure_search,
+    enable_reconstruction,
+    index_type_name,
+    load_mapped_index,
+    load_neighbor_table
+)
+from app.services.analytics import get_analytics_engine, load_snapshot
+from app.services.product_index import ProductIndex
+from app.services.sparse_index import SparseIndex
+from app.services.clusters import ClusterIndex
+from app.services.image_index import ImageIndex
+from app.services.response_cache import response_cache
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Optional, Tuple
+import pandas as pd
+import numpy as np
+import threading
+import asyncio
+import shutil
+import time
+import os
+
+# Layout under LOCAL_FAISS_INDEX_PATH:
+#   versions/<version>/   one complete index (FAISS, catalog, sparse, analytics)
+#   CURRENT               the name of the version to serve
+# Without CURRENT the directory itself is served as a single "legacy" version.
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+LEGACY_VERSION = "legacy"
+
+
+def version_path(root: str, version: str) -> str:
+    return os.path.join(root, VERSIONS_DIR, version)
+
+
+def current_version(root: str) -> Tuple[str, str]:
+    """Returns (version name, directory) of the version to serve."""
+    try:
+        with open(os.path.join(root, CURRENT_FILE), encoding="utf-8") as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return LEGACY_VERSION, root
+    return version, version_path(root, version)
+
+
+def publish_version(root: str, version: str):
+    """Atomically points CURRENT at a fully written version."""
+    tmp_path = os.path.join(root, f".{CURRENT_FILE}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(root, CURRENT_FILE))
+
+
+def prune_versions(root: str, keep: int) -> List[str]:
+    """
+    Deletes all but the `keep` newest versions (never the current one).
+    Workers still mapping a deleted version keep reading it: unlinked
+    files stay valid until they're unmapped.
+    """
+    versions_dir = os.path.join(root, VERSIONS_DIR)
+    if not os.path.isdir(versions_dir):
+        return []
+    current, _ = current_version(root)
+    versions = sorted(os.listdir(versions_dir), key=lambda v: os.path.getmtime(os.path.join(versions_dir, v)))
+    removed = [v for v in versions[:max(0, len(versions) - keep)] if v != current]
+    for version in removed:
+        shutil.rmtree(os.path.join(versions_dir, version), ignore_errors=True)
+    return removed
+
+
+class IndexBundle:
+    """
+    Everything served from one index version: the memory-mapped FAISS index,
+    its neighbour table and clusters, the product index, the image index,
+    the sparse index and the analytics snapshot.
+    Requests hold a reference while they use it; a bundle that has been
+    swapped out is closed once its last reference is released.
+    """
+
+    def __init__(self, version: str, path: str):
+        self.version = version
+        self.path = path
+        self.refs = 0
+        self.retired = False
+        self.loaded_at = time.time()
+
+        self.faiss_index: Optional[Any] = None
+        self.neighbors: Optional[np.ndarray] = None
+        self.clusters: Optional[ClusterIndex] = None
+        if settings.VECTOR_DB == "FAISS" and os.path.exists(os.path.join(path, FAISS_INDEX_FILE)):
+            self.faiss_index = load_mapped_index(path)
+            # Query-time parameters (nprobe / efSearch) come from settings, not the file
+            configure_search(self.faiss_index)
+            # Stored vectors are read back by row for exact filtered search and "similar" lookups
+            enable_reconstruction(self.faiss_index)
+            print(f"FAISS index {version} mapped ({index_type_name(self.faiss_index)}, "
+                  f"{self.faiss_index.ntotal} vectors).")
+            neighbors = load_neighbor_table(path)
+            if neighbors is not None and len(neighbors) == self.faiss_index.ntotal:
+                self.neighbors = neighbors
+            if ClusterIndex.exists(path):
+                clusters = ClusterIndex.load(path)
+                if len(clusters.assignments) == self.faiss_index.ntotal:
+                    self.clusters = clusters
+
+        if ProductIndex.exists(path):
+            self.product_index = ProductIndex.load(path)
+        elif os.path.exists(settings.DATA_FILE_PATH):
+            print(f"Building product index from {settings.DATA_FILE_PATH}...")
+            self.product_index = ProductIndex.from_dataframe(pd.read_csv(settings.DATA_FILE_PATH))
+        else:
+            print(f"Warning: Product data file not found at {settings.DATA_FILE_PATH}")
+            self.product_index = ProductIndex.from_dataframe(pd.DataFrame())
+
+        self.image_index: Optional[ImageIndex] = None
+        if ImageIndex.exists(path):
+            image_index = ImageIndex.load(path)
+            if len(image_index.image_rows) == len(self.product_index):
+                self.image_index = image_index
+                print(f"Image index {version} mapped ({len(image_index)} vectors).")
+            else:
+                print(f"Warning: image index in {path} doesn't match the product index; visual similarity disabled.")
+
+        self.sparse_index: Optional[SparseIndex] = None
+        if SparseIndex.exists(path):
+            self.sparse_index = SparseIndex.load(path)
+        else:
+            print(f"Warning: sparse index not found in {path}; hybrid retrieval disabled. "
+                  "Re-run the ingestion script to build it.")
+
+        self._analytics = load_snapshot(path)
+        print(f"Index version {version} ready ({len(self.product_index)} products).")
+
+    def analytics_snapshot(self) -> Tuple[str, bytes]:
+        """The snapshot saved with this version, or one computed from the catalog CSV."""
+        if self._analytics is not None:
+            return self._analytics
+        return get_analytics_engine().snapshot()
+
+    def close(self):
+        # Dropping the references unmaps the files once nothing else holds them
+        self.faiss_index = None
+        self.neighbors = None
+        self.clusters = None
+        self.product_index = None
+        self.image_index = None
+        self.sparse_index = None
+        self._analytics = None
+
+
+class IndexRegistry:
+    """
+    Serves the current IndexBundle and swaps in new versions without a
+    restart. A new version is fully loaded before the swap; requests that
+    acquired the old one finish on it, and it is released when its
+    reference count drops to zero.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._current: Optional[IndexBundle] = None
+        self._retired: List[IndexBundle] = []
+        self.swaps = 0
+        self.last_error: Optional[str] = None
+
+    def current(self) -> IndexBundle:
+        if self._current is None:
+            self.reload()
+        return self._current
+
+    @contextmanager
+    def acquire(self) -> Iterator[IndexBundle]:
+        """Pins the current version for the duration of a request."""
+        if self._current is None:
+            self.reload()
+        # Read and pinned under the lock, so a concurrent swap can't close it first
+        with self._lock:
+            bundle = self._current
+            bundle.refs += 1
+        try:
+            yield bundle
+        finally:
+            self._release(bundle)
+
+    def _release(self, bundle: IndexBundle):
+        with self._lock:
+            bundle.refs -= 1
+            if not (bundle.retired and bundle.refs == 0):
+                return
+            self._retired.remove(bundle)
+        print(f"Index version {bundle.version} released.")
+        bundle.close()
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Loads and swaps in the version CURRENT points at, if it changed.
+        Returns whether a swap happened. Loading happens outside the serving
+        lock, so requests keep flowing on the old version meanwhile.
+        """
+        with self._reload_lock:
+            version, path = current_version(self.root)
+            if self._current is not None and self._current.version == version and not force:
+                return False
+            try:
+                bundle = IndexBundle(version, path)
+            except Exception as e:
+                self.last_error = f"{version}: {e}"
+                if self._current is None:
+                    raise
+                print(f"Error loading index version {version}; still serving {self._current.version}: {e}")
+                return False
+
+            with self._lock:
+                old, self._current = self._current, bundle
+                close_old = False
+                if old is not None:
+                    old.retired = True
+                    if old.refs:
+                        self._retired.append(old)
+                    else:
+                        close_old = True
+                    self.swaps += 1
+                self.last_error = None
+
+            if old is not None:
+                print(f"Swapped index version {old.version} -> {version}.")
+                if close_old:
+                    old.close()
+                # Cached responses describe the old catalog
+                response_cache.clear()
+            return True
+
+    async def watch(self, poll_seconds: float):
+        """Polls CURRENT and hot-swaps whenever ingestion publishes a new version."""
+        while True:
+            await asyncio.sleep(poll_seconds)
+            try:
+                await asyncio.to_thread(self.reload)
+            except Exception as e:
+                print(f"Error checking for a new index version: {e}")
+
+    def stats(self) -> dict:
+        current = self._current
+        return {
+            "version": current.version if current else None,
+            "loaded_at": current.loaded_at if current else None,
+            "in_flight": current.refs if current else 0,
+            "image_vectors": len(current.image_index) if current and current.image_index else 0,
+            "retired_in_use": [(bundle.version, bundle.refs) for bundle in self._retired],
+            "swaps": self.swaps,
+            "last_error": self.last_error,
+        }
+
+
+# --- Global Cache ---
+index_registry = IndexRegistry(settings.LOCAL_FAISS_INDEX_PATH)
+# --------------------
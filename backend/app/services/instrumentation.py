@@ -0,0 +1,215 @@
+from app.core.config import settings
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+import collections
+import threading
+import time
+import sys
+import os
+
+# Latency buckets in seconds, from a cache hit to a slow LLM call
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+METRIC_PREFIX = "furnifindr"
+
+
+class Histogram:
+    """A Prometheus-style latency histogram (cumulative buckets, sum, count) per label value."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series: Dict[str, List[float]] = {}  # label -> [bucket counts..., +Inf, sum]
+
+    def observe(self, label: str, seconds: float):
+        with self._lock:
+            series = self._series.get(label)
+            if series is None:
+                series = self._series[label] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[i] += 1
+            series[len(self.buckets)] += 1
+            series[-1] += seconds
+
+    def summary(self) -> Dict[str, dict]:
+        """Count and mean per label, for /stats."""
+        with self._lock:
+            return {
+                label: {"count": series[-2], "mean_ms": round(series[-1] * 1000 / series[-2], 3)}
+                for label, series in self._series.items() if series[-2]
+            }
+
+    def exposition(self, name: str, label_name: str, help_text: str) -> List[str]:
+        lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        with self._lock:
+            for label, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f'{name}_bucket{{{label_name}="{label}",le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{{label_name}="{label}",le="+Inf"}} {series[-2]}')
+                lines.append(f'{name}_sum{{{label_name}="{label}"}} {series[-1]:.6f}')
+                lines.append(f'{name}_count{{{label_name}="{label}"}} {series[-2]}')
+        return lines
+
+
+class RequestTimings:
+    """Per-request stage durations, reported in the Server-Timing header."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self.stages: Dict[str, List[float]] = {}  # stage -> [total seconds, calls]
+
+    def add(self, stage: str, seconds: float):
+        # Spans of one request can end on several threads (to_thread, gather)
+        with self._lock:
+            entry = self.stages.setdefault(stage, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+
+    def server_timing(self) -> str:
+        with self._lock:
+            parts = [
+                f'{stage};dur={seconds * 1000:.2f}' + (f';desc="{calls} calls"' if calls > 1 else "")
+                for stage, (seconds, calls) in self.stages.items()
+            ]
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.2f}")
+        return ", ".join(parts)
+
+
+# --- Global Cache ---
+stage_seconds = Histogram()
+request_seconds = Histogram()
+_current_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+# --------------------
+
+
+def observe(stage: str, seconds: float):
+    """Records a stage duration in the metrics and, inside a request, its Server-Timing."""
+    stage_seconds.observe(stage, seconds)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Times the enclosed block as one pipeline stage (works in sync and async code)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - started)
+
+
+def start_request() -> RequestTimings:
+    timings = RequestTimings()
+    _current_timings.set(timings)
+    return timings
+
+
+class SamplingProfiler:
+    """
+    A low-overhead statistical profiler: a background thread snapshots the
+    stack of every other thread each `interval_ms` and counts identical
+    stacks. The result is in the collapsed ("folded") format read by
+    flamegraph.pl and speedscope. Samples cover the whole process (the event
+    loop interleaves requests), so profile one slow request at a time.
+    """
+
+    def __init__(self, interval_ms: float):
+        self.interval = interval_ms / 1000
+        self.samples: collections.Counter = collections.Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if stack:
+                    if ident not in names:
+                        names = {thread.ident: thread.name for thread in threading.enumerate()}
+                    stack.append(names.get(ident, str(ident)))
+                    self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        """Stops sampling and returns the collapsed stacks."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+    def save(self, label: str) -> str:
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        safe_label = "".join(c if c.isalnum() else "_" for c in label).strip("_")
+        path = os.path.join(settings.PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{safe_label}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.stop())
+        return path
+
+
+# Stats keys that only ever increase; every other numeric stat is a gauge
+COUNTER_KEYS = frozenset({
+    "hits", "misses", "evictions", "expirations", "memory_hits", "disk_hits",
+    "batches", "items", "calls", "deduplicated", "opened", "rejected",
+    "hedges", "hedge_wins", "retries", "swaps",
+})
+
+
+def _numeric_lines(name: str, stats: dict) -> List[str]:
+    """Flattens the numeric leaves of a stats dict into counters, gauges and histograms."""
+    lines = []
+    for key, value in stats.items():
+        metric = f"{name}_{key}"
+        if isinstance(value, dict):
+            if key.endswith("histogram"):
+                # Per-bucket counts plus their sum (see EmbeddingBatcher) -> cumulative buckets
+                lines.append(f"# TYPE {metric} histogram")
+                total = 0
+                for bound, count in value["buckets"].items():
+                    total += count
+                    if bound != "+Inf":
+                        lines.append(f'{metric}_bucket{{le="{bound}"}} {total}')
+                lines.append(f'{metric}_bucket{{le="+Inf"}} {total}')
+                lines.append(f"{metric}_sum {value['sum']}")
+                lines.append(f"{metric}_count {total}")
+            else:
+                lines.extend(_numeric_lines(metric, value))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            if key in COUNTER_KEYS:
+                lines.append(f"# TYPE {metric}_total counter")
+                lines.append(f"{metric}_total {value}")
+            else:
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {value}")
+    return lines
+
+
+def exposition(component_stats: Dict[str, Optional[dict]], info: Dict[str, str]) -> str:
+    """The Prometheus text exposition of the stage histograms plus component stats."""
+    lines = stage_seconds.exposition(
+        f"{METRIC_PREFIX}_stage_seconds", "stage", "Latency of each recommend pipeline stage."
+    )
+    lines += request_seconds.exposition(
+        f"{METRIC_PREFIX}_http_request_seconds", "route", "End-to-end latency per route."
+    )
+    for component, stats in component_stats.items():
+        if stats:
+            lines += _numeric_lines(f"{METRIC_PREFIX}_{component}", stats)
+    labels = ",".join(f'{key}="{value}"' for key, value in info.items())
+    lines += [f"# TYPE {METRIC_PREFIX}_info gauge", f"{METRIC_PREFIX}_info{{{labels}}} 1"]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,337 @@
+from app.models.schemas import Product
+from app.services.analytics import clean_price_column
+from app.services.columnar import (
+    StringColumn,
+    columns_exist,
+    read_arrays,
+    read_columns,
+    sort_order,
+    sorted_lookup,
+    write_arrays,
+    write_columns
+)
+from typing import Dict, List, Optional, Sequence, Tuple
+import pandas as pd
+import numpy as np
+import base64
+import orjson
+import json
+import ast
+import os
+
+# Fields with an inverted index; filter values are matched case-insensitively
+FILTER_FIELDS = ("brand", "category", "material", "color")
+# Pinecone has no case-insensitive match, so ingestion stores a normalised
+# copy of each filterable metadata field under these keys
+PINECONE_FILTER_KEYS = {
+    "brand": "brand_key",
+    "categories": "category_keys",
+    "material": "material_key",
+    "color": "color_key",
+}
+
+# Sidecar directory written next to the FAISS index at ingestion
+CATALOG_DIR = "catalog"
+CATALOG_KEYS_FILE = "keys.json"
+
+
+def filter_key(value) -> str:
+    """The form filter values and posting-list keys are compared in."""
+    return str(value).strip().lower()
+
+
+def pinecone_filter_metadata(metadata: dict) -> dict:
+    """The normalised filter fields (PINECONE_FILTER_KEYS) of a product's metadata."""
+    keys = {}
+    for field, key in PINECONE_FILTER_KEYS.items():
+        value = metadata.get(field)
+        if isinstance(value, list):
+            keys[key] = [filter_key(item) for item in value if filter_key(item)]
+        elif value is not None:
+            keys[key] = filter_key(value)
+    return keys
+
+
+def _product_from_record(record: bytes) -> Product:
+    """
+    A Product from its stored JSON, without validating it again: records
+    are written by Product.model_dump_json at build time, so they already
+    hold every field in its validated form. This is what
+    Product.model_construct does, minus its per-field default handling,
+    which the complete records don't need and which costs more than
+    validating. The raw bytes are kept as the pre-serialised record.
+    """
+    product = object.__new__(Product)
+    fields = orjson.loads(record)
+    object.__setattr__(product, "__dict__", fields)
+    object.__setattr__(product, "__pydantic_fields_set__", set(fields))
+    object.__setattr__(product, "__pydantic_extra__", None)
+    object.__setattr__(product, "__pydantic_private__", {"_record": record})
+    return product
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor can't be decoded."""
+
+
+def encode_cursor(row: int) -> str:
+    return base64.urlsafe_b64encode(str(row).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """
+    The row id in a cursor from `encode_cursor`. Anything but a plain
+    non-negative integer is rejected: a negative row would index the
+    result set from its end.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = base64.urlsafe_b64decode(padded.encode()).decode("ascii")
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}") from e
+    # int() would also take signs, spaces and underscores
+    if not (payload.isascii() and payload.isdigit()):
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}")
+    return int(payload)
+
+
+def _parse_list(value, memo: Dict[str, List[str]]) -> List[str]:
+    """Native lists (ingested metadata) pass through; stringified ones are parsed, memoising on the raw string."""
+    if isinstance(value, list):
+        return [str(item) for item in value]
+    if not isinstance(value, str) or not value.startswith("["):
+        return []
+    if value not in memo:
+        try:
+            memo[value] = [str(item) for item in ast.literal_eval(value)]
+        except (ValueError, SyntaxError):
+            memo[value] = []
+    return memo[value]
+
+
+def _postings(keys: pd.Series) -> Dict[str, np.ndarray]:
+    """Builds value -> sorted row id array for a column of (lowercased) keys."""
+    keys = keys[keys != ""]
+    # .groups maps each key to its index labels, which are the row ids
+    return {
+        key: np.sort(np.asarray(rows, dtype=np.int64))
+        for key, rows in keys.groupby(keys).groups.items()
+    }
+
+
+class ProductIndex:
+    """
+    An immutable index over the product catalog.
+
+    Each product is serialised to JSON once at build time; reads keep that
+    JSON on the Product as its pre-serialised record, so responses don't
+    encode catalog fields again (see app/services/serialization.py). Filters are
+    answered from inverted posting lists (brand, category, material, color)
+    and a sorted price array, so a page request touches only the matching
+    row ids and never the underlying DataFrame.
+
+    A saved index is memory-mapped on load (product JSON, ids, prices and
+    posting lists), so every worker on a host shares one copy of it.
+    """
+
+    def __init__(self, product_json: StringColumn, uniq_ids: StringColumn, prices: np.ndarray,
+                 postings: Dict[str, Dict[str, np.ndarray]],
+                 price_order: Optional[np.ndarray] = None, id_order: Optional[np.ndarray] = None):
+        self._json = product_json
+        self._prices = prices
+        self._price_order = np.argsort(prices, kind="stable") if price_order is None else price_order
+        self._sorted_prices = prices[self._price_order]
+        self._postings = postings
+        self._uniq_ids = uniq_ids
+        self._id_order = sort_order(uniq_ids) if id_order is None else id_order
+
+    def __len__(self) -> int:
+        return len(self._json)
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> "ProductIndex":
+        """Preparses every row of a raw catalog DataFrame."""
+        df = df.fillna("").reset_index(drop=True)
+        if df.empty:
+            empty = StringColumn.from_values([])
+            return cls(empty, empty, np.zeros(0, dtype=np.float64), {field: {} for field in FILTER_FIELDS})
+
+        text = df.astype(str)
+        memo: Dict[str, List[str]] = {}
+        categories = [_parse_list(value, memo) for value in df["categories"]]
+        images = [_parse_list(value, memo) for value in df["images"]]
+
+        product_json = [
+            Product(
+                uniq_id=row["uniq_id"],
+                title=row["title"],
+                brand=row["brand"],
+                description=row["description"],
+                price=row["price"],
+                manufacturer=row["manufacturer"],
+                package_dimensions=row["package_dimensions"],
+                country_of_origin=row["country_of_origin"],
+                material=row["material"],
+                color=row["color"],
+                images=row_images,
+                categories=row_categories,
+            ).model_dump_json().encode("utf-8")
+            for row, row_images, row_categories in zip(text.to_dict(orient="records"), images, categories)
+        ]
+
+        exploded = pd.Series(categories, dtype=object).explode().dropna()
+        category_keys = exploded.astype(str).str.strip().str.lower()
+        postings = {
+            "brand": _postings(text["brand"].str.strip().str.lower()),
+            "category": {
+                key: np.unique(np.asarray(rows, dtype=np.int64))
+                for key, rows in category_keys.groupby(category_keys).groups.items()
+                if key
+            },
+            "material": _postings(text["material"].str.strip().str.lower()),
+            "color": _postings(text["color"].str.strip().str.lower()),
+        }
+        return cls(
+            StringColumn.from_values(product_json),
+            StringColumn.from_values(list(text["uniq_id"])),
+            clean_price_column(df["price"]),
+            postings
+        )
+
+    def save(self, directory: str):
+        """
+        Writes the index as a columnar sidecar that `load` maps read-only.
+        Row ids are preserved, so an index built in document order stays
+        aligned with the FAISS ids.
+        """
+        catalog_dir = os.path.join(directory, CATALOG_DIR)
+        write_columns(catalog_dir, {"product_json": self._json, "uniq_id": self._uniq_ids})
+
+        arrays = {"prices": self._prices, "price_order": self._price_order, "id_order": self._id_order}
+        keys = {}
+        for field in FILTER_FIELDS:
+            field_keys = list(self._postings[field])
+            lists = [self._postings[field][key] for key in field_keys]
+            indptr = np.zeros(len(lists) + 1, dtype=np.int64)
+            np.cumsum([len(rows) for rows in lists], out=indptr[1:])
+            arrays[f"{field}_indptr"] = indptr
+            arrays[f"{field}_rows"] = np.concatenate(lists) if lists else np.zeros(0, dtype=np.int64)
+            keys[field] = field_keys
+        write_arrays(catalog_dir, arrays)
+        with open(os.path.join(catalog_dir, CATALOG_KEYS_FILE), "w", encoding="utf-8") as f:
+            json.dump(keys, f)
+
+    @classmethod
+    def load(cls, directory: str) -> "ProductIndex":
+        """Maps an index written by `save` without re-parsing any product."""
+        catalog_dir = os.path.join(directory, CATALOG_DIR)
+        columns = read_columns(catalog_dir)
+        names = ["prices", "price_order", "id_order"]
+        names += [f"{field}_{suffix}" for field in FILTER_FIELDS for suffix in ("indptr", "rows")]
+        arrays = read_arrays(catalog_dir, names)
+        with open(os.path.join(catalog_dir, CATALOG_KEYS_FILE), encoding="utf-8") as f:
+            keys = json.load(f)
+
+        postings = {}
+        for field in FILTER_FIELDS:
+            indptr, rows = arrays[f"{field}_indptr"], arrays[f"{field}_rows"]
+            postings[field] = {
+                key: rows[indptr[i]:indptr[i + 1]] for i, key in enumerate(keys[field])
+            }
+        return cls(
+            columns["product_json"], columns["uniq_id"], arrays["prices"], postings,
+            price_order=arrays["price_order"], id_order=arrays["id_order"]
+        )
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return columns_exist(os.path.join(directory, CATALOG_DIR))
+
+    def row(self, uniq_id: str) -> int:
+        """Row id of a product, or -1 if it isn't in the index."""
+        return sorted_lookup(self._uniq_ids, self._id_order, uniq_id)
+
+    def product(self, row: int) -> Product:
+        """Returns the product stored at a row id (a FAISS id for ingested indexes)."""
+        return _product_from_record(self._json.raw(row))
+
+    def get(self, uniq_id: str) -> Optional[Product]:
+        """Returns a single product by id."""
+        row = self.row(uniq_id)
+        return None if row < 0 else self.product(row)
+
+    def filter_rows(self, brands: Optional[Sequence[str]] = None,
+                    categories: Optional[Sequence[str]] = None,
+                    materials: Optional[Sequence[str]] = None,
+                    colors: Optional[Sequence[str]] = None,
+                    min_price: Optional[float] = None,
+                    max_price: Optional[float] = None) -> Optional[np.ndarray]:
+        """
+        Returns the sorted row ids matching every given filter, or None when
+        no filter is set (i.e. every row matches). Several values for one
+        field match any of them.
+        """
+        candidate_sets = []
+        for field, values in zip(FILTER_FIELDS, (brands, categories, materials, colors)):
+            if not values:
+                continue
+            lists = [self._postings[field].get(filter_key(value)) for value in values]
+            lists = [rows for rows in lists if rows is not None]
+            if not lists:
+                return np.zeros(0, dtype=np.int64)
+            candidate_sets.append(lists[0] if len(lists) == 1 else np.unique(np.concatenate(lists)))
+
+        has_price_filter = min_price is not None or max_price is not None
+        if not candidate_sets and not has_price_filter:
+            return None
+
+        if candidate_sets:
+            # Intersect the smallest posting lists first
+            candidate_sets.sort(key=len)
+            rows = candidate_sets[0]
+            for other in candidate_sets[1:]:
+                rows = np.intersect1d(rows, other, assume_unique=True)
+            if has_price_filter:
+                prices = self._prices[rows]
+                mask = np.ones(len(rows), dtype=bool)
+                if min_price is not None:
+                    mask &= prices >= min_price
+                if max_price is not None:
+                    mask &= prices <= max_price
+                rows = rows[mask]
+            return rows
+
+        lo = 0 if min_price is None else np.searchsorted(self._sorted_prices, min_price, side="left")
+        hi = len(self._sorted_prices) if max_price is None else np.searchsorted(self._sorted_prices, max_price, side="right")
+        return np.sort(self._price_order[lo:hi])
+
+    def page(self, rows: Optional[np.ndarray], cursor: Optional[str], limit: int) -> Tuple[np.ndarray, Optional[str], int]:
+        """
+        Returns (page row ids, next cursor, total matches) for the rows produced
+        by `filter_rows`. Cursors encode the last row id returned.
+        """
+        start = decode_cursor(cursor) + 1 if cursor else 0
+        if rows is None:
+            total = len(self)
+            page_rows = np.arange(start, min(total, start + limit), dtype=np.int64)
+            has_more = start + limit < total
+        else:
+            total = len(rows)
+            offset = int(np.searchsorted(rows, start, side="left"))
+            page_rows = rows[offset:offset + limit]
+            has_more = offset + limit < total
+        next_cursor = encode_cursor(int(page_rows[-1])) if has_more and len(page_rows) else None
+        return page_rows, next_cursor, total
+
+    def page_json(self, rows: Optional[np.ndarray], cursor: Optional[str], limit: int) -> bytes:
+        """Like `page`, but returns a ready-to-send ProductPage JSON body."""
+        page_rows, next_cursor, total = self.page(rows, cursor, limit)
+        return b"".join((
+            b'{"items":[',
+            b",".join(self._json.raw(row) for row in page_rows),
+            b'],"next_cursor":',
+            json.dumps(next_cursor).encode(),
+            b',"total":',
+            str(total).encode(),
+            b"}",
+        ))
@@ -1,66 +1,199 @@
 from app.models.schemas import Product, RecommendationResponse, RecommendationRequest
-from app.services.vector_store import get_retriever
-from app.services.generative import generate_creative_description
-from typing import List
-import ast
+from app.services.vector_store import aembed_query, aembed_queries
+from app.services.retrieval import retrieve_products, retrieve_products_batch
+from app.services.generative import (
+    FALLBACK_DESCRIPTION,
+    DescriptionStreamError,
+    describe_products,
+    lookup_descriptions,
+    stream_creative_description,
+    template_description
+)
+from app.services.response_cache import response_cache
+from app.services.instrumentation import span
+from app.core.config import settings
+from typing import AsyncIterator, List, Optional, Tuple
 import asyncio
 
-def _parse_metadata_to_product(metadata: dict) -> Product:
-    """Converts a Document's metadata dict into a Product schema."""
-    
-    # Safely parse list-like strings from metadata
-    try:
-        images = ast.literal_eval(metadata.get("images", "[]"))
-    except:
-        images = []
-        
-    try:
-        categories = ast.literal_eval(metadata.get("categories", "[]"))
-    except:
-        categories = []
-
-    return Product(
-        uniq_id=metadata.get("uniq_id"),
-        title=metadata.get("title"),
-        brand=metadata.get("brand"),
-        description=metadata.get("description"),
-        price=metadata.get("price"),
-        manufacturer=metadata.get("manufacturer"),
-        package_dimensions=metadata.get("package_dimensions"),
-        country_of_origin=metadata.get("country_of_origin"),
-        material=metadata.get("material"),
-        color=metadata.get("color"),
-        images=images,
-        categories=categories
-    )
+
+def _cache_scope(request: RecommendationRequest) -> str:
+    """Filtered and unfiltered requests must never share cache entries."""
+    return request.filters.model_dump_json() if request.filters else ""
 
 
 async def get_recommendations(request: RecommendationRequest) -> RecommendationResponse:
     """
     Main recommendation logic.
-    1. Retrieves similar documents from the vector store.
-    2. Enriches them with generated descriptions.
+    1. Embeds the prompt and checks the semantic response cache.
+    2. Retrieves similar documents from the vector store.
+    3. Enriches them with generated descriptions.
     """
     print(f"Received recommendation request: {request.prompt}")
     
-    # 1. Get the retriever
-    retriever = get_retriever(top_k=request.top_k)
-    
-    # 2. Retrieve relevant documents (asynchronous)
-    # .ainvoke() is the async version of .invoke()
-    relevant_docs = await retriever.ainvoke(request.prompt)
+    # 1. Embed the prompt once; the vector is reused for the cache and the search
+    with span("embed"):
+        query_embedding = await aembed_query(request.prompt)
+
+    if settings.RESPONSE_CACHE_ENABLED:
+        with span("response_cache"):
+            cached = response_cache.get(query_embedding, request.top_k, _cache_scope(request))
+        if cached is not None:
+            return cached
     
-    # 3. Convert docs to Product models
-    products = [_parse_metadata_to_product(doc.metadata) for doc in relevant_docs]
+    # 2. Retrieve relevant products (dense, or dense + sparse in HYBRID mode)
+    with span("retrieve"):
+        products = await retrieve_products(request.prompt, query_embedding, request.top_k, request.filters)
     
-    # 4. Generate creative descriptions for each product *in parallel*
-    generation_tasks = [
-        generate_creative_description(product) for product in products
-    ]
-    generated_descriptions = await asyncio.gather(*generation_tasks)
+    # 3. Look up stored descriptions and generate the rest *in parallel*,
+    #    within the generation budget
+    with span("describe"):
+        generated_descriptions, complete = await describe_products(
+            products, settings.GENERATION_BUDGET_MS / 1000
+        )
     
-    # 5. Add the generated descriptions to the product objects
+    # 4. Add the generated descriptions to the product objects
     for product, gen_desc in zip(products, generated_descriptions):
         product.generated_description = gen_desc
+
+    response = RecommendationResponse(recommendations=products)
+    # Responses with template stand-ins aren't cached, so the next similar
+    # prompt picks up the generated descriptions instead
+    if settings.RESPONSE_CACHE_ENABLED and complete:
+        response_cache.put(query_embedding, request.top_k, response, _cache_scope(request))
         
-    return RecommendationResponse(recommendations=products)
\ No newline at end of file
+    return response
+
+
+async def get_batch_recommendations(requests: List[RecommendationRequest]) -> List[RecommendationResponse]:
+    """
+    Recommendations for several requests at once, in request order.
+    1. Embeds every prompt with a single model call.
+    2. Answers what it can from the semantic response cache.
+    3. Retrieves the rest on one index version with a multi-query search.
+    4. Describes each distinct product once, however many results it is in.
+    """
+    print(f"Received batch recommendation request: {len(requests)} prompts")
+
+    with span("embed"):
+        query_embeddings = await aembed_queries([request.prompt for request in requests])
+
+    responses: List[Optional[RecommendationResponse]] = [None] * len(requests)
+    if settings.RESPONSE_CACHE_ENABLED:
+        with span("response_cache"):
+            for i, (request, query_embedding) in enumerate(zip(requests, query_embeddings)):
+                responses[i] = response_cache.get(query_embedding, request.top_k, _cache_scope(request))
+    pending = [i for i, response in enumerate(responses) if response is None]
+    if not pending:
+        return responses
+
+    with span("retrieve"):
+        results = await retrieve_products_batch(
+            [requests[i].prompt for i in pending],
+            [query_embeddings[i] for i in pending],
+            [requests[i].top_k for i in pending],
+            [requests[i].filters for i in pending]
+        )
+
+    unique = {}
+    for products in results:
+        for product in products:
+            unique.setdefault(product.uniq_id, product)
+    with span("describe"):
+        descriptions, complete = await describe_products(
+            list(unique.values()), settings.GENERATION_BUDGET_MS / 1000
+        )
+    by_id = dict(zip(unique, descriptions))
+
+    for i, products in zip(pending, results):
+        for product in products:
+            product.generated_description = by_id[product.uniq_id]
+        responses[i] = RecommendationResponse(recommendations=products)
+        if settings.RESPONSE_CACHE_ENABLED and complete:
+            response_cache.put(query_embeddings[i], requests[i].top_k, responses[i], _cache_scope(requests[i]))
+    return responses
+
+
+async def stream_recommendations(request: RecommendationRequest) -> AsyncIterator[Tuple[str, dict]]:
+    """
+    Streaming variant of get_recommendations. Yields (event, data) pairs:
+    - "products": the retrieved products, as soon as retrieval completes
+      (descriptions already in the store are included)
+    - "description_delta": a chunk of a product's description as the LLM produces it
+    - "description": a product's final description; it replaces the deltas
+      (with the template) when the stream failed part-way
+    - "done": emitted once every description has been delivered
+    """
+    print(f"Received streaming recommendation request: {request.prompt}")
+
+    with span("embed"):
+        query_embedding = await aembed_query(request.prompt)
+
+    if settings.RESPONSE_CACHE_ENABLED:
+        with span("response_cache"):
+            cached = response_cache.get(query_embedding, request.top_k, _cache_scope(request))
+        if cached is not None:
+            yield "products", {"recommendations": [p.model_dump() for p in cached.recommendations]}
+            yield "done", {"cached": True}
+            return
+
+    with span("retrieve"):
+        products = await retrieve_products(request.prompt, query_embedding, request.top_k, request.filters)
+    for product, description in zip(products, lookup_descriptions(products)):
+        product.generated_description = description
+    yield "products", {"recommendations": [p.model_dump() for p in products]}
+
+    # Each missing description streams its chunks into a shared queue,
+    # followed by a final "description" event once it is complete
+    queue: asyncio.Queue = asyncio.Queue()
+    pending = [product for product in products if product.generated_description is None]
+    degraded = []
+
+    async def stream_one(product: Product):
+        chunks = []
+        finished = False
+        try:
+            async for chunk in stream_creative_description(product):
+                if not chunks and chunk == FALLBACK_DESCRIPTION:
+                    # Generation failed or the circuit breaker is open; the
+                    # template is streamed, but the response isn't cached
+                    degraded.append(product.uniq_id)
+                    chunks.append(template_description(product))
+                    await queue.put(("description_delta", {"uniq_id": product.uniq_id, "delta": chunks[0]}))
+                    break
+                chunks.append(chunk)
+                await queue.put(("description_delta", {"uniq_id": product.uniq_id, "delta": chunk}))
+            finished = True
+        except DescriptionStreamError as e:
+            print(f"Error streaming description: {e}")
+        finally:
+            description = "".join(chunks).strip()
+            if not finished or not description:
+                # Failed, truncated or cancelled: the final event carries the
+                # template instead, and the response isn't cached
+                degraded.append(product.uniq_id)
+                description = template_description(product)
+            product.generated_description = description
+            await queue.put(("description", {
+                "uniq_id": product.uniq_id,
+                "generated_description": product.generated_description
+            }))
+
+    tasks = [asyncio.create_task(stream_one(product)) for product in pending]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            event, data = await queue.get()
+            if event == "description":
+                remaining -= 1
+            yield event, data
+    finally:
+        # The client may disconnect mid-stream; don't leave LLM calls running
+        for task in tasks:
+            task.cancel()
+
+    if settings.RESPONSE_CACHE_ENABLED and not degraded:
+        response_cache.put(
+            query_embedding, request.top_k,
+            RecommendationResponse(recommendations=products), _cache_scope(request)
+        )
+    yield "done", {"cached": False}
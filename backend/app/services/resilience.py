@@ -0,0 +1,263 @@
+from app.core.config import settings
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Deque, Iterable, List, Optional, TypeVar
+import collections
+import asyncio
+import time
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a dependency whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing dependency. The outcomes of the last `window`
+    calls are tracked; once at least `min_calls` are recorded and their
+    error rate reaches `error_rate`, the breaker opens and callers fail fast
+    for `cooldown_seconds`. It then half-opens: up to `half_open_probes`
+    calls go through, and their outcome closes the breaker or re-opens it.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, name: str, window: int, min_calls: int, error_rate: float,
+                 cooldown_seconds: float, half_open_probes: int):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.cooldown_seconds = cooldown_seconds
+        self.half_open_probes = max(1, half_open_probes)
+
+        self.state = self.CLOSED
+        self._outcomes: Deque[bool] = collections.deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probes = 0
+
+        self.opened = 0
+        self.rejected = 0
+
+    def _admit(self) -> bool:
+        """Returns whether the call is a half-open probe; raises CircuitOpenError if it is rejected."""
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.cooldown_seconds:
+                self.rejected += 1
+                raise CircuitOpenError(f"{self.name} circuit is open")
+            self.state = self.HALF_OPEN
+            self._probes = 0
+        if self.state == self.HALF_OPEN:
+            if self._probes >= self.half_open_probes:
+                self.rejected += 1
+                raise CircuitOpenError(f"{self.name} circuit is half-open and probing")
+            self._probes += 1
+            return True
+        return False
+
+    def _open(self):
+        if self.state != self.OPEN:
+            print(f"Circuit breaker '{self.name}' opened; skipping calls for {self.cooldown_seconds}s.")
+            self.opened += 1
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+
+    def _record(self, success: bool, probe: bool):
+        if probe:
+            self._probes = max(0, self._probes - 1)
+            if self.state == self.HALF_OPEN:
+                if success:
+                    print(f"Circuit breaker '{self.name}' closed.")
+                    self.state = self.CLOSED
+                else:
+                    self._open()
+            return
+        if self.state != self.CLOSED:
+            # A call started before the breaker opened; its outcome is stale
+            return
+        self._outcomes.append(success)
+        failures = len(self._outcomes) - sum(self._outcomes)
+        if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.error_rate:
+            self._open()
+
+    @asynccontextmanager
+    async def guard(self):
+        """
+        Wraps one call: raises CircuitOpenError if the breaker rejects it,
+        otherwise records whether the block raised. Cancelled calls record nothing.
+        """
+        probe = self._admit()
+        try:
+            yield
+        except Exception:
+            self._record(False, probe)
+            raise
+        except BaseException:
+            if probe:
+                self._probes = max(0, self._probes - 1)
+            raise
+        self._record(True, probe)
+
+    def stats(self) -> dict:
+        window = len(self._outcomes)
+        return {
+            "state": self.state,
+            "state_code": (self.CLOSED, self.HALF_OPEN, self.OPEN).index(self.state),
+            "error_rate": round((window - sum(self._outcomes)) / window, 3) if window else 0.0,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+class Hedger:
+    """
+    Hedged requests: when an attempt hasn't finished after the `quantile`
+    latency of recent successful attempts (never sooner than
+    `min_delay_ms`), a duplicate is started and the first to succeed wins;
+    the other is cancelled. A failed attempt is retried at once while
+    attempts remain. Every attempt is bounded by `timeout_seconds`.
+    """
+
+    def __init__(self, max_attempts: int, quantile: float, min_delay_ms: float,
+                 timeout_seconds: float, history: int = 200, min_samples: int = 20):
+        self.max_attempts = max(1, max_attempts)
+        self.quantile = quantile
+        self.min_delay_ms = min_delay_ms
+        self.timeout_seconds = timeout_seconds
+        self.min_samples = min_samples
+        self._latencies: Deque[float] = collections.deque(maxlen=history)
+
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.retries = 0
+
+    def delay(self) -> float:
+        """Seconds to wait for an attempt before hedging it."""
+        delay = self.min_delay_ms / 1000
+        if len(self._latencies) >= self.min_samples:
+            ordered = sorted(self._latencies)
+            delay = max(delay, ordered[min(len(ordered) - 1, int(self.quantile * len(ordered)))])
+        return delay
+
+    async def _attempt(self, fn: Callable[[], Awaitable[T]]) -> T:
+        started = time.monotonic()
+        result = await asyncio.wait_for(fn(), self.timeout_seconds or None)
+        self._latencies.append(time.monotonic() - started)
+        return result
+
+    async def call(self, fn: Callable[[], Awaitable[T]],
+                   can_hedge: Callable[[], bool] = lambda: True) -> T:
+        """
+        Runs `fn` with hedging and retries and returns the first successful
+        result, or raises the last error. `can_hedge` is asked before each
+        hedge, so duplicates aren't sent to an already saturated dependency.
+        """
+        self.calls += 1
+        running = {asyncio.ensure_future(self._attempt(fn))}
+        hedges = set()
+        attempts = 1
+        error: Optional[BaseException] = None
+        try:
+            while running:
+                hedge_after = self.delay() if attempts < self.max_attempts else None
+                done, running = await asyncio.wait(
+                    running, timeout=hedge_after, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    if can_hedge():
+                        self.hedges += 1
+                        attempts += 1
+                        hedge = asyncio.ensure_future(self._attempt(fn))
+                        hedges.add(hedge)
+                        running.add(hedge)
+                    else:
+                        # Saturated: keep waiting on what's running, without hedging
+                        done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task in hedges:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+                if not running and attempts < self.max_attempts:
+                    self.retries += 1
+                    attempts += 1
+                    running.add(asyncio.ensure_future(self._attempt(fn)))
+            raise error
+        finally:
+            for task in running:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "retries": self.retries,
+            "hedge_delay_ms": round(self.delay() * 1000, 1),
+        }
+
+
+class Deadline:
+    """A time budget shared by the stages of one request. No budget never expires."""
+
+    def __init__(self, seconds: Optional[float]):
+        self.expires_at = time.monotonic() + seconds if seconds else None
+
+    def remaining(self) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+
+async def gather_within(deadline: Deadline, awaitables: Iterable[Awaitable[Any]]) -> List[Optional[Any]]:
+    """
+    Runs the awaitables concurrently until all finish or the deadline passes.
+    Returns their results in order, with None for any that failed or were
+    still running; those are cancelled (work behind asyncio.shield carries on).
+    """
+    tasks = [asyncio.ensure_future(awaitable) for awaitable in awaitables]
+    if not tasks:
+        return []
+    try:
+        await asyncio.wait(tasks, timeout=deadline.remaining())
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+    return [
+        task.result() if task.done() and not task.cancelled() and task.exception() is None else None
+        for task in tasks
+    ]
+
+
+# --- Global Cache ---
+llm_breaker = CircuitBreaker(
+    "llm",
+    window=settings.LLM_BREAKER_WINDOW,
+    min_calls=settings.LLM_BREAKER_MIN_CALLS,
+    error_rate=settings.LLM_BREAKER_ERROR_RATE,
+    cooldown_seconds=settings.LLM_BREAKER_COOLDOWN_SECONDS,
+    half_open_probes=settings.LLM_BREAKER_HALF_OPEN_PROBES,
+)
+llm_hedger = Hedger(
+    max_attempts=settings.LLM_MAX_ATTEMPTS,
+    quantile=settings.LLM_HEDGE_QUANTILE,
+    min_delay_ms=settings.LLM_HEDGE_MIN_DELAY_MS,
+    timeout_seconds=settings.LLM_CALL_TIMEOUT_SECONDS,
+)
+# --------------------
+
+
+def stats() -> dict:
+    """Circuit breaker state and hedging counters of the generative step."""
+    return {
+        "llm_breaker": llm_breaker.stats(),
+        "llm_hedger": llm_hedger.stats(),
+    }
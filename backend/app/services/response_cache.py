@@ -0,0 +1,167 @@
+from app.models.schemas import RecommendationResponse
+from app.services.serialization import recommendations_json
+from app.core.config import settings
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional
+import numpy as np
+import threading
+import time
+
+
+@dataclass
+class _CacheEntry:
+    """A single cached /recommend response."""
+    key: int
+    embedding: np.ndarray  # L2-normalised query embedding
+    top_k: int
+    scope: str  # Anything besides the prompt that the response depends on (e.g. filters)
+    response: RecommendationResponse
+    size_bytes: int
+    created_at: float
+
+
+class SemanticResponseCache:
+    """
+    An in-memory LRU cache of recommendation responses keyed on query embeddings.
+
+    A lookup matches any cached prompt whose embedding is within `max_distance`
+    (cosine distance) of the new prompt and which was computed with at least
+    as many results as requested under the same `scope`. Entries expire after `ttl_seconds` and the
+    least recently used entries are evicted once either `max_entries` or
+    `max_bytes` is exceeded.
+    """
+
+    def __init__(self, max_distance: float, ttl_seconds: float, max_entries: int, max_bytes: int):
+        self.max_distance = max_distance
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._entries: "OrderedDict[int, _CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_key = 0
+        self._total_bytes = 0
+
+        # The stacked embedding matrix is rebuilt lazily after writes
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: List[int] = []
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _normalise(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _remove(self, key: int):
+        entry = self._entries.pop(key)
+        self._total_bytes -= entry.size_bytes
+        self._matrix = None
+
+    def _expire(self, now: float):
+        expired = [
+            key for key, entry in self._entries.items()
+            if now - entry.created_at > self.ttl_seconds
+        ]
+        for key in expired:
+            self._remove(key)
+        self.expirations += len(expired)
+
+    def _evict(self):
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes
+        ):
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    def get(self, embedding, top_k: int, scope: str = "") -> Optional[RecommendationResponse]:
+        """
+        Returns a cached response for a near-identical prompt, or None.
+        The response is truncated to `top_k` recommendations.
+        """
+        query = self._normalise(embedding)
+        with self._lock:
+            self._expire(time.monotonic())
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            if self._matrix is None:
+                self._matrix_keys = list(self._entries.keys())
+                self._matrix = np.vstack([self._entries[k].embedding for k in self._matrix_keys])
+
+            # Cosine distance on normalised vectors is 1 - dot product
+            distances = 1.0 - self._matrix @ query
+            for idx in np.argsort(distances):
+                if distances[idx] > self.max_distance:
+                    break
+                entry = self._entries[self._matrix_keys[idx]]
+                if entry.top_k >= top_k and entry.scope == scope:
+                    self._entries.move_to_end(entry.key)
+                    self.hits += 1
+                    return RecommendationResponse(
+                        recommendations=entry.response.recommendations[:top_k]
+                    )
+
+            self.misses += 1
+            return None
+
+    def put(self, embedding, top_k: int, response: RecommendationResponse, scope: str = ""):
+        """Stores a freshly computed response."""
+        vector = self._normalise(embedding)
+        size_bytes = len(recommendations_json(response)) + vector.nbytes
+        if size_bytes > self.max_bytes:
+            return
+
+        with self._lock:
+            key = self._next_key
+            self._next_key += 1
+            self._entries[key] = _CacheEntry(
+                key=key,
+                embedding=vector,
+                top_k=top_k,
+                scope=scope,
+                response=response,
+                size_bytes=size_bytes,
+                created_at=time.monotonic(),
+            )
+            self._total_bytes += size_bytes
+            self._matrix = None
+            self._evict()
+
+    def clear(self):
+        """Drops every cached entry (counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+            self._matrix = None
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and the current footprint."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+# --- Global Cache ---
+response_cache = SemanticResponseCache(
+    max_distance=settings.RESPONSE_CACHE_MAX_DISTANCE,
+    ttl_seconds=settings.RESPONSE_CACHE_TTL_SECONDS,
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    max_bytes=settings.RESPONSE_CACHE_MAX_BYTES,
+)
+# --------------------
@@ -0,0 +1,206 @@
+from app.models.schemas import Product, ProductFilters
+from app.services.vector_store import asearch_by_vector, search_faiss_matrix
+from app.services.sparse_index import reciprocal_rank_fusion
+from app.services.product_index import PINECONE_FILTER_KEYS, ProductIndex, filter_key
+from app.services.index_registry import IndexBundle, index_registry
+from app.services.ann_index import stored_vectors
+from app.services.clusters import cluster_diverse, mmr
+from app.services.instrumentation import span
+from app.core.config import settings
+from typing import Awaitable, Callable, List, Optional, Tuple
+import numpy as np
+import asyncio
+
+def pinecone_filter(filters: ProductFilters) -> dict:
+    """
+    Translates ProductFilters into a Pinecone metadata filter over the
+    normalised fields written at ingestion, so values match
+    case-insensitively as they do against the FAISS posting lists.
+    """
+    clauses = {}
+    price = {}
+    if filters.min_price is not None:
+        price["$gte"] = filters.min_price
+    if filters.max_price is not None:
+        price["$lte"] = filters.max_price
+    if price:
+        clauses["price_clean"] = price
+    for field, values in (("brand", filters.brands), ("categories", filters.categories),
+                          ("material", filters.materials), ("color", filters.colors)):
+        if values:
+            clauses[PINECONE_FILTER_KEYS[field]] = {"$in": list(dict.fromkeys(filter_key(value) for value in values))}
+    return clauses
+
+def _resolve_filters(filters: Optional[ProductFilters],
+                     product_index: ProductIndex) -> Tuple[Optional[np.ndarray], Optional[dict]]:
+    """
+    Returns (allowed FAISS rows, Pinecone metadata filter) for a request's filters.
+    Rows come from the product index's posting lists, whose row ids are the FAISS ids.
+    """
+    if filters is None:
+        return None, None
+    if settings.VECTOR_DB == "PINECONE":
+        return None, pinecone_filter(filters) or None
+    return product_index.filter_rows(
+        brands=filters.brands,
+        categories=filters.categories,
+        materials=filters.materials,
+        colors=filters.colors,
+        min_price=filters.min_price,
+        max_price=filters.max_price
+    ), None
+
+
+async def retrieve_products(prompt: str, query_embedding: List[float], top_k: int,
+                            filters: Optional[ProductFilters] = None) -> List[Product]:
+    """
+    Retrieves the top_k products for a prompt.
+    In HYBRID mode the dense (vector) and sparse (BM25) searches run
+    concurrently and their rankings are merged with reciprocal-rank fusion.
+    Filters restrict both searches up front rather than discarding results.
+    With CLUSTER_ROUTING the dense search only scans the nearest clusters,
+    and RESULT_DIVERSITY re-ranks a wider candidate list before the cut.
+    The whole request runs on one index version, even if a new one is
+    swapped in meanwhile.
+    """
+    with index_registry.acquire() as bundle:
+        return await _retrieve(bundle, prompt, query_embedding, top_k, filters)
+
+
+async def retrieve_products_batch(prompts: List[str], query_embeddings: List[List[float]], top_ks: List[int],
+                                  filters: List[Optional[ProductFilters]]) -> List[List[Product]]:
+    """
+    Retrieves products for several prompts on one index version, in order.
+    The dense searches of every query that is neither filtered nor routed
+    run as one multi-query FAISS search; the others search on their own.
+    A product found by several queries is parsed once and shared.
+    """
+    with index_registry.acquire() as bundle:
+        parsed = {}
+
+        def ranking(hits: List[int]) -> Callable[[int], List[Product]]:
+            def top(k: int) -> List[Product]:
+                # Only the rows a query actually uses are parsed
+                with span("parse_products"):
+                    for row in hits[:k]:
+                        if row not in parsed:
+                            parsed[row] = bundle.product_index.product(row)
+                return [parsed[row] for row in hits[:k]]
+            return top
+
+        dense_hits: List[Optional[Callable[[int], List[Product]]]] = [None] * len(prompts)
+        plain = [i for i, request_filters in enumerate(filters) if request_filters is None]
+        routed = settings.CLUSTER_ROUTING and bundle.clusters is not None
+        if settings.VECTOR_DB == "FAISS" and bundle.faiss_index is not None and plain and not routed:
+            # Deep enough for every query's top_k, diversity and hybrid candidates
+            k = max(max(top_ks[i] for i in plain), settings.DIVERSITY_CANDIDATES, settings.HYBRID_CANDIDATES)
+            with span("vector_search"):
+                rows = await asyncio.to_thread(
+                    search_faiss_matrix, bundle.faiss_index, [query_embeddings[i] for i in plain], k
+                )
+            for i, hits in zip(plain, rows):
+                dense_hits[i] = ranking(hits)
+
+        return list(await asyncio.gather(*(
+            _retrieve(bundle, prompt, query_embedding, top_k, request_filters, hits)
+            for prompt, query_embedding, top_k, request_filters, hits
+            in zip(prompts, query_embeddings, top_ks, filters, dense_hits)
+        )))
+
+
+def _route(bundle: IndexBundle, query_embedding: List[float],
+           allowed_rows: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    """
+    Restricts the dense search to the rows of the clusters nearest to the
+    query (within any filter). Falls back to the unrouted rows when the
+    routed clusters hold no row that passes the filters.
+    """
+    if not settings.CLUSTER_ROUTING or bundle.clusters is None:
+        return allowed_rows
+    routed = bundle.clusters.route(query_embedding, settings.CLUSTER_ROUTE_PROBES)
+    if allowed_rows is not None:
+        routed = np.intersect1d(routed, allowed_rows, assume_unique=True)
+    return routed if len(routed) else allowed_rows
+
+
+def _diversify(bundle: IndexBundle, query_embedding: List[float], products: List[Product],
+               top_k: int) -> List[Product]:
+    """Picks top_k of the ranked candidates by MMR or one-per-cluster first."""
+    rows = np.array([bundle.product_index.row(product.uniq_id) for product in products], dtype=np.int64)
+    if settings.RESULT_DIVERSITY == "CLUSTER" and bundle.clusters is not None:
+        picked = cluster_diverse(np.asarray(bundle.clusters.assignments)[rows], top_k)
+    else:
+        picked = mmr(query_embedding, stored_vectors(bundle.faiss_index, rows), top_k, settings.MMR_LAMBDA)
+    return [products[position] for position in picked]
+
+
+async def _retrieve(bundle: IndexBundle, prompt: str, query_embedding: List[float], top_k: int,
+                    filters: Optional[ProductFilters],
+                    dense_hits: Optional[Callable[[int], List[Product]]] = None) -> List[Product]:
+    """`dense_hits`, when given, returns the top k of the query's precomputed unfiltered dense ranking."""
+    with span("filter"):
+        allowed_rows, metadata_filter = _resolve_filters(filters, bundle.product_index)
+    if allowed_rows is not None and len(allowed_rows) == 0:
+        return []
+
+    # Diversity needs the candidates' vectors, which only a local index has
+    diversify = settings.RESULT_DIVERSITY != "NONE" and bundle.faiss_index is not None
+    fetch_k = max(top_k, settings.DIVERSITY_CANDIDATES) if diversify else top_k
+    with span("route"):
+        dense_rows = _route(bundle, query_embedding, allowed_rows)
+
+    async def dense_search(k: int) -> List[Product]:
+        if dense_hits is not None and dense_rows is None:
+            return dense_hits(k)
+        return await asearch_by_vector(
+            query_embedding, top_k=k, allowed_rows=dense_rows,
+            metadata_filter=metadata_filter, bundle=bundle
+        )
+
+    sparse_index = bundle.sparse_index if settings.RETRIEVAL_MODE == "HYBRID" else None
+    # Pinecone filters can't be applied to the local sparse index
+    if metadata_filter is not None:
+        sparse_index = None
+    if sparse_index is None:
+        products = await dense_search(fetch_k)
+    else:
+        products = await _hybrid_search(bundle, sparse_index, prompt, dense_search, fetch_k, allowed_rows)
+
+    if diversify and len(products) > top_k:
+        with span("diversify"):
+            products = await asyncio.to_thread(_diversify, bundle, query_embedding, products, top_k)
+    return products[:top_k]
+
+
+def _sparse_search(sparse_index, prompt: str, top_k: int, allowed_rows: Optional[np.ndarray]):
+    with span("sparse_search"):
+        return sparse_index.search(prompt, top_k, allowed_rows)
+
+
+async def _hybrid_search(bundle: IndexBundle, sparse_index, prompt: str,
+                         dense_search: Callable[[int], Awaitable[List[Product]]],
+                         top_k: int, allowed_rows: Optional[np.ndarray]) -> List[Product]:
+    candidates = max(top_k, settings.HYBRID_CANDIDATES)
+    dense_hits, sparse_hits = await asyncio.gather(
+        dense_search(candidates),
+        asyncio.to_thread(_sparse_search, sparse_index, prompt, candidates, allowed_rows)
+    )
+
+    dense_products = {}
+    for product in dense_hits:
+        dense_products.setdefault(product.uniq_id, product)
+
+    fused = reciprocal_rank_fusion(
+        [list(dense_products), [uniq_id for uniq_id, _ in sparse_hits]],
+        k=settings.RRF_K
+    )
+
+    products = []
+    for uniq_id in fused:
+        # Sparse-only hits aren't in the dense results; look them up by id
+        product = dense_products.get(uniq_id) or bundle.product_index.get(uniq_id)
+        if product is not None:
+            products.append(product)
+        if len(products) == top_k:
+            break
+    return products
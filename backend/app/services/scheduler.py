@@ -0,0 +1,247 @@
+from app.core.config import settings
+from app.services.instrumentation import stage_seconds
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+import asyncio
+import time
+
+_BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+class EmbeddingBatcher:
+    """
+    Collects query embeddings that arrive within a short window and computes
+    them with a single `embed_documents` call on a dedicated worker thread,
+    so the CPU-bound model never runs on (or blocks) the event loop.
+    """
+
+    def __init__(self, embed_fn: Callable[[List[str]], List[List[float]]],
+                 window_ms: float, max_batch_size: int):
+        self.embed_fn = embed_fn
+        self.window_ms = window_ms
+        self.max_batch_size = max_batch_size
+
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+        # One thread: batches queue up behind each other instead of competing for cores
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+
+        self.batches = 0
+        self.items = 0
+        self.max_queue_depth = 0
+        self.batch_size_histogram: Dict[str, int] = {str(b): 0 for b in _BATCH_SIZE_BUCKETS}
+        self.batch_size_histogram["+Inf"] = 0
+
+    async def embed(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        self.max_queue_depth = max(self.max_queue_depth, len(self._pending))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_ms / 1000, self._flush)
+        return await future
+
+    async def embed_many(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds a batch the caller has already assembled with one model call
+        on the same worker thread, without waiting for the window.
+        """
+        unique_texts = list(dict.fromkeys(texts))
+        self._record_batch(len(unique_texts))
+        started = time.perf_counter()
+        vectors = await asyncio.get_running_loop().run_in_executor(self._executor, self.embed_fn, unique_texts)
+        stage_seconds.observe("embed_model_batch", time.perf_counter() - started)
+        by_text = dict(zip(unique_texts, vectors))
+        return [by_text[text] for text in texts]
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _record_batch(self, size: int):
+        self.batches += 1
+        self.items += size
+        for bucket in _BATCH_SIZE_BUCKETS:
+            if size <= bucket:
+                self.batch_size_histogram[str(bucket)] += 1
+                return
+        self.batch_size_histogram["+Inf"] += 1
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]):
+        # Identical texts in the same window are embedded once
+        unique_texts = list(dict.fromkeys(text for text, _ in batch))
+        self._record_batch(len(unique_texts))
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            vectors = await loop.run_in_executor(self._executor, self.embed_fn, unique_texts)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        # Shared by every request in the batch, so kept out of their Server-Timing
+        stage_seconds.observe("embed_model_batch", time.perf_counter() - started)
+
+        by_text = dict(zip(unique_texts, vectors))
+        for text, future in batch:
+            if not future.done():
+                future.set_result(by_text[text])
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": len(self._pending),
+            "max_queue_depth": self.max_queue_depth,
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            # The batch sizes add up to the items embedded
+            "batch_size_histogram": {"buckets": dict(self.batch_size_histogram), "sum": self.items},
+        }
+
+
+class SingleFlight:
+    """
+    Deduplicates identical in-flight calls: concurrent callers with the same
+    key share one execution and its result.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.deduplicated = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is None:
+            self.calls += 1
+            future = asyncio.ensure_future(fn())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.deduplicated += 1
+        # Shielded so one caller's cancellation doesn't cancel the shared call
+        return await asyncio.shield(future)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "calls": self.calls,
+            "deduplicated": self.deduplicated,
+        }
+
+
+class LLMLimiter:
+    """
+    Global admission control for LLM calls: at most `max_concurrency` calls
+    in flight and, if `rate_per_second` > 0, a token bucket on call starts.
+    Callers over the limit wait, which applies backpressure to the request.
+    """
+
+    def __init__(self, max_concurrency: int, rate_per_second: float, burst: int):
+        self.max_concurrency = max_concurrency
+        self.rate_per_second = rate_per_second
+        self.burst = max(1, burst)
+
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._bucket_lock: Optional[asyncio.Lock] = None
+        self._tokens = float(self.burst)
+        self._last_refill = time.monotonic()
+
+        self.waiting = 0
+        self.in_flight = 0
+        self.calls = 0
+        self.total_wait_seconds = 0.0
+
+    async def _take_token(self):
+        if self.rate_per_second <= 0:
+            return
+        if self._bucket_lock is None:
+            self._bucket_lock = asyncio.Lock()
+        async with self._bucket_lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate_per_second)
+                self._last_refill = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate_per_second)
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            await self._take_token()
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.total_wait_seconds += time.monotonic() - started
+
+        self.in_flight += 1
+        self.calls += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def has_capacity(self) -> bool:
+        """True when a new call would start without waiting (nobody is queued and a slot is free)."""
+        return self.waiting == 0 and self.in_flight < self.max_concurrency
+
+    def stats(self) -> dict:
+        return {
+            "waiting": self.waiting,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "calls": self.calls,
+            "mean_wait_ms": round(self.total_wait_seconds * 1000 / self.calls, 2) if self.calls else 0.0,
+        }
+
+
+def _embed_documents(texts: List[str]) -> List[List[float]]:
+    # Imported lazily: vector_store depends on this module
+    from app.services.vector_store import get_embedding_model
+    return get_embedding_model().embed_documents(texts)
+
+
+# --- Global Schedulers ---
+embedding_batcher = EmbeddingBatcher(
+    _embed_documents,
+    window_ms=settings.EMBED_BATCH_WINDOW_MS,
+    max_batch_size=settings.EMBED_BATCH_MAX_SIZE,
+)
+embedding_singleflight = SingleFlight()
+llm_singleflight = SingleFlight()
+llm_limiter = LLMLimiter(
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    rate_per_second=settings.LLM_RATE_PER_SECOND,
+    burst=settings.LLM_RATE_BURST,
+)
+# -------------------------
+
+
+def stats() -> dict:
+    """Queue depth, batch size and in-flight counters for every scheduler."""
+    return {
+        "embedding_batcher": embedding_batcher.stats(),
+        "embedding_singleflight": embedding_singleflight.stats(),
+        "llm_singleflight": llm_singleflight.stats(),
+        "llm_limiter": llm_limiter.stats(),
+    }
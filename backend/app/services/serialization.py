@@ -0,0 +1,44 @@
+from app.models.schemas import Product, RecommendationResponse
+from typing import List
+import orjson
+
+# Every product index record ends with the (not yet generated) description
+_RECORD_SUFFIX = b'"generated_description":null}'
+
+
+def product_json(product: Product) -> bytes:
+    """
+    A product's JSON. Catalog products reuse their pre-serialised record and
+    only encode the generated description; any other product is dumped by
+    pydantic. Both give the same bytes as `product.model_dump_json()`.
+    """
+    private = product.__pydantic_private__
+    record = private.get("_record") if private else None
+    if record is None or not record.endswith(_RECORD_SUFFIX):
+        return product.model_dump_json().encode("utf-8")
+    if product.generated_description is None:
+        return record
+    return b"".join((
+        record[:-len(_RECORD_SUFFIX)],
+        b'"generated_description":',
+        orjson.dumps(product.generated_description),
+        b"}",
+    ))
+
+
+def recommendations_json(response: RecommendationResponse) -> bytes:
+    """The JSON body of a RecommendationResponse, built from its products' records."""
+    return b'{"recommendations":[' + b",".join(map(product_json, response.recommendations)) + b"]}"
+
+
+def batch_recommendations_json(responses: List[RecommendationResponse]) -> bytes:
+    """The JSON body of a BatchRecommendationResponse."""
+    return b'{"results":[' + b",".join(map(recommendations_json, responses)) + b"]}"
+
+
+def similar_products_json(uniq_id: str, products: List[Product]) -> bytes:
+    """The JSON body of a SimilarProductsResponse."""
+    return b"".join((
+        b'{"uniq_id":', orjson.dumps(uniq_id), b',"similar":[',
+        b",".join(map(product_json, products)), b"]}",
+    ))
@@ -0,0 +1,70 @@
+from app.core.config import settings
+from app.models.schemas import Product
+from app.services.ann_index import stored_vectors
+from app.services.index_registry import IndexBundle, index_registry
+from app.services.vector_store import _faiss_index, get_vector_store, search_by_vector, search_faiss_rows
+from typing import List
+import numpy as np
+
+
+class ProductNotFound(KeyError):
+    """Raised when a uniq_id isn't in the served catalog."""
+
+
+class ImageNotIndexed(ProductNotFound):
+    """Raised when a product has no image vector (no image, or it couldn't be fetched or decoded)."""
+
+
+class ImageIndexUnavailable(RuntimeError):
+    """Raised when the served version has no image index (IMAGE_INDEX_ENABLED was off at ingestion)."""
+
+
+def similar_rows(bundle: IndexBundle, row: int, top_k: int) -> List[int]:
+    """
+    Rows most similar to `row`. Served from the neighbour table when it's
+    wide enough; otherwise the row's stored vector is read back from the
+    index and searched with. Neither path runs the embedding model.
+    """
+    neighbors = bundle.neighbors
+    if neighbors is not None and top_k <= neighbors.shape[1]:
+        return [int(other) for other in neighbors[row, :top_k] if other >= 0]
+
+    index = _faiss_index(bundle)
+    vector = stored_vectors(index, np.array([row]))[0]
+    rows = search_faiss_rows(index, vector, top_k + 1)
+    return [other for other in rows if other != row][:top_k]
+
+
+def _pinecone_similar(uniq_id: str, top_k: int) -> List[Product]:
+    """Pinecone stores each vector under its uniq_id; fetch it and search with it."""
+    db = get_vector_store()
+    vectors = db._index.fetch(ids=[uniq_id]).vectors
+    if uniq_id not in vectors:
+        raise ProductNotFound(uniq_id)
+    products = search_by_vector(list(vectors[uniq_id].values), top_k + 1)
+    return [product for product in products if product.uniq_id != uniq_id][:top_k]
+
+
+def similar_products(uniq_id: str, top_k: int = 10) -> List[Product]:
+    """'More like this' for a catalog product, by its stored embedding."""
+    if settings.VECTOR_DB == "PINECONE":
+        return _pinecone_similar(uniq_id, top_k)
+
+    with index_registry.acquire() as bundle:
+        row = bundle.product_index.row(uniq_id)
+        if row < 0:
+            raise ProductNotFound(uniq_id)
+        return [bundle.product_index.product(other) for other in similar_rows(bundle, row, top_k)]
+
+
+def visually_similar_products(uniq_id: str, top_k: int = 10) -> List[Product]:
+    """Products whose image looks most like this product's, from the image index."""
+    with index_registry.acquire() as bundle:
+        row = bundle.product_index.row(uniq_id)
+        if row < 0:
+            raise ProductNotFound(uniq_id)
+        if bundle.image_index is None:
+            raise ImageIndexUnavailable(f"Index version {bundle.version} has no image index")
+        if not bundle.image_index.has_image(row):
+            raise ImageNotIndexed(uniq_id)
+        return [bundle.product_index.product(other) for other in bundle.image_index.similar_rows(row, top_k)]
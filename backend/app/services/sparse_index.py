@@ -0,0 +1,137 @@
+from app.services.columnar import (
+    StringColumn,
+    columns_exist,
+    read_arrays,
+    read_columns,
+    write_arrays,
+    write_columns
+)
+from collections import Counter
+from typing import List, Optional, Sequence, Tuple, Union
+import numpy as np
+import json
+import os
+import re
+
+# Sidecar directory written next to the FAISS index at ingestion
+SPARSE_DIR = "sparse"
+SPARSE_VOCAB_FILE = "vocab.json"
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased alphanumeric tokens; keeps brand names and model numbers intact."""
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+class SparseIndex:
+    """
+    A BM25 inverted index over the product texts.
+
+    Postings are stored CSR-style (term -> slice of doc ids) with the BM25
+    weight of each posting precomputed at build time, so a query only reads
+    the postings of its own terms instead of scoring every document.
+    Row ids follow document order at ingestion, which is also the FAISS order.
+    A saved index is memory-mapped on load and shared between workers.
+    """
+
+    def __init__(self, terms: List[str], uniq_ids: Union[StringColumn, List[str]], indptr: np.ndarray,
+                 doc_ids: np.ndarray, weights: np.ndarray):
+        self.terms = terms
+        self.uniq_ids = uniq_ids
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self._term_ids = {term: i for i, term in enumerate(terms)}
+
+    def __len__(self) -> int:
+        return len(self.uniq_ids)
+
+    @classmethod
+    def build(cls, texts: Sequence[str], uniq_ids: Sequence[str], k1: float = 1.5, b: float = 0.75) -> "SparseIndex":
+        vocabulary = {}
+        term_ids, doc_ids, freqs = [], [], []
+        doc_lengths = np.zeros(len(texts), dtype=np.float32)
+        for doc, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths[doc] = len(tokens)
+            for term, freq in Counter(tokens).items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                doc_ids.append(doc)
+                freqs.append(freq)
+
+        term_ids = np.array(term_ids, dtype=np.int64)
+        doc_ids = np.array(doc_ids, dtype=np.int32)
+        freqs = np.array(freqs, dtype=np.float32)
+
+        # Group postings by term
+        order = np.argsort(term_ids, kind="stable")
+        term_ids, doc_ids, freqs = term_ids[order], doc_ids[order], freqs[order]
+        doc_freqs = np.bincount(term_ids, minlength=len(vocabulary))
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(doc_freqs, out=indptr[1:])
+
+        n_docs = max(len(texts), 1)
+        avg_length = float(doc_lengths.mean()) if len(texts) else 1.0
+        idf = np.log(1 + (n_docs - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+        norm = k1 * (1 - b + b * doc_lengths[doc_ids] / max(avg_length, 1e-6))
+        weights = idf[term_ids] * freqs * (k1 + 1) / (freqs + norm)
+
+        return cls(list(vocabulary), list(uniq_ids), indptr, doc_ids, weights.astype(np.float32))
+
+    def save(self, directory: str):
+        sparse_dir = os.path.join(directory, SPARSE_DIR)
+        write_arrays(sparse_dir, {"indptr": self.indptr, "doc_ids": self.doc_ids, "weights": self.weights})
+        write_columns(sparse_dir, {"uniq_id": self.uniq_ids})
+        with open(os.path.join(sparse_dir, SPARSE_VOCAB_FILE), "w", encoding="utf-8") as f:
+            json.dump({"terms": self.terms}, f)
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return columns_exist(os.path.join(directory, SPARSE_DIR))
+
+    @classmethod
+    def load(cls, directory: str) -> "SparseIndex":
+        sparse_dir = os.path.join(directory, SPARSE_DIR)
+        arrays = read_arrays(sparse_dir, ("indptr", "doc_ids", "weights"))
+        uniq_ids = read_columns(sparse_dir)["uniq_id"]
+        with open(os.path.join(sparse_dir, SPARSE_VOCAB_FILE), encoding="utf-8") as f:
+            vocab = json.load(f)
+        return cls(vocab["terms"], uniq_ids, arrays["indptr"], arrays["doc_ids"], arrays["weights"])
+
+    def search(self, query: str, top_k: int, allowed_rows: Optional[np.ndarray] = None) -> List[Tuple[str, float]]:
+        """
+        Returns up to top_k (uniq_id, BM25 score) pairs, best first.
+        `allowed_rows` (sorted row ids) restricts the search to a filtered subset.
+        """
+        term_ids = [self._term_ids[t] for t in set(tokenize(query)) if t in self._term_ids]
+        if not term_ids:
+            return []
+        slices = [slice(self.indptr[t], self.indptr[t + 1]) for t in term_ids]
+        docs = np.concatenate([self.doc_ids[s] for s in slices])
+        weights = np.concatenate([self.weights[s] for s in slices])
+        if allowed_rows is not None:
+            keep = np.isin(docs, allowed_rows)
+            docs, weights = docs[keep], weights[keep]
+            if not len(docs):
+                return []
+
+        # Accumulate scores over the matched postings only
+        matched, inverse = np.unique(docs, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights)
+        if len(matched) > top_k:
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            best = np.arange(len(matched))
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(self.uniq_ids[matched[i]], float(scores[i])) for i in best]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[str]:
+    """Merges ranked id lists: each id scores sum(1 / (k + rank)) over the lists it appears in."""
+    scores = {}
+    for ranking in rankings:
+        for rank, uniq_id in enumerate(ranking, start=1):
+            scores[uniq_id] = scores.get(uniq_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
@@ -1,9 +1,19 @@
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.faiss import dependable_faiss_import
 from langchain_pinecone import Pinecone
-from langchain_core.vectorstores import VectorStoreRetriever
+from langchain_core.embeddings import Embeddings
 from app.core.config import settings
-import os
+from app.models.schemas import Product
+from app.services.product_index import ProductIndex
+from app.services.index_registry import IndexBundle, index_registry
+from app.services.scheduler import embedding_batcher, embedding_singleflight
+from app.services.ann_index import search_parameters
+from app.services.embedding_cache import CachedEmbeddings, get_embedding_cache
+from app.services.embedding_backends import create_embedding_model
+from app.services.instrumentation import span
+from typing import Any, List, Optional
+import numpy as np
+import asyncio
+import ast
 
 # --- Global Cache ---
 # We cache the embeddings model and vector store in memory
@@ -12,53 +22,52 @@ _embeddings = None
 _vector_store = None
 # --------------------
 
-def get_embedding_model() -> HuggingFaceEmbeddings:
+def get_embedding_model() -> Embeddings:
     """
-    Loads and caches the sentence-transformer embedding model.
+    Loads and caches the sentence-transformer embedding model on the
+    configured EMBEDDING_BACKEND, wrapped in the persistent embedding cache
+    when it's enabled.
     """
     global _embeddings
     if _embeddings is None:
-        _embeddings = HuggingFaceEmbeddings(
-            model_name=settings.EMBEDDING_MODEL_NAME,
-            model_kwargs={'device': 'cpu'} # Use CPU for local demo
-        )
+        print(f"Loading embedding model {settings.EMBEDDING_MODEL_NAME} ({settings.EMBEDDING_BACKEND})...")
+        model = create_embedding_model()
+        cache = get_embedding_cache()
+        _embeddings = CachedEmbeddings(model, cache) if cache is not None else model
     return _embeddings
 
+def _faiss_index(bundle: IndexBundle) -> Any:
+    if bundle.faiss_index is None or not ProductIndex.exists(bundle.path):
+        raise FileNotFoundError(
+            f"FAISS index or its product metadata not found at {bundle.path}. "
+            "Did you run the ingestion script? (backend/app/data_ingestion/ingest.py)"
+        )
+    return bundle.faiss_index
+
 def get_vector_store():
     """
-    Loads and caches the vector store (FAISS or Pinecone)
-    based on the environment settings.
-    This function is called on API startup.
+    Loads and caches the Pinecone vector store.
+    FAISS indexes aren't cached here: each request pins the version
+    currently served with `index_registry.acquire()` and reads the
+    memory-mapped index from its bundle, so it can't be closed mid-use.
     """
     global _vector_store
+    if settings.VECTOR_DB == "FAISS":
+        raise ValueError("FAISS indexes are served per version; use index_registry.acquire()")
+
     if _vector_store is not None:
         return _vector_store
 
     print(f"Initializing vector store: {settings.VECTOR_DB}")
-    embeddings = get_embedding_model()
     
-    if settings.VECTOR_DB == "FAISS":
-        if not os.path.exists(settings.LOCAL_FAISS_INDEX_PATH):
-            raise FileNotFoundError(
-                f"FAISS index not found at {settings.LOCAL_FAISS_INDEX_PATH}. "
-                "Did you run the ingestion script? (backend/app/data_ingestion/ingest.py)"
-            )
-        print(f"Loading FAISS index from {settings.LOCAL_FAISS_INDEX_PATH}...")
-        _vector_store = FAISS.load_local(
-            settings.LOCAL_FAISS_INDEX_PATH,
-            embeddings,
-            allow_dangerous_deserialization=True # Required for FAISS
-        )
-        print("FAISS index loaded.")
-        
-    elif settings.VECTOR_DB == "PINECONE":
+    if settings.VECTOR_DB == "PINECONE":
         if not settings.PINECONE_API_KEY:
             raise ValueError("PINECONE_API_KEY must be set in .env for Pinecone")
         
         print(f"Connecting to Pinecone index: {settings.PINECONE_INDEX_NAME}...")
         _vector_store = Pinecone.from_existing_index(
             index_name=settings.PINECONE_INDEX_NAME,
-            embedding=embeddings
+            embedding=get_embedding_model()
         )
         print("Connected to Pinecone.")
         
@@ -67,10 +76,141 @@ def get_vector_store():
         
     return _vector_store
 
-def get_retriever(top_k: int = 5) -> VectorStoreRetriever:
+def _metadata_list(value) -> List[str]:
+    """Lists are stored natively; indexes ingested before that hold stringified lists."""
+    if isinstance(value, list):
+        return value
+    try:
+        return ast.literal_eval(value or "[]")
+    except (ValueError, SyntaxError):
+        return []
+
+def _parse_metadata_to_product(metadata: dict) -> Product:
+    """Converts a Pinecone Document's metadata dict into a Product schema."""
+    return Product(
+        uniq_id=metadata.get("uniq_id"),
+        title=metadata.get("title"),
+        brand=metadata.get("brand"),
+        description=metadata.get("description"),
+        price=metadata.get("price"),
+        manufacturer=metadata.get("manufacturer"),
+        package_dimensions=metadata.get("package_dimensions"),
+        country_of_origin=metadata.get("country_of_origin"),
+        material=metadata.get("material"),
+        color=metadata.get("color"),
+        images=_metadata_list(metadata.get("images")),
+        categories=_metadata_list(metadata.get("categories"))
+    )
+
+async def aembed_query(text: str) -> List[float]:
+    """
+    Embeds a single query string without blocking the event loop.
+    Repeated queries are answered from the embedding cache's memory tier,
+    identical in-flight queries share one computation, and concurrent
+    queries are micro-batched into a single model call.
+    """
+    cache = get_embedding_cache()
+    if cache is not None:
+        cached = cache.get_memory(text)
+        if cached is not None:
+            return cached.tolist()
+    return await embedding_singleflight.do(text, lambda: embedding_batcher.embed(text))
+
+async def aembed_queries(texts: List[str]) -> List[List[float]]:
     """
-    Gets a retriever from the cached vector store.
-    This is what the recommendation service will use.
+    Embeds several query strings, in order, with a single model call.
+    Texts in the embedding cache's memory tier aren't recomputed, and
+    duplicates are embedded once.
     """
+    vectors: List[Optional[List[float]]] = [None] * len(texts)
+    cache = get_embedding_cache()
+    if cache is not None:
+        for i, text in enumerate(texts):
+            cached = cache.get_memory(text)
+            if cached is not None:
+                vectors[i] = cached.tolist()
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if missing:
+        computed = await embedding_batcher.embed_many([texts[i] for i in missing])
+        for i, vector in zip(missing, computed):
+            vectors[i] = vector
+    return vectors
+
+def search_faiss_matrix(index, embeddings: List[List[float]], top_k: int) -> List[List[int]]:
+    """Unfiltered FAISS search of several queries in one call; row ids per query, nearest first."""
+    queries = np.asarray(embeddings, dtype=np.float32)
+    _, ids = index.search(queries, top_k)
+    return [[int(row) for row in hits if row >= 0] for hits in ids]
+
+def search_faiss_rows(index, embedding: List[float], top_k: int,
+                      allowed_rows: Optional[np.ndarray] = None) -> List[int]:
+    """
+    FAISS search returning row ids, nearest first.
+    With `allowed_rows` the search is pre-filtered: small candidate sets are
+    scored exactly on their own vectors; larger ones are searched through
+    the index with a bitmap ID selector, so the index never returns rows
+    that would have to be discarded afterwards.
+    """
+    faiss = dependable_faiss_import()
+    query = np.asarray([embedding], dtype=np.float32)
+    if allowed_rows is None:
+        _, ids = index.search(query, top_k)
+        return [int(row) for row in ids[0] if row >= 0]
+
+    top_k = min(top_k, len(allowed_rows))
+    if len(allowed_rows) <= settings.PREFILTER_EXACT_MAX:
+        try:
+            vectors = index.reconstruct_batch(allowed_rows.astype(np.int64))
+        except RuntimeError:
+            vectors = None  # Index type without direct vector access
+        if vectors is not None:
+            distances = ((vectors - query) ** 2).sum(axis=1)
+            best = np.argpartition(distances, top_k - 1)[:top_k]
+            return [int(row) for row in allowed_rows[best[np.argsort(distances[best])]]]
+
+    mask = np.zeros(index.ntotal, dtype=bool)
+    mask[allowed_rows] = True
+    bitmap = np.packbits(mask, bitorder="little")
+    selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+    _, ids = index.search(query, top_k, params=search_parameters(index, selector))
+    return [int(row) for row in ids[0] if row >= 0]
+
+def search_by_vector(embedding: List[float], top_k: int = 5,
+                     allowed_rows: Optional[np.ndarray] = None,
+                     metadata_filter: Optional[dict] = None,
+                     bundle: Optional[IndexBundle] = None) -> List[Product]:
+    """Blocking search; see `asearch_by_vector`."""
+    if settings.VECTOR_DB == "FAISS":
+        if allowed_rows is not None and len(allowed_rows) == 0:
+            return []
+        if bundle is None:
+            with index_registry.acquire() as bundle:
+                return search_by_vector(embedding, top_k, allowed_rows, bundle=bundle)
+        with span("vector_search"):
+            rows = search_faiss_rows(_faiss_index(bundle), embedding, top_k, allowed_rows)
+        with span("parse_products"):
+            return [bundle.product_index.product(row) for row in rows]
+    db = get_vector_store()
+    with span("vector_search"):
+        docs = db.similarity_search_by_vector(embedding, k=top_k, filter=metadata_filter or None)
+    with span("parse_products"):
+        return [_parse_metadata_to_product(doc.metadata) for doc in docs]
+
+async def asearch_by_vector(embedding: List[float], top_k: int = 5,
+                            allowed_rows: Optional[np.ndarray] = None,
+                            metadata_filter: Optional[dict] = None,
+                            bundle: Optional[IndexBundle] = None) -> List[Product]:
+    """
+    Searches the cached vector store with a precomputed query embedding,
+    so callers that already embedded the prompt don't pay for it twice.
+    FAISS searches can be pre-filtered to `allowed_rows`; Pinecone searches
+    take the equivalent `metadata_filter`. Pass the request's pinned
+    `bundle` so every lookup in a request sees the same index version.
+    """
+    if settings.VECTOR_DB == "FAISS":
+        return await asyncio.to_thread(search_by_vector, embedding, top_k, allowed_rows, None, bundle)
     db = get_vector_store()
-    return db.as_retriever(search_kwargs={"k": top_k})
\ No newline at end of file
+    with span("vector_search"):
+        docs = await db.asimilarity_search_by_vector(embedding, k=top_k, filter=metadata_filter or None)
+    with span("parse_products"):
+        return [_parse_metadata_to_product(doc.metadata) for doc in docs]
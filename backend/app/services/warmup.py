@@ -0,0 +1,128 @@
+from app.core.config import settings
+from typing import Callable, Dict, Optional
+import threading
+import time
+
+
+class WarmupState:
+    """
+    Runs the startup warm-up phases in a background thread and records how
+    long each took. The service is ready once every phase has succeeded;
+    a failed phase is retried with exponential backoff, so a transient
+    failure (e.g. no index published yet) doesn't leave it unready forever.
+    """
+
+    def __init__(self):
+        self.phases: Dict[str, dict] = {}
+        self.status = "pending"  # pending -> warming <-> failed (retrying) -> ready
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.attempts = 0
+        self.retry_at: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def _phase(self, name: str, fn: Callable[[], None]):
+        self.phases[name] = {"status": "running"}
+        started = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            self.phases[name] = {
+                "status": "failed",
+                "seconds": round(time.perf_counter() - started, 3),
+                "error": str(e),
+            }
+            raise
+        self.phases[name] = {"status": "done", "seconds": round(time.perf_counter() - started, 3)}
+        print(f"Warm-up: {name} in {self.phases[name]['seconds']}s")
+
+    def run(self):
+        """
+        Runs every phase in order. A failing phase leaves the service unready
+        and is retried (with the phases after it) after a backoff of
+        WARMUP_RETRY_BASE_SECONDS, doubling up to WARMUP_RETRY_MAX_SECONDS;
+        phases that succeeded aren't repeated.
+        """
+        # Imported here: these modules load heavy dependencies on import
+        from app.services import generative, vector_store
+        from app.services.index_registry import index_registry
+
+        def load_index():
+            if settings.VECTOR_DB != "FAISS":
+                vector_store.get_vector_store()
+                return
+            # Loads the served version; raises until ingestion has published one
+            with index_registry.acquire() as bundle:
+                vector_store._faiss_index(bundle)
+
+        def warmup_query():
+            # Bypass the embedding cache so the model itself runs once
+            model = vector_store.get_embedding_model()
+            model = getattr(model, "underlying", model)
+            embedding = model.embed_query(settings.WARMUP_QUERY)
+            with index_registry.acquire() as bundle:
+                vector_store.search_by_vector(embedding, top_k=3, bundle=bundle)
+                if settings.RETRIEVAL_MODE == "HYBRID" and bundle.sparse_index is not None:
+                    bundle.sparse_index.search(settings.WARMUP_QUERY, 3)
+
+        phases = [
+            ("embedding_model", vector_store.get_embedding_model),
+            ("vector_store", load_index),
+        ]
+        if settings.DESCRIPTION_MODE == "STORED_ONLY":
+            # Descriptions come from the store or the template; the LLM is never called
+            self.phases["llm_chain"] = {"status": "skipped"}
+        else:
+            phases.append(("llm_chain", lambda: (generative.get_llm_chain(), generative.get_batch_llm_chain())))
+        phases.append(("warmup_query", warmup_query))
+
+        self.status = "warming"
+        self.started_at = time.time()
+        delay = settings.WARMUP_RETRY_BASE_SECONDS
+        done = 0
+        while done < len(phases):
+            name, fn = phases[done]
+            self.attempts += 1
+            try:
+                self._phase(name, fn)
+            except Exception as e:
+                self.status = "failed"
+                self.retry_at = time.time() + delay
+                print(f"CRITICAL: Warm-up phase {name} failed: {e}; retrying in {delay:.0f}s")
+                time.sleep(delay)
+                delay = min(delay * 2, settings.WARMUP_RETRY_MAX_SECONDS)
+                self.status = "warming"
+                self.retry_at = None
+                continue
+            done += 1
+
+        self.status = "ready"
+        self.finished_at = time.time()
+        print(f"Warm-up complete in {self.finished_at - self.started_at:.1f}s; ready for traffic.")
+
+    def start(self):
+        """Starts the warm-up without blocking application startup."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+            self._thread.start()
+
+    def report(self) -> dict:
+        total = None
+        if self.started_at is not None:
+            total = round((self.finished_at or time.time()) - self.started_at, 3)
+        return {
+            "status": self.status,
+            "seconds": total,
+            "attempts": self.attempts,
+            "retry_in_seconds": round(max(0.0, self.retry_at - time.time()), 1) if self.retry_at else None,
+            "phases": dict(self.phases),
+        }
+
+
+# --- Global Cache ---
+warmup_state = WarmupState()
+# --------------------
@@ -0,0 +1,121 @@
+"""
+Recall / latency benchmark of the FAISS index types supported by ingestion.
+
+Run from the `backend` directory:
+    python -m benchmarks.ann_index --rows 100000 [--types FLAT IVF_FLAT IVF_PQ HNSW] [--json]
+    python -m benchmarks.ann_index --from-index ../notebooks/artifacts/faiss_index
+
+Synthetic catalogs are clustered Gaussian vectors (384 dims, like all-MiniLM-L6-v2).
+`--from-index` benchmarks against the vectors of an existing flat index instead.
+Every index type is compared with an exact flat search: recall@k, single-query
+latency, batch QPS, build time and serialized index size.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+from langchain_community.vectorstores.faiss import dependable_faiss_import
+
+from app.core.config import settings
+from app.services.ann_index import INDEX_TYPES, build_index, index_memory_bytes
+
+
+def synthetic_vectors(rows: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """Clustered, L2-normalised vectors resembling sentence embeddings of a product catalog."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    assignments = rng.integers(0, clusters, rows)
+    vectors = centers[assignments] + 0.6 * rng.standard_normal((rows, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def load_index_vectors(path: str) -> np.ndarray:
+    faiss = dependable_faiss_import()
+    index = faiss.read_index(f"{path}/index.faiss")
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f[f >= 0]) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def benchmark(vectors: np.ndarray, queries: np.ndarray, index_type: str, k: int, truth: np.ndarray) -> dict:
+    faiss = dependable_faiss_import()
+    faiss.omp_set_num_threads(1)  # Per-query latency as seen by one request
+
+    started = time.perf_counter()
+    index = build_index(vectors, index_type)
+    build_seconds = time.perf_counter() - started
+
+    single = []
+    for query in queries[:200]:
+        started = time.perf_counter()
+        index.search(query[None, :], k)
+        single.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    _, found = index.search(queries, k)
+    batch_seconds = time.perf_counter() - started
+
+    return {
+        "index_type": index_type,
+        "rows": len(vectors),
+        f"recall@{k}": round(recall_at_k(found, truth), 4),
+        "latency_ms_p50": round(float(np.percentile(single, 50)), 3),
+        "latency_ms_p99": round(float(np.percentile(single, 99)), 3),
+        "qps": round(len(queries) / batch_seconds, 1),
+        "build_seconds": round(build_seconds, 2),
+        "index_mb": round(index_memory_bytes(index) / 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FAISS index types against exact search.")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    parser.add_argument("--nprobe", type=int, default=settings.FAISS_IVF_NPROBE)
+    parser.add_argument("--ef-search", type=int, default=settings.FAISS_HNSW_EF_SEARCH)
+    parser.add_argument("--from-index", default=None, help="Directory of an existing flat FAISS index.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    args = parser.parse_args()
+
+    settings.FAISS_IVF_NPROBE = args.nprobe
+    settings.FAISS_HNSW_EF_SEARCH = args.ef_search
+
+    if args.from_index:
+        vectors = load_index_vectors(args.from_index)
+    else:
+        vectors = synthetic_vectors(args.rows, args.dim, args.clusters, args.seed)
+
+    # Queries are perturbed catalog vectors, like a prompt close to real products
+    rng = np.random.default_rng(args.seed + 1)
+    picks = rng.integers(0, len(vectors), args.queries)
+    queries = vectors[picks] + 0.3 * rng.standard_normal((args.queries, vectors.shape[1])).astype(np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+
+    exact = build_index(vectors, "FLAT")
+    _, truth = exact.search(queries, args.k)
+
+    results = [benchmark(vectors, queries, index_type, args.k, truth) for index_type in args.types]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    recall_key = f"recall@{args.k}"
+    header = f"{'type':<10}{'rows':>10}{recall_key:>11}{'p50 ms':>9}{'p99 ms':>9}{'QPS':>10}{'build s':>9}{'MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['index_type']:<10}{r['rows']:>10}{r[recall_key]:>11}{r['latency_ms_p50']:>9}"
+              f"{r['latency_ms_p99']:>9}{r['qps']:>10}{r['build_seconds']:>9}{r['index_mb']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Latency / recall of cluster-routed search, and the cost and effect of
+diversified re-ranking.
+
+Run from the `backend` directory:
+    python -m benchmarks.clusters --rows 100000 [--clusters 256] [--probes 1 4 8 16 32] [--json]
+    python -m benchmarks.clusters --from-index ../notebooks/artifacts/faiss_index
+
+Routing: each query searches only the rows of its nearest clusters (through
+`search_faiss_rows`, the API's code path) and is compared with an exact
+search of the whole catalog: recall@k, p50/p99 latency and the share of
+the catalog scanned.
+Diversity: top_k is re-ranked from DIVERSITY_CANDIDATES results by MMR and
+by one-per-cluster; reported are the re-rank latency, the mean pairwise
+cosine similarity inside top_k (lower = fewer near-duplicates), the
+distinct clusters in top_k and the overlap with the undiversified top_k.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+from langchain_community.vectorstores.faiss import dependable_faiss_import
+
+from app.core.config import settings
+from app.services.ann_index import build_index, stored_vectors
+from app.services.clusters import ClusterIndex, cluster_diverse, mmr
+from app.services.vector_store import search_faiss_rows
+from benchmarks.ann_index import load_index_vectors, recall_at_k, synthetic_vectors
+
+
+def percentiles(latencies: list) -> dict:
+    return {
+        "latency_ms_p50": round(float(np.percentile(latencies, 50)), 3),
+        "latency_ms_p99": round(float(np.percentile(latencies, 99)), 3),
+    }
+
+
+def benchmark_routing(index, clusters: ClusterIndex, queries: np.ndarray, k: int,
+                      truth: np.ndarray, probes: int) -> dict:
+    found = np.full((len(queries), k), -1, dtype=np.int64)
+    latencies, scanned = [], []
+    for i, query in enumerate(queries):
+        started = time.perf_counter()
+        if probes:
+            rows = clusters.route(query, probes)
+            hits = search_faiss_rows(index, query, k, rows)
+        else:
+            rows = None
+            hits = search_faiss_rows(index, query, k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        found[i, :len(hits)] = hits
+        scanned.append(index.ntotal if rows is None else len(rows))
+    return {
+        "probes": probes or "all",
+        f"recall@{k}": round(recall_at_k(found, truth), 4),
+        **percentiles(latencies),
+        "scanned_pct": round(100 * float(np.mean(scanned)) / index.ntotal, 2),
+    }
+
+
+def mean_pairwise_cosine(vectors: np.ndarray) -> float:
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    similarity = vectors @ vectors.T
+    n = len(vectors)
+    return float((similarity.sum() - n) / max(n * (n - 1), 1))
+
+
+def benchmark_diversity(index, clusters: ClusterIndex, queries: np.ndarray, k: int,
+                        candidates: int, mode: str) -> dict:
+    latencies, similarity, distinct, overlap = [], [], [], []
+    for query in queries:
+        rows = np.array(search_faiss_rows(index, query, candidates), dtype=np.int64)
+        started = time.perf_counter()
+        if mode == "MMR":
+            picked = mmr(query, stored_vectors(index, rows), k, settings.MMR_LAMBDA)
+        elif mode == "CLUSTER":
+            picked = cluster_diverse(clusters.assignments[rows], k)
+        else:
+            picked = list(range(min(k, len(rows))))
+        latencies.append((time.perf_counter() - started) * 1000)
+
+        chosen = rows[picked]
+        similarity.append(mean_pairwise_cosine(stored_vectors(index, chosen)))
+        distinct.append(len(set(clusters.assignments[chosen].tolist())))
+        overlap.append(len(set(chosen.tolist()) & set(rows[:k].tolist())) / k)
+    return {
+        "diversity": mode,
+        **percentiles(latencies),
+        "mean_pairwise_cos": round(float(np.mean(similarity)), 4),
+        "distinct_clusters": round(float(np.mean(distinct)), 2),
+        f"overlap@{k}": round(float(np.mean(overlap)), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cluster routing and diversified re-ranking.")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=settings.CLUSTER_COUNT)
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--candidates", type=int, default=settings.DIVERSITY_CANDIDATES)
+    parser.add_argument("--mmr-lambda", type=float, default=settings.MMR_LAMBDA)
+    parser.add_argument("--from-index", default=None, help="Directory of an existing flat FAISS index.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    args = parser.parse_args()
+
+    faiss = dependable_faiss_import()
+    faiss.omp_set_num_threads(1)  # Per-query latency as seen by one request
+    settings.MMR_LAMBDA = args.mmr_lambda
+
+    if args.from_index:
+        vectors = load_index_vectors(args.from_index)
+    else:
+        # Tight synthetic clusters, so near-duplicate results actually occur
+        vectors = synthetic_vectors(args.rows, args.dim, max(args.clusters // 2, 1), args.seed)
+
+    rng = np.random.default_rng(args.seed + 1)
+    picks = rng.integers(0, len(vectors), args.queries)
+    queries = vectors[picks] + 0.3 * rng.standard_normal((args.queries, vectors.shape[1])).astype(np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+
+    index = build_index(vectors, "FLAT")
+    _, truth = index.search(queries, args.k)
+
+    started = time.perf_counter()
+    clusters = ClusterIndex.build(index, args.clusters, seed=args.seed)
+    build_seconds = time.perf_counter() - started
+
+    routing = [benchmark_routing(index, clusters, queries, args.k, truth, probes) for probes in [0] + args.probes]
+    diversity = [benchmark_diversity(index, clusters, queries, args.k, args.candidates, mode)
+                 for mode in ("NONE", "MMR", "CLUSTER")]
+
+    if args.json:
+        print(json.dumps({"clusters": len(clusters), "build_seconds": round(build_seconds, 2),
+                          "routing": routing, "diversity": diversity}, indent=2))
+        return
+
+    print(f"{len(clusters)} clusters over {len(vectors)} rows, built in {build_seconds:.1f}s\n")
+    recall_key = f"recall@{args.k}"
+    header = f"{'probes':<8}{recall_key:>10}{'p50 ms':>9}{'p99 ms':>9}{'scanned %':>11}"
+    print(header)
+    print("-" * len(header))
+    for r in routing:
+        print(f"{r['probes']:<8}{r[recall_key]:>10}{r['latency_ms_p50']:>9}{r['latency_ms_p99']:>9}{r['scanned_pct']:>11}")
+
+    overlap_key = f"overlap@{args.k}"
+    header = f"\n{'diversity':<10}{'p50 ms':>9}{'p99 ms':>9}{'pair cos':>10}{'clusters':>10}{overlap_key:>12}"
+    print(header)
+    print("-" * (len(header) - 1))
+    for r in diversity:
+        print(f"{r['diversity']:<10}{r['latency_ms_p50']:>9}{r['latency_ms_p99']:>9}{r['mean_pairwise_cos']:>10}"
+              f"{r['distinct_clusters']:>10}{r[overlap_key]:>12}")
+
+
+if __name__ == "__main__":
+    main()
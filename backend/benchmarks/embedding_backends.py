@@ -0,0 +1,131 @@
+"""
+Per-query latency, memory footprint and parity of the embedding backends.
+
+Run from the `backend` directory after `python -m app.data_ingestion.export_onnx`:
+    python -m benchmarks.embedding_backends [--backends TORCH ONNX ONNX_INT8] [--queries 300] [--threads 1]
+
+Each backend runs in a fresh subprocess, so its peak RSS is that of a worker
+holding only that runtime. Queries are single-text encodes (the /recommend
+path); parity is the cosine agreement of each backend with TORCH on
+catalog texts.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.embedding_backends import cosine_parity, create_embedding_model
+
+QUERIES = [
+    "a cozy reading chair for a small apartment",
+    "modern white desk with drawers",
+    "outdoor patio set that survives rain",
+    "minimalist oak bookshelf",
+    "velvet sofa in dark green",
+    "cheap sturdy bed frame queen size",
+    "standing desk under 300 dollars",
+    "kids bunk bed with storage",
+]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_worker(backend: str, queries: int, threads: int, texts_path: str, vectors_path: str) -> dict:
+    """Runs inside the subprocess: load, time single queries, embed the parity texts."""
+    rss_before = peak_rss_mb()
+    started = time.perf_counter()
+    model = create_embedding_model(backend, threads)
+    model.embed_query("warm-up")
+    load_seconds = time.perf_counter() - started
+
+    latencies = []
+    for i in range(queries):
+        started = time.perf_counter()
+        model.embed_query(QUERIES[i % len(QUERIES)] + f" #{i}")
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    with open(texts_path, encoding="utf-8") as f:
+        texts = json.load(f)
+    np.save(vectors_path, np.asarray(model.embed_documents(texts), dtype=np.float32))
+
+    return {
+        "backend": backend,
+        "load_seconds": round(load_seconds, 2),
+        "latency_ms_p50": round(float(np.percentile(latencies, 50)), 3),
+        "latency_ms_p99": round(float(np.percentile(latencies, 99)), 3),
+        "rss_mb_peak": round(peak_rss_mb(), 1),
+        "rss_mb_model": round(peak_rss_mb() - rss_before, 1),
+    }
+
+
+def load_texts(path: str, count: int) -> list[str]:
+    import pandas as pd
+    from app.data_ingestion.pipeline import clean_chunk, document_texts
+    df = clean_chunk(pd.read_csv(path, nrows=count, dtype=str, keep_default_na=False))
+    return document_texts(df).tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the embedding backends.")
+    parser.add_argument("--backends", nargs="+", default=["TORCH", "ONNX", "ONNX_INT8"],
+                        choices=["TORCH", "ONNX", "ONNX_INT8"])
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--threads", type=int, default=1, help="Intra-op threads per backend (0 = runtime default).")
+    parser.add_argument("--parity-texts", type=int, default=500)
+    parser.add_argument("--data-file", default=settings.DATA_FILE_PATH)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--texts-path", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--vectors-path", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.queries, args.threads, args.texts_path, args.vectors_path)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        texts_path = os.path.join(tmp, "texts.json")
+        with open(texts_path, "w", encoding="utf-8") as f:
+            json.dump(load_texts(args.data_file, args.parity_texts), f)
+
+        results, vectors = [], {}
+        for backend in args.backends:
+            vectors_path = os.path.join(tmp, f"{backend}.npy")
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.embedding_backends", "--worker", backend,
+                 "--queries", str(args.queries), "--threads", str(args.threads),
+                 "--texts-path", texts_path, "--vectors-path", vectors_path],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+            vectors[backend] = np.load(vectors_path)
+
+    for result in results:
+        if "TORCH" in vectors:
+            result.update(cosine_parity(vectors["TORCH"], vectors[result["backend"]]))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    header = f"{'backend':<11}{'load s':>8}{'p50 ms':>9}{'p99 ms':>9}{'RSS MB':>9}{'model MB':>10}{'min cos':>10}{'mean cos':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['backend']:<11}{r['load_seconds']:>8}{r['latency_ms_p50']:>9}{r['latency_ms_p99']:>9}"
+              f"{r['rss_mb_peak']:>9}{r['rss_mb_model']:>10}{r.get('min_cosine', '-'):>10}{r.get('mean_cosine', '-'):>10}")
+
+
+if __name__ == "__main__":
+    main()
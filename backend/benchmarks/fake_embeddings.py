@@ -0,0 +1,51 @@
+from langchain_core.embeddings import Embeddings
+from typing import Dict, List
+import numpy as np
+import time
+import zlib
+import re
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    A local stand-in for the sentence-transformer used by the benchmarks.
+
+    Each token maps to a fixed pseudo-random vector (seeded by its CRC32)
+    and a text embeds to the normalised sum of its tokens, so texts that
+    share words land close together and searches return plausible
+    neighbours. Latency is modelled as a fixed per-call overhead plus a
+    per-text cost, like a batched model.
+    """
+
+    def __init__(self, dim: int = 384, call_latency_ms: float = 0.0, per_text_ms: float = 0.0):
+        self.dim = dim
+        self.call_latency_ms = call_latency_ms
+        self.per_text_ms = per_text_ms
+        self._tokens: Dict[str, np.ndarray] = {}
+        self.calls = 0
+        self.texts = 0
+
+    def _token(self, token: str) -> np.ndarray:
+        vector = self._tokens.get(token)
+        if vector is None:
+            rng = np.random.default_rng(zlib.crc32(token.encode("utf-8")))
+            vector = self._tokens[token] = rng.standard_normal(self.dim).astype(np.float32)
+        return vector
+
+    def _embed(self, text: str) -> List[float]:
+        tokens = _TOKEN_PATTERN.findall(text.lower())
+        vector = np.sum([self._token(token) for token in tokens], axis=0) if tokens else np.ones(self.dim, dtype=np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        self.texts += len(texts)
+        delay = self.call_latency_ms + self.per_text_ms * len(texts)
+        if delay:
+            time.sleep(delay / 1000)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
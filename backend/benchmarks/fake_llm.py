@@ -0,0 +1,114 @@
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import Field
+from typing import Any, AsyncIterator, List, Optional, Tuple
+import asyncio
+import random
+import json
+import re
+import time
+
+_UNIQ_ID_PATTERN = re.compile(r'"uniq_id":\s*"([^"]+)"')
+
+SAMPLE_DESCRIPTION = (
+    "Meet the piece your living room didn't know it was missing. "
+    "Sturdy enough for daily life, stylish enough to steal the show, "
+    "and comfy enough that you'll forget your other furniture exists."
+)
+
+
+def approx_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough to compare prompt shapes offline."""
+    return max(1, len(text) // 4)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    A local stand-in for ChatOpenAI used by the benchmarks.
+
+    Latency is modelled as a fixed per-call overhead plus a per-output-token
+    decode cost. Prompts that ask for a JSON object keyed by uniq_id (the
+    batched generation prompt) receive a valid JSON reply for every uniq_id
+    found in the prompt; every other prompt receives a plain description.
+
+    Faults can be injected to exercise the resilience code: a `slow_rate`
+    share of calls take `slow_ms` longer (a latency tail), and an
+    `error_rate` share fail with ConnectionError after the call latency
+    (like a 5xx from the provider). Faults are drawn from a seeded RNG.
+    """
+
+    call_latency_ms: float = 250.0
+    per_token_ms: float = 2.0
+    error_rate: float = 0.0
+    slow_rate: float = 0.0
+    slow_ms: float = 0.0
+    rng: Any = Field(default_factory=lambda: random.Random(0))
+    stats: dict = Field(default_factory=lambda: {
+        "calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "faults": 0, "slow_calls": 0
+    })
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-furniture-chat"
+
+    def _respond(self, messages: List[BaseMessage]) -> str:
+        prompt = "\n".join(str(message.content) for message in messages)
+        uniq_ids = _UNIQ_ID_PATTERN.findall(prompt)
+        if uniq_ids and "JSON object" in prompt:
+            reply = json.dumps({uniq_id: SAMPLE_DESCRIPTION for uniq_id in uniq_ids})
+        else:
+            reply = SAMPLE_DESCRIPTION
+
+        self.stats["calls"] += 1
+        self.stats["prompt_tokens"] += approx_tokens(prompt)
+        self.stats["completion_tokens"] += approx_tokens(reply)
+        return reply
+
+    def _delay_seconds(self, reply: str) -> float:
+        return (self.call_latency_ms + self.per_token_ms * approx_tokens(reply)) / 1000
+
+    def _draw_faults(self) -> Tuple[float, bool]:
+        """Extra latency in seconds for this call, and whether it fails."""
+        extra = 0.0
+        if self.slow_rate and self.rng.random() < self.slow_rate:
+            self.stats["slow_calls"] += 1
+            extra = self.slow_ms / 1000
+        failed = bool(self.error_rate) and self.rng.random() < self.error_rate
+        if failed:
+            self.stats["faults"] += 1
+        return extra, failed
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        reply = self._respond(messages)
+        extra, failed = self._draw_faults()
+        time.sleep(self._delay_seconds(reply) + extra)
+        if failed:
+            raise ConnectionError("Injected fault from the fake chat model")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        reply = self._respond(messages)
+        extra, failed = self._draw_faults()
+        await asyncio.sleep(self._delay_seconds(reply) + extra)
+        if failed:
+            raise ConnectionError("Injected fault from the fake chat model")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply))])
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        reply = self._respond(messages)
+        words = reply.split(" ")
+        extra, failed = self._draw_faults()
+        await asyncio.sleep(self.call_latency_ms / 1000 + extra)
+        if failed:
+            raise ConnectionError("Injected fault from the fake chat model")
+        for i, word in enumerate(words):
+            await asyncio.sleep(self.per_token_ms * approx_tokens(word + " ") / 1000)
+            content = word if i == len(words) - 1 else word + " "
+            yield ChatGenerationChunk(message=AIMessageChunk(content=content))
+
+    def reset_stats(self):
+        self.stats.update(calls=0, prompt_tokens=0, completion_tokens=0, faults=0, slow_calls=0)
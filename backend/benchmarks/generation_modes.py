@@ -0,0 +1,107 @@
+"""
+Compares PER_PRODUCT and BATCHED description generation against a local fake chat model.
+
+Run from the `backend` directory (no network or API key needed):
+    python -m benchmarks.generation_modes [--top-k 3 5 10] [--rounds 20] [--latency-ms 250]
+
+Reports LLM calls, approximate prompt/completion tokens and end-to-end
+latency of `generative.describe_products` per mode.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import pandas as pd
+
+from app.core.config import settings
+from app.models.schemas import Product
+from app.services import generative
+from app.services.description_store import DescriptionStore
+from benchmarks.fake_llm import FakeChatModel
+
+
+def load_products(path: str, count: int) -> list[Product]:
+    df = pd.read_csv(path).fillna("").astype(str)
+    rows = df.to_dict(orient="records")
+    products = []
+    # Repeat the sample catalog with fresh ids if it is smaller than `count`
+    for i in range(count):
+        row = rows[i % len(rows)]
+        products.append(Product(
+            uniq_id=f"{row['uniq_id']}-{i}",
+            title=row["title"],
+            brand=row["brand"],
+            description=row["description"],
+            material=row["material"],
+            color=row["color"],
+        ))
+    return products
+
+
+async def run_mode(mode: str, fake: FakeChatModel, products: list[Product], top_k: int, rounds: int) -> dict:
+    settings.GENERATION_MODE = mode
+    fake.reset_stats()
+    latencies = []
+    for r in range(rounds):
+        # A fresh store per round so every call misses and reaches the model
+        with tempfile.TemporaryDirectory() as tmp:
+            generative.description_store = DescriptionStore(os.path.join(tmp, "descriptions.sqlite"))
+            batch = products[r * top_k:(r + 1) * top_k]
+            started = time.perf_counter()
+            await generative.describe_products(batch)
+            latencies.append((time.perf_counter() - started) * 1000)
+            generative.description_store.close()
+
+    return {
+        "mode": mode,
+        "top_k": top_k,
+        "rounds": rounds,
+        "llm_calls": fake.stats["calls"],
+        "prompt_tokens": fake.stats["prompt_tokens"],
+        "completion_tokens": fake.stats["completion_tokens"],
+        "latency_ms_mean": round(statistics.mean(latencies), 1),
+        "latency_ms_max": round(max(latencies), 1),
+    }
+
+
+async def main_async(args) -> list[dict]:
+    fake = FakeChatModel(call_latency_ms=args.latency_ms, per_token_ms=args.per_token_ms)
+    generative.use_llm(fake)
+
+    products = load_products(args.data_file, max(args.top_k) * args.rounds)
+    results = []
+    for top_k in args.top_k:
+        for mode in ("PER_PRODUCT", "BATCHED"):
+            results.append(await run_mode(mode, fake, products, top_k, args.rounds))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare description generation modes offline.")
+    parser.add_argument("--top-k", type=int, nargs="+", default=[3, 5, 10])
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=250.0, help="Fixed per-call overhead of the fake model.")
+    parser.add_argument("--per-token-ms", type=float, default=2.0, help="Decode cost per completion token.")
+    parser.add_argument("--data-file", default=settings.DATA_FILE_PATH)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    header = f"{'mode':<12}{'top_k':>6}{'calls':>8}{'prompt tok':>12}{'compl tok':>11}{'mean ms':>10}{'max ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['mode']:<12}{r['top_k']:>6}{r['llm_calls']:>8}{r['prompt_tokens']:>12}"
+              f"{r['completion_tokens']:>11}{r['latency_ms_mean']:>10}{r['latency_ms_max']:>10}")
+
+
+if __name__ == "__main__":
+    main()
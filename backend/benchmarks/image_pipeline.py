@@ -0,0 +1,189 @@
+"""
+Throughput of the visual-similarity ingest stage, in images per second.
+
+Run from the `backend` directory:
+    python -m benchmarks.image_pipeline [--images 2000] [--concurrency 1 8 32] [--latency-ms 20]
+                                        [--models MOBILENET_V3_SMALL RESNET18] [--batch-sizes 1 64] [--json]
+
+Everything runs offline. Synthetic product images (benchmarks.synthetic_images)
+are written to a temporary directory, which is served two ways:
+- "http": a local HTTP server that waits --latency-ms before every
+  response, standing in for the CDN (needs httpx);
+- "local": read by file name through IMAGE_SOURCE_DIR-style fetching.
+Fetching is timed cold at each --concurrency into a fresh content-addressed
+store, then warm (every URL already in the store). Embedding is timed per
+backbone and batch size on the fetched images, decoding included, and the
+pipelined stage (fetch the next batch while embedding this one) end to end.
+"""
+import argparse
+import ast
+import asyncio
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from app.data_ingestion.pipeline import embed_product_images
+from app.services.image_embeddings import ImageEmbedder
+from app.services.image_fetcher import ImageFetcher, ImageStore
+from benchmarks.synthetic_catalog import brand_names, generate_chunk
+from benchmarks.synthetic_images import image_name, write_images
+
+MAX_BYTES = 10 * 1024 * 1024
+
+
+class SlowHandler(SimpleHTTPRequestHandler):
+    latency_ms = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency_ms / 1000)
+        super().do_GET()
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(directory: str, latency_ms: float) -> ThreadingHTTPServer:
+    class Handler(SlowHandler):
+        pass
+    Handler.latency_ms = latency_ms
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(Handler, directory=directory))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def time_fetch(urls: list, store_dir: str, concurrency: int, source_dir=None) -> dict:
+    """Cold fetch into a fresh store, then the same URLs again (all cache hits)."""
+    store = ImageStore(store_dir)
+    fetcher = ImageFetcher(store, concurrency, timeout_seconds=30, max_bytes=MAX_BYTES, source_dir=source_dir)
+    started = time.perf_counter()
+    asyncio.run(fetcher.fetch_many(urls))
+    cold = time.perf_counter() - started
+    started = time.perf_counter()
+    asyncio.run(fetcher.fetch_many(urls))
+    warm = time.perf_counter() - started
+    store.close()
+    return {
+        "cold_images_per_second": round(len(urls) / cold, 1),
+        "warm_images_per_second": round(len(urls) / warm, 1),
+        "failed": fetcher.failed,
+    }
+
+
+def time_embed(model: str, batch_size: int, blobs: list, threads: int, decode_workers: int) -> dict:
+    embedder = ImageEmbedder(model, num_threads=threads, batch_size=batch_size, decode_workers=decode_workers)
+    embedder.embed(blobs[:batch_size])  # Warm-up
+    started = time.perf_counter()
+    vectors, kept = embedder.embed(blobs)
+    elapsed = time.perf_counter() - started
+    started = time.perf_counter()
+    for blob in blobs:
+        embedder.preprocess(blob)
+    decode = time.perf_counter() - started
+    embedder.close()
+    return {
+        "model": model,
+        "batch_size": batch_size,
+        "dim": int(vectors.shape[1]),
+        "images_per_second": round(len(kept) / elapsed, 1),
+        "decode_images_per_second_1_thread": round(len(blobs) / decode, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark image fetching and embedding throughput.")
+    parser.add_argument("--images", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Per-request latency of the stand-in CDN.")
+    parser.add_argument("--models", nargs="+", default=["MOBILENET_V3_SMALL", "RESNET18"],
+                        choices=["MOBILENET_V3_SMALL", "RESNET18"])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 64])
+    parser.add_argument("--threads", type=int, default=0, help="Torch intra-op threads (0 = default).")
+    parser.add_argument("--decode-workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    args = parser.parse_args()
+
+    catalog = generate_chunk(0, args.images * 2, args.seed, brand_names(100, args.seed))
+    catalog = catalog[catalog["images"] != "[]"].head(args.images)
+    results = {"fetch": [], "embed": []}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cdn = os.path.join(tmp, "cdn")
+        print(f"Writing {write_images(catalog, cdn)} synthetic images...")
+        local_urls = [ast.literal_eval(images)[0] for images in catalog["images"]]
+
+        modes = []
+        try:
+            import httpx  # noqa: F401
+            modes.append("http")
+        except ImportError:
+            print("httpx isn't installed; skipping the HTTP fetch runs.")
+        modes.append("local")
+
+        server = serve(cdn, args.latency_ms) if "http" in modes else None
+        try:
+            for mode in modes:
+                for concurrency in args.concurrency:
+                    if mode == "http":
+                        port = server.server_address[1]
+                        urls = [f"http://127.0.0.1:{port}/{image_name(url)}" for url in local_urls]
+                        source_dir = None
+                    else:
+                        urls, source_dir = local_urls, cdn
+                    store_dir = os.path.join(tmp, f"store-{mode}-{concurrency}")
+                    result = time_fetch(urls, store_dir, concurrency, source_dir)
+                    results["fetch"].append({"source": mode, "concurrency": concurrency, **result})
+        finally:
+            if server is not None:
+                server.shutdown()
+
+        store = ImageStore(os.path.join(tmp, f"store-local-{args.concurrency[-1]}"))
+        blobs = [store.read(digest) for digest in store.lookup(local_urls).values()]
+        for model in args.models:
+            for batch_size in args.batch_sizes:
+                results["embed"].append(time_embed(model, batch_size, blobs, args.threads, args.decode_workers))
+
+        # End to end: cold local fetch pipelined with embedding of the first model
+        embedder = ImageEmbedder(args.models[0], num_threads=args.threads,
+                                 batch_size=max(args.batch_sizes), decode_workers=args.decode_workers)
+        fetcher = ImageFetcher(ImageStore(os.path.join(tmp, "store-pipeline")), max(args.concurrency),
+                               timeout_seconds=30, max_bytes=MAX_BYTES, source_dir=cdn)
+        started = time.perf_counter()
+        rows, _ = asyncio.run(embed_product_images(local_urls, fetcher, embedder, None, 256))
+        results["pipeline"] = {
+            "model": args.models[0],
+            "images_per_second": round(len(rows) / (time.perf_counter() - started), 1),
+        }
+        embedder.close()
+        fetcher.store.close()
+        store.close()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"\n{args.images} images, stand-in CDN latency {args.latency_ms:g} ms\n")
+    header = f"{'fetch from':<12}{'concurrency':>12}{'cold img/s':>12}{'warm img/s':>12}{'failed':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in results["fetch"]:
+        print(f"{r['source']:<12}{r['concurrency']:>12}{r['cold_images_per_second']:>12}"
+              f"{r['warm_images_per_second']:>12}{r['failed']:>8}")
+
+    header = f"\n{'backbone':<20}{'batch':>7}{'dim':>6}{'img/s':>9}{'decode img/s (1 thread)':>25}"
+    print(header)
+    print("-" * (len(header) - 1))
+    for r in results["embed"]:
+        print(f"{r['model']:<20}{r['batch_size']:>7}{r['dim']:>6}{r['images_per_second']:>9}"
+              f"{r['decode_images_per_second_1_thread']:>25}")
+    print(f"\nPipelined fetch + embed ({results['pipeline']['model']}): "
+          f"{results['pipeline']['images_per_second']} img/s")
+
+
+if __name__ == "__main__":
+    main()
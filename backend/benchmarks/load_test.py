@@ -0,0 +1,343 @@
+"""
+Offline load test of ingestion and the API on synthetic catalogs.
+
+Run from the `backend` directory (no network, model download or API key needed;
+requires httpx):
+    python -m benchmarks.load_test [--rows 10000 100000 1000000] [--concurrency 16] [--requests 500]
+                                   [--endpoints recommend recommend_batch analytics products similar] [--output results.json]
+
+For each catalog size a fresh subprocess:
+  1. ingests a synthetic catalog (benchmarks.synthetic_catalog) with a fake
+     embedder (benchmarks.fake_embeddings), reporting rows/s and peak RSS;
+  2. starts the FastAPI app in-process, with the LLM swapped for the fake
+     chat model (benchmarks.fake_llm), and drives each endpoint with
+     `--concurrency` concurrent clients through httpx's ASGI transport;
+  3. reports throughput, p50/p95/p99 latency, errors and RSS per endpoint,
+     plus the mean time of every pipeline stage (see /stats "stages").
+
+Everything is seeded, so two runs of the same command are comparable; the
+results are written as one JSON document. Clients and server share the
+event loop, so absolute numbers include client overhead: compare runs,
+not against a production deployment. Large catalogs are slow to build
+exact neighbour tables for; use e.g. `--index-type IVF_FLAT --similar-neighbors 0`
+at 1M rows.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.synthetic_catalog import ADJECTIVES, COLORS, ITEMS, ROOMS, write_catalog
+
+ENDPOINTS = ("recommend", "recommend_stream", "recommend_batch", "analytics", "products", "similar")
+
+
+def current_rss_mb() -> float:
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except FileNotFoundError:
+        pass
+    return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def latency_summary(latencies: list) -> dict:
+    if not latencies:
+        return {"latency_ms_p50": None, "latency_ms_p95": None, "latency_ms_p99": None}
+    return {
+        "latency_ms_p50": round(float(np.percentile(latencies, 50)), 2),
+        "latency_ms_p95": round(float(np.percentile(latencies, 95)), 2),
+        "latency_ms_p99": round(float(np.percentile(latencies, 99)), 2),
+    }
+
+
+def make_prompts(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    items = [item for group in ITEMS.values() for item in group]
+    return [
+        f"{rng.choice(ADJECTIVES).lower()} {rng.choice(items).lower()} in {rng.choice(COLORS).lower()} "
+        f"for my {rng.choice(ROOMS)}"
+        for _ in range(count)
+    ]
+
+
+# --- Worker: runs inside the per-catalog subprocess ---
+
+def configure_environment(args, workdir: str):
+    """Points every artifact at the work directory; must run before any `app` import."""
+    os.environ.update({
+        "VECTOR_DB": "FAISS",
+        "DATA_FILE_PATH": args.data_file,
+        "LOCAL_FAISS_INDEX_PATH": os.path.join(workdir, "faiss_index"),
+        "INGEST_STATE_PATH": os.path.join(workdir, "ingest_state.sqlite"),
+        "DESCRIPTION_STORE_PATH": os.path.join(workdir, "descriptions.sqlite"),
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embedding_cache"),
+        "EMBEDDING_CACHE_ENABLED": str(args.embedding_cache).lower(),
+        "RESPONSE_CACHE_ENABLED": str(args.response_cache).lower(),
+        "FAISS_INDEX_TYPE": args.index_type,
+        "GENERATION_MODE": args.generation_mode,
+        # The fake embedder lives in this process, so ingestion embeds in-process
+        "INGEST_EMBED_WORKERS": "0",
+        "WARMUP_ON_STARTUP": "false",
+        "INDEX_RELOAD_POLL_SECONDS": "0",
+        "PROFILING_ENABLED": "false",
+    })
+    if args.similar_neighbors is not None:
+        os.environ["SIMILAR_NEIGHBORS"] = str(args.similar_neighbors)
+
+
+def run_ingestion(args, embeddings) -> dict:
+    from app.services import vector_store
+    from app.data_ingestion import ingest
+
+    vector_store._embeddings = embeddings
+    argv, sys.argv = sys.argv, ["ingest", "--data-file", args.data_file, "--full"]
+    started = time.perf_counter()
+    try:
+        ingest.main()
+    finally:
+        sys.argv = argv
+    seconds = time.perf_counter() - started
+    return {
+        "rows": args.worker_rows,
+        "seconds": round(seconds, 2),
+        "rows_per_second": round(args.worker_rows / seconds, 1),
+        "embedder_texts": embeddings.texts,
+        "rss_mb_peak": round(peak_rss_mb(), 1),
+    }
+
+
+def scenarios(args) -> dict:
+    import pandas as pd
+
+    sample = pd.read_csv(args.data_file, nrows=5000, dtype=str, keep_default_na=False)
+    uniq_ids = sample["uniq_id"].tolist()
+    brands = sample["brand"].value_counts().index[:50].tolist()
+    prompts = make_prompts(args.distinct_prompts, args.seed)
+
+    async def recommend(client, rng):
+        return await client.post("/recommend", json={"prompt": rng.choice(prompts), "top_k": args.top_k})
+
+    async def recommend_stream(client, rng):
+        async with client.stream("POST", "/recommend/stream",
+                                 json={"prompt": rng.choice(prompts), "top_k": args.top_k}) as response:
+            async for _ in response.aiter_bytes():
+                pass
+            return response
+
+    async def recommend_batch(client, rng):
+        batch = [{"prompt": rng.choice(prompts), "top_k": args.top_k} for _ in range(args.batch_size)]
+        return await client.post("/recommend/batch", json={"requests": batch})
+
+    async def analytics(client, rng):
+        return await client.get("/analytics-data")
+
+    async def products(client, rng):
+        params = {"limit": 50}
+        if rng.random() < 0.5:
+            params["brand"] = rng.choice(brands)
+        return await client.get("/products", params=params)
+
+    async def similar(client, rng):
+        return await client.get(f"/products/{rng.choice(uniq_ids)}/similar", params={"top_k": args.top_k})
+
+    return {"recommend": recommend, "recommend_stream": recommend_stream, "recommend_batch": recommend_batch,
+            "analytics": analytics,
+            "products": products, "similar": similar}
+
+
+async def drive(client, name: str, request_fn, args) -> dict:
+    """Sends `args.requests` requests from `args.concurrency` concurrent clients."""
+    warmup_rng = random.Random(args.seed)
+    for _ in range(args.warmup):
+        await request_fn(client, warmup_rng)
+
+    latencies, statuses = [], collections.Counter()
+    remaining = args.requests
+
+    async def client_loop(seed: int):
+        nonlocal remaining
+        rng = random.Random(seed)
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                response = await request_fn(client, rng)
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[str(response.status_code)] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop(args.seed * 1000 + i) for i in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "endpoint": name,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "throughput_rps": round(args.requests / elapsed, 1),
+        **latency_summary(latencies),
+        "errors": sum(count for status, count in statuses.items() if status != "200"),
+        "statuses": dict(statuses),
+        "rss_mb": round(current_rss_mb(), 1),
+        "rss_mb_peak": round(peak_rss_mb(), 1),
+    }
+
+
+async def run_endpoints(args) -> list:
+    import httpx
+    from app.main import app
+    from app.services import generative
+    from benchmarks.fake_llm import FakeChatModel
+
+    generative.use_llm(FakeChatModel(call_latency_ms=args.llm_latency_ms, per_token_ms=args.llm_per_token_ms))
+    request_fns = scenarios(args)
+    results = []
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+            for name in args.endpoints:
+                results.append(await drive(client, name, request_fns[name], args))
+    return results
+
+
+def run_worker(args) -> dict:
+    with tempfile.TemporaryDirectory(dir=args.workdir) as workdir:
+        configure_environment(args, workdir)
+        from benchmarks.fake_embeddings import FakeEmbeddings
+        embeddings = FakeEmbeddings(call_latency_ms=args.embed_latency_ms, per_text_ms=args.embed_per_text_ms)
+
+        result = {"rows": args.worker_rows, "ingestion": run_ingestion(args, embeddings)}
+        result["endpoints"] = asyncio.run(run_endpoints(args))
+
+        from app.services.instrumentation import stage_seconds
+        result["stages"] = stage_seconds.summary()
+        return result
+
+
+# --- Parent: one subprocess per catalog size ---
+
+def worker_command(args, rows: int, data_file: str) -> list:
+    command = [sys.executable, "-m", "benchmarks.load_test", "--worker-rows", str(rows), "--data-file", data_file]
+    for flag in ("concurrency", "requests", "warmup", "top_k", "distinct_prompts", "batch_size", "seed", "index_type",
+                 "generation_mode", "llm_latency_ms", "llm_per_token_ms", "embed_latency_ms",
+                 "embed_per_text_ms", "similar_neighbors", "workdir"):
+        value = getattr(args, flag)
+        if value is not None:
+            command += [f"--{flag.replace('_', '-')}", str(value)]
+    command += ["--endpoints", *args.endpoints]
+    if args.response_cache:
+        command.append("--response-cache")
+    if args.embedding_cache:
+        command.append("--embedding-cache")
+    return command
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def print_table(runs: list):
+    header = (f"{'rows':>9} {'endpoint':<17}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+              f"{'errors':>8}{'RSS MB':>9}")
+    print(header)
+    print("-" * len(header))
+    for run in runs:
+        ingestion = run["ingestion"]
+        print(f"{run['rows']:>9} {'ingestion':<17}{ingestion['rows_per_second']:>9}{'':>27}{'':>8}"
+              f"{ingestion['rss_mb_peak']:>9}")
+        for r in run["endpoints"]:
+            print(f"{run['rows']:>9} {r['endpoint']:<17}{r['throughput_rps']:>9}{r['latency_ms_p50']:>9}"
+                  f"{r['latency_ms_p95']:>9}{r['latency_ms_p99']:>9}{r['errors']:>8}{r['rss_mb']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test of ingestion and the API.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--endpoints", nargs="+", default=["recommend", "analytics", "products", "similar"],
+                        choices=ENDPOINTS)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500, help="Requests per endpoint.")
+    parser.add_argument("--warmup", type=int, default=10, help="Sequential requests per endpoint before timing.")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--distinct-prompts", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=16, help="Prompts per /recommend/batch request.")
+    parser.add_argument("--index-type", default="FLAT", choices=["FLAT", "IVF_FLAT", "IVF_PQ", "HNSW"])
+    parser.add_argument("--generation-mode", default="PER_PRODUCT", choices=["PER_PRODUCT", "BATCHED"])
+    parser.add_argument("--similar-neighbors", type=int, default=None,
+                        help="Neighbour table width built at ingestion (default: SIMILAR_NEIGHBORS).")
+    parser.add_argument("--llm-latency-ms", type=float, default=250.0)
+    parser.add_argument("--llm-per-token-ms", type=float, default=2.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=5.0, help="Fake embedder per-call overhead.")
+    parser.add_argument("--embed-per-text-ms", type=float, default=0.5, help="Fake embedder per-text cost.")
+    parser.add_argument("--response-cache", action="store_true", help="Keep the semantic response cache on.")
+    parser.add_argument("--embedding-cache", action="store_true", help="Keep the persistent embedding cache on.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=None, help="Where catalogs and indexes are built (default: temp).")
+    parser.add_argument("--keep-catalogs", action="store_true", help="Reuse generated catalogs across runs.")
+    parser.add_argument("--output", default=None, help="Write the JSON results here.")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    parser.add_argument("--worker-rows", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--data-file", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker_rows is not None:
+        print(json.dumps(run_worker(args)))
+        return
+
+    catalog_dir = args.workdir or tempfile.mkdtemp(prefix="furnifindr-load-")
+    runs = []
+    for rows in args.rows:
+        data_file = os.path.join(catalog_dir, f"catalog_{rows}_{args.seed}.csv")
+        if not (args.keep_catalogs and os.path.exists(data_file)):
+            print(f"Generating a {rows}-row catalog...", file=sys.stderr)
+            write_catalog(data_file, rows, args.seed)
+        print(f"Running the load test on {rows} rows...", file=sys.stderr)
+        output = subprocess.run(worker_command(args, rows, data_file), check=True,
+                                capture_output=True, text=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+        if not args.keep_catalogs:
+            os.remove(data_file)
+
+    if args.workdir is None and not args.keep_catalogs:
+        os.rmdir(catalog_dir)
+
+    results = {
+        "commit": git_commit(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {key: value for key, value in vars(args).items()
+                   if key not in ("worker_rows", "data_file", "output", "json")},
+        "runs": runs,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Tail latency and degradation of the describe stage under injected LLM faults.
+
+Run from the `backend` directory (no network or API key needed):
+    python -m benchmarks.resilience [--rounds 200] [--top-k 5] [--budget-ms 3000] [--json]
+
+Each scenario configures the fake chat model's faults (a slow tail, random
+errors, a full outage) and runs `generative.describe_products` for
+`--rounds` requests of fresh products, once unprotected (no budget, no
+hedging, no circuit breaker) and once with the resilience settings.
+Reported are p50/p99 latency, the share of final (non-template)
+descriptions, LLM calls, hedges and calls skipped by the breaker.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.core.config import settings
+from app.services import generative
+from app.services.description_store import DescriptionStore
+from app.services.resilience import CircuitBreaker, Hedger
+from benchmarks.fake_llm import FakeChatModel
+from benchmarks.generation_modes import load_products
+
+SCENARIOS = {
+    "healthy": {},
+    "slow_tail": {"slow_rate": 0.05, "slow_ms": 5000.0},
+    "flaky": {"error_rate": 0.2},
+    "outage": {"error_rate": 1.0},
+}
+
+
+def configure(protected: bool):
+    """Fresh breaker and hedger for a run; unprotected runs never hedge, retry or trip."""
+    generative.llm_breaker = CircuitBreaker(
+        "llm",
+        window=settings.LLM_BREAKER_WINDOW,
+        min_calls=settings.LLM_BREAKER_MIN_CALLS if protected else 2 ** 31,
+        error_rate=settings.LLM_BREAKER_ERROR_RATE,
+        cooldown_seconds=settings.LLM_BREAKER_COOLDOWN_SECONDS,
+        half_open_probes=settings.LLM_BREAKER_HALF_OPEN_PROBES,
+    )
+    generative.llm_hedger = Hedger(
+        max_attempts=settings.LLM_MAX_ATTEMPTS if protected else 1,
+        quantile=settings.LLM_HEDGE_QUANTILE,
+        min_delay_ms=settings.LLM_HEDGE_MIN_DELAY_MS,
+        timeout_seconds=settings.LLM_CALL_TIMEOUT_SECONDS,
+    )
+
+
+async def run_scenario(name: str, faults: dict, protected: bool, fake: FakeChatModel,
+                       products: list, args) -> dict:
+    for field in ("error_rate", "slow_rate", "slow_ms"):
+        setattr(fake, field, faults.get(field, 0.0))
+    fake.reset_stats()
+    configure(protected)
+    budget = args.budget_ms / 1000 if protected else None
+
+    latencies, final = [], 0
+    with tempfile.TemporaryDirectory() as tmp:
+        generative.description_store = DescriptionStore(os.path.join(tmp, "descriptions.sqlite"))
+        for r in range(args.rounds):
+            batch = products[r * args.top_k:(r + 1) * args.top_k]
+            started = time.perf_counter()
+            descriptions, _ = await generative.describe_products(batch, budget)
+            latencies.append((time.perf_counter() - started) * 1000)
+            final += sum(description != generative.template_description(p) for p, description in zip(batch, descriptions))
+        # Generations cut off by the budget finish in the background
+        while generative.llm_singleflight.stats()["in_flight"]:
+            await asyncio.sleep(0.05)
+        generative.description_store.close()
+
+    breaker, hedger = generative.llm_breaker.stats(), generative.llm_hedger.stats()
+    return {
+        "scenario": name,
+        "protected": protected,
+        "latency_ms_p50": round(float(np.percentile(latencies, 50)), 1),
+        "latency_ms_p99": round(float(np.percentile(latencies, 99)), 1),
+        "latency_ms_max": round(max(latencies), 1),
+        "final_pct": round(100 * final / (args.rounds * args.top_k), 1),
+        "llm_calls": fake.stats["calls"],
+        "hedges": hedger["hedges"],
+        "retries": hedger["retries"],
+        "breaker_opened": breaker["opened"],
+        "breaker_rejected": breaker["rejected"],
+    }
+
+
+async def main_async(args) -> list[dict]:
+    settings.GENERATION_MODE = "PER_PRODUCT"
+    fake = FakeChatModel(call_latency_ms=args.latency_ms, per_token_ms=args.per_token_ms)
+    generative.use_llm(fake)
+    # Fresh ids for every run, so each request misses the description store
+    runs = [(name, protected) for name in args.scenarios for protected in (False, True)]
+    products = load_products(args.data_file, args.rounds * args.top_k * len(runs))
+    per_run = args.rounds * args.top_k
+
+    results = []
+    for i, (name, protected) in enumerate(runs):
+        results.append(await run_scenario(
+            name, SCENARIOS[name], protected, fake, products[i * per_run:(i + 1) * per_run], args
+        ))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the describe stage under injected LLM faults.")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=settings.GENERATION_BUDGET_MS)
+    parser.add_argument("--latency-ms", type=float, default=250.0, help="Fixed per-call overhead of the fake model.")
+    parser.add_argument("--per-token-ms", type=float, default=2.0, help="Decode cost per completion token.")
+    parser.add_argument("--data-file", default=settings.DATA_FILE_PATH)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    header = (f"{'scenario':<11}{'protected':>10}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+              f"{'final %':>9}{'calls':>7}{'hedges':>8}{'retries':>9}{'skipped':>9}")
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['scenario']:<11}{str(r['protected']):>10}{r['latency_ms_p50']:>9}{r['latency_ms_p99']:>9}"
+              f"{r['latency_ms_max']:>9}{r['final_pct']:>9}{r['llm_calls']:>7}{r['hedges']:>8}"
+              f"{r['retries']:>9}{r['breaker_rejected']:>9}")
+
+
+if __name__ == "__main__":
+    main()
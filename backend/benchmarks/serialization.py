@@ -0,0 +1,103 @@
+"""
+Per-product cost of the response path: reading products and serialising them.
+
+Run from the `backend` directory:
+    python -m benchmarks.serialization [--rows 20000] [--top-k 10] [--rounds 2000] [--json]
+
+On a synthetic catalog (benchmarks.synthetic_catalog) it times, in
+microseconds per product:
+- catalog reads: validating the stored JSON (before) vs constructing the
+  product from it unvalidated and keeping it as the product's record
+  (after, ProductIndex.product);
+- response encoding: pydantic's model_dump_json of a
+  RecommendationResponse (before) vs splicing the products' stored records
+  (after, app/services/serialization.py); both must give the same bytes;
+- Pinecone metadata: stringified lists parsed with literal_eval (before)
+  vs native lists (after), through `_parse_metadata_to_product`.
+"""
+import argparse
+import ast
+import json
+import time
+
+import numpy as np
+
+from app.models.schemas import Product, RecommendationResponse
+from app.services.product_index import ProductIndex
+from app.services.serialization import recommendations_json
+from app.services.vector_store import _parse_metadata_to_product
+from benchmarks.synthetic_catalog import brand_names, generate_chunk
+
+
+def per_product_us(fn, batches: list, top_k: int) -> float:
+    started = time.perf_counter()
+    for batch in batches:
+        fn(batch)
+    return (time.perf_counter() - started) * 1e6 / (len(batches) * top_k)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-product read and serialisation cost.")
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    args = parser.parse_args()
+
+    catalog = generate_chunk(0, args.rows, args.seed, brand_names(500, args.seed))
+    index = ProductIndex.from_dataframe(catalog)
+    rng = np.random.default_rng(args.seed)
+    batches = [rng.integers(0, args.rows, args.top_k).tolist() for _ in range(args.rounds)]
+
+    def described(products: list) -> RecommendationResponse:
+        for product in products:
+            product.generated_description = f"A lovely {product.title.lower()}."
+        return RecommendationResponse(recommendations=products)
+
+    validated = [described([Product.model_validate_json(index._json.raw(row)) for row in batch]) for batch in batches]
+    recorded = [described([index.product(row) for row in batch]) for batch in batches]
+    identical = all(
+        before.model_dump_json().encode() == recommendations_json(after)
+        for before, after in zip(validated, recorded)
+    )
+
+    # Pinecone metadata in the old (stringified lists) and new (native) layout
+    records = catalog.to_dict(orient="records")
+    native = [{**record, "categories": ast.literal_eval(record["categories"]),
+               "images": ast.literal_eval(record["images"])} for record in records]
+    stringified = [{**record, "categories": str(n["categories"]), "images": str(n["images"])}
+                   for record, n in zip(records, native)]
+    metadata_batches = [[row % len(records) for row in batch] for batch in batches]
+
+    k = args.top_k
+    results = {
+        "read_validate_us": per_product_us(lambda b: [Product.model_validate_json(index._json.raw(r)) for r in b], batches, k),
+        "read_record_us": per_product_us(lambda b: [index.product(r) for r in b], batches, k),
+        "encode_pydantic_us": per_product_us(lambda r: r.model_dump_json(), validated, k),
+        "encode_records_us": per_product_us(recommendations_json, recorded, k),
+        "metadata_literal_eval_us": per_product_us(
+            lambda b: [_parse_metadata_to_product(stringified[r]) for r in b], metadata_batches, k),
+        "metadata_native_us": per_product_us(
+            lambda b: [_parse_metadata_to_product(native[r]) for r in b], metadata_batches, k),
+    }
+    results = {name: round(value, 2) for name, value in results.items()}
+    results["identical_output"] = identical
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{args.rows} products, top_k={k}, {args.rounds} rounds; outputs identical: {identical}\n")
+    header = f"{'stage':<20}{'before us':>11}{'after us':>10}{'speedup':>9}"
+    print(header)
+    print("-" * len(header))
+    for stage, before, after in (("catalog read", "read_validate_us", "read_record_us"),
+                                 ("response encode", "encode_pydantic_us", "encode_records_us"),
+                                 ("pinecone metadata", "metadata_literal_eval_us", "metadata_native_us")):
+        speedup = results[before] / results[after] if results[after] else float("inf")
+        print(f"{stage:<20}{results[before]:>11}{results[after]:>10}{speedup:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
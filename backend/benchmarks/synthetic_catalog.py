@@ -0,0 +1,127 @@
+"""
+Synthetic furniture catalogs in the `sample_data.csv` schema.
+
+Run from the `backend` directory:
+    python -m benchmarks.synthetic_catalog --rows 100000 --output /tmp/catalog_100k.csv [--seed 0]
+
+Rows are deterministic for a given seed, so runs on different machines or
+branches benchmark the same catalog. Brands, categories, materials and
+colours follow skewed (Zipf-like) distributions like a real marketplace,
+prices come in the mixed formats the cleaning code has to handle, and the
+file is written in chunks so a 1M-row catalog never sits in memory.
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ["title", "brand", "description", "price", "categories", "images", "manufacturer",
+           "package_dimensions", "country_of_origin", "material", "color", "uniq_id"]
+
+ITEMS = {
+    "Living Room Furniture": ["Sofa", "Loveseat", "Accent Chair", "Coffee Table", "Side Table", "TV Stand", "Ottoman", "Recliner"],
+    "Bedroom Furniture": ["Bed Frame", "Nightstand", "Dresser", "Wardrobe", "Headboard", "Vanity Table"],
+    "Home Office Furniture": ["Desk", "Office Chair", "Bookshelf", "Filing Cabinet", "Standing Desk"],
+    "Kitchen & Dining Room Furniture": ["Dining Table", "Dining Chair", "Bar Stool", "Kitchen Island", "Buffet Sideboard"],
+    "Patio Furniture": ["Patio Set", "Lounge Chair", "Hammock", "Outdoor Bench", "Porch Swing"],
+    "Storage & Organization": ["Storage Cabinet", "Shoe Rack", "Coat Rack", "Cube Organizer", "Floating Shelf"],
+}
+ADJECTIVES = ["Modern", "Rustic", "Industrial", "Mid-Century", "Minimalist", "Scandinavian", "Farmhouse",
+              "Contemporary", "Vintage", "Boho", "Classic", "Compact", "Oversized", "Ergonomic", "Convertible"]
+FEATURES = ["with Storage", "with Drawers", "Adjustable Height", "Easy Assembly", "for Small Spaces",
+            "with USB Charging", "Space-Saving", "Foldable", "Tufted", "Upholstered", "Solid Wood Legs"]
+MATERIALS = ["Engineered Wood", "Solid Wood", "Metal", "Velvet", "Linen", "Leather", "Faux Leather", "Glass",
+             "Rattan", "Bamboo", "Plastic", "Marble", "MDF", "Polyester", "Wicker"]
+COLORS = ["Black", "White", "Grey", "Rustic Brown", "Walnut", "Oak", "Navy Blue", "Green", "Beige",
+          "Espresso", "Natural", "Gold", "Pink", "Teal", "Cream"]
+COUNTRIES = ["China", "Vietnam", "USA", "India", "Malaysia", "Indonesia", "Mexico", "Poland", "Turkey"]
+ROOMS = ["living room", "bedroom", "home office", "apartment", "dorm", "patio", "dining room", "entryway"]
+BRAND_SYLLABLES = ["ho", "ma", "ze", "lu", "vik", "tor", "nor", "sa", "ka", "ri", "den", "tex", "vo", "li"]
+
+
+def zipf_choice(rng: np.random.Generator, size: int, count: int, a: float = 1.2) -> np.ndarray:
+    """Indices into a list of `count` values, skewed so a few values dominate."""
+    weights = 1.0 / np.arange(1, count + 1) ** a
+    return rng.choice(count, size=size, p=weights / weights.sum())
+
+
+def brand_names(count: int, seed: int) -> list:
+    rng = np.random.default_rng(seed)
+    names = set()
+    while len(names) < count:
+        parts = rng.choice(BRAND_SYLLABLES, size=rng.integers(2, 4))
+        names.add("".join(parts).upper())
+    return sorted(names)
+
+
+def generate_chunk(start: int, rows: int, seed: int, brands: list) -> pd.DataFrame:
+    """Rows `start` .. `start + rows` of the catalog (the seed is mixed with the offset)."""
+    rng = np.random.default_rng([seed, start])
+    groups = list(ITEMS)
+    group_ids = zipf_choice(rng, rows, len(groups), a=0.8)
+    brand_ids = zipf_choice(rng, rows, len(brands))
+    material_ids = zipf_choice(rng, rows, len(MATERIALS))
+    color_ids = zipf_choice(rng, rows, len(COLORS))
+
+    records = []
+    for i in range(rows):
+        group = groups[group_ids[i]]
+        item = ITEMS[group][rng.integers(len(ITEMS[group]))]
+        adjective = ADJECTIVES[rng.integers(len(ADJECTIVES))]
+        feature = FEATURES[rng.integers(len(FEATURES))]
+        material, color = MATERIALS[material_ids[i]], COLORS[color_ids[i]]
+        brand = brands[brand_ids[i]]
+        room = ROOMS[rng.integers(len(ROOMS))]
+
+        price = float(np.round(rng.lognormal(4.5, 0.8), 2))
+        price_format = rng.random()
+        if price_format < 0.6:
+            price_text = f"{price:.2f}"
+        elif price_format < 0.95:
+            price_text = f"${price:,.2f}"
+        else:
+            price_text = ""  # Missing prices occur in the real catalog too
+
+        images = [f"https://images.example.com/{start + i:08d}-{n}.jpg" for n in range(rng.integers(0, 4))]
+        records.append({
+            "title": f"{adjective} {material} {item} {feature}",
+            "brand": brand,
+            "description": (f"A {adjective.lower()} {item.lower()} in {color.lower()} {material.lower()}, "
+                            f"{feature.lower()}. Great for any {room}."),
+            "price": price_text,
+            "categories": str(["Home & Kitchen", "Furniture", group, item + "s"]),
+            "images": str(images),
+            "manufacturer": brand,
+            "package_dimensions": f'{rng.integers(10, 80)}"D x {rng.integers(10, 90)}"W x {rng.integers(10, 80)}"H',
+            "country_of_origin": COUNTRIES[rng.integers(len(COUNTRIES))],
+            "material": material,
+            "color": color,
+            "uniq_id": f"syn-{start + i:08d}",
+        })
+    return pd.DataFrame.from_records(records, columns=COLUMNS)
+
+
+def write_catalog(path: str, rows: int, seed: int = 0, chunk_size: int = 50_000, brand_count: int = 500):
+    """Writes a `rows`-row synthetic catalog to `path` in chunks."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    brands = brand_names(brand_count, seed)
+    for start in range(0, rows, chunk_size):
+        chunk = generate_chunk(start, min(chunk_size, rows - start), seed, brands)
+        chunk.to_csv(path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic catalog in the sample_data.csv schema.")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_catalog(args.output, args.rows, args.seed)
+    print(f"Wrote {args.rows} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Synthetic product images for a synthetic catalog: a local directory that
+stands in for the image CDN.
+
+Run from the `backend` directory:
+    python -m benchmarks.synthetic_catalog --rows 10000 --output /tmp/catalog_10k.csv
+    python -m benchmarks.synthetic_images --catalog /tmp/catalog_10k.csv --output /tmp/catalog_images
+
+then ingest offline with IMAGE_INDEX_ENABLED=true IMAGE_SOURCE_DIR=/tmp/catalog_images.
+Every image URL of the catalog gets a JPEG named after the URL's file
+name. A picture is a shape per furniture group, filled with the product's
+colour and striped for wooden materials, at a random position and scale,
+so products that look alike in the catalog look alike in their images too.
+"""
+import argparse
+import ast
+import os
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic_catalog import ITEMS
+
+COLOR_RGB = {
+    "Black": (25, 25, 25), "White": (240, 240, 236), "Grey": (128, 128, 132), "Rustic Brown": (120, 72, 40),
+    "Walnut": (93, 62, 42), "Oak": (190, 150, 95), "Navy Blue": (30, 40, 90), "Green": (50, 110, 60),
+    "Beige": (220, 205, 175), "Espresso": (60, 40, 30), "Natural": (205, 180, 140), "Gold": (210, 170, 60),
+    "Pink": (230, 160, 180), "Teal": (30, 130, 130), "Cream": (245, 235, 210),
+}
+WOODEN = {"Solid Wood", "Engineered Wood", "MDF", "Bamboo"}
+GROUPS = list(ITEMS)
+
+
+def draw_product(size: int, group: str, color: str, material: str, seed: int):
+    """One product picture as a PIL image."""
+    from PIL import Image, ImageDraw
+
+    rng = np.random.default_rng(seed)
+    background = tuple(int(v) for v in rng.integers(225, 256, 3))
+    image = Image.new("RGB", (size, size), background)
+    draw = ImageDraw.Draw(image)
+    fill = COLOR_RGB.get(color, (150, 150, 150))
+    scale = rng.uniform(0.55, 0.85)
+    width, height = int(size * scale), int(size * scale * rng.uniform(0.5, 0.9))
+    left = int(rng.integers(0, size - width + 1))
+    top = int(rng.integers(0, size - height + 1))
+    box = (left, top, left + width, top + height)
+
+    shape = GROUPS.index(group) % 3 if group in GROUPS else 0
+    if shape == 0:
+        draw.rectangle(box, fill=fill)
+    elif shape == 1:
+        draw.ellipse(box, fill=fill)
+    else:
+        draw.polygon([(left, top + height), (left + width // 2, top), (left + width, top + height)], fill=fill)
+    grain = tuple(max(0, v - 35) for v in fill)
+    if material in WOODEN:
+        for y in range(top, top + height, 6):
+            draw.line([(left, y), (left + width, y)], fill=grain, width=1)
+    # Legs, so furniture of every group shares some structure
+    for x in (left + width // 8, left + width - width // 8):
+        draw.line([(x, top + height), (x, min(size - 1, top + height + size // 10))], fill=grain, width=4)
+    return image
+
+
+def image_name(url: str) -> str:
+    return url.rsplit("/", 1)[-1]
+
+
+def write_images(df: pd.DataFrame, directory: str, size: int = 320) -> int:
+    """Writes a JPEG for every image URL of the catalog rows; returns how many were written."""
+    os.makedirs(directory, exist_ok=True)
+    written = 0
+    for row in df.itertuples(index=False):
+        urls = row.images if isinstance(row.images, list) else ast.literal_eval(row.images or "[]")
+        group = next((g for g in GROUPS if g in row.categories), GROUPS[0])
+        for url in urls:
+            image = draw_product(size, group, row.color, row.material, zlib.crc32(url.encode("utf-8")))
+            image.save(os.path.join(directory, image_name(url)), "JPEG", quality=85)
+            written += 1
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic product images for a synthetic catalog.")
+    parser.add_argument("--catalog", required=True, help="CSV written by benchmarks.synthetic_catalog.")
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--size", type=int, default=320)
+    args = parser.parse_args()
+    written = 0
+    for chunk in pd.read_csv(args.catalog, chunksize=50_000, dtype=str, keep_default_na=False):
+        written += write_images(chunk, args.output, args.size)
+    print(f"Wrote {written} images to {args.output}")
+
+
+if __name__ == "__main__":
+    main()